@@ -1,34 +1,177 @@
+import asyncio
 import datetime
 import os
-import time
+import sys
+import weakref
 
 import litellm
 from wandb.sdk.data_types.trace_tree import Trace
 
+from cover_agent.ResponseCache import ResponseCache
+
 
 class AICaller:
-    def __init__(self, model: str, api_base: str = ""):
+    def __init__(
+        self,
+        model: str,
+        api_base: str = "",
+        max_concurrent_calls: int = 4,
+        cache: ResponseCache = None,
+        stream: bool = True,
+    ):
         """
         Initializes an instance of the AICaller class.
 
         Parameters:
             model (str): The name of the model to be used.
             api_base (str): The base API url to use in case model is set to Ollama or Hugging Face
+            max_concurrent_calls (int, optional): The maximum number of asynchronous calls to the model that can be in flight at the same time. Defaults to 4.
+            cache (ResponseCache, optional): A cache of model responses. Identical requests are answered from the cache without calling the model. Defaults to None.
+            stream (bool, optional): Whether to stream the response of the model. The streamed response is echoed to stdout when it is attached to a terminal. Defaults to True.
         """
         self.model = model
         self.api_base = api_base
+        self.max_concurrent_calls = max_concurrent_calls
+        self.cache = cache
+        self.stream = stream
+        # One semaphore per event loop, since asyncio primitives are bound to the loop they are used in
+        self._semaphores = weakref.WeakKeyDictionary()
 
-    def call_model(self, prompt: dict, max_tokens=4096):
+    def call_model(self, prompt: dict, max_tokens=4096, on_chunk=None):
         """
         Call the language model with the provided prompt and retrieve the response.
 
         Parameters:
             prompt (dict): The prompt to be sent to the language model.
             max_tokens (int, optional): The maximum number of tokens to generate in the response. Defaults to 4096.
+            on_chunk (callable, optional): A function called with each piece of the response text as soon as it is received. When the response is not streamed, it is called once with the whole response. Defaults to None.
 
         Returns:
             tuple: A tuple containing the response generated by the language model, the number of tokens used from the prompt, and the total number of tokens in the response.
         """
+        messages = self._build_messages(prompt)
+        completion_params = self._build_completion_params(messages, max_tokens)
+
+        cache_key, cached_response = self._lookup_cache(completion_params)
+        if cached_response:
+            if on_chunk:
+                on_chunk(cached_response[0])
+            return cached_response
+
+        response = litellm.completion(**completion_params)
+
+        if not self.stream:
+            model_response = response
+            if on_chunk:
+                on_chunk(model_response["choices"][0]["message"]["content"])
+        else:
+            # Echoing the stream is only useful to a person watching the terminal
+            echo = sys.stdout.isatty()
+            chunks = []
+            if echo:
+                print("Streaming results from LLM model...")
+            try:
+                for chunk in response:
+                    chunks.append(chunk)
+                    if echo or on_chunk:
+                        content = chunk.choices[0].delta.content or ""
+                        if echo:
+                            print(content, end="", flush=True)
+                        if on_chunk:
+                            on_chunk(content)
+            except Exception as e:
+                print(f"Error during streaming: {e}")
+                # Do not cache the partial response of an interrupted stream
+                cache_key = None
+            if echo:
+                print("\n")
+
+            model_response = litellm.stream_chunk_builder(chunks, messages=messages)
+
+        return self._process_model_response(prompt, model_response, cache_key)
+
+    async def call_model_async(self, prompt: dict, max_tokens=4096):
+        """
+        Asynchronously call the language model with the provided prompt and retrieve the response.
+
+        The number of calls in flight at the same time, within one event loop, is limited by 'max_concurrent_calls'.
+
+        Parameters:
+            prompt (dict): The prompt to be sent to the language model.
+            max_tokens (int, optional): The maximum number of tokens to generate in the response. Defaults to 4096.
+
+        Returns:
+            tuple: A tuple containing the response generated by the language model, the number of tokens used from the prompt, and the total number of tokens in the response.
+        """
+        messages = self._build_messages(prompt)
+        completion_params = self._build_completion_params(messages, max_tokens)
+
+        cache_key, cached_response = self._lookup_cache(completion_params)
+        if cached_response:
+            return cached_response
+
+        async with self._get_semaphore():
+            response = await litellm.acompletion(**completion_params)
+
+            if not self.stream:
+                model_response = response
+            else:
+                chunks = []
+                try:
+                    async for chunk in response:
+                        chunks.append(chunk)
+                except Exception as e:
+                    print(f"Error during streaming: {e}")
+                    # Do not cache the partial response of an interrupted stream
+                    cache_key = None
+
+                model_response = litellm.stream_chunk_builder(
+                    chunks, messages=messages
+                )
+
+        return self._process_model_response(prompt, model_response, cache_key)
+
+    def call_models(self, prompts: list, max_tokens=4096):
+        """
+        Call the language model with several independent prompts at the same time, and wait for all the responses.
+
+        Parameters:
+            prompts (list): The prompts to be sent to the language model.
+            max_tokens (int, optional): The maximum number of tokens to generate in each response. Defaults to 4096.
+
+        Returns:
+            list: A list of (response, prompt token count, response token count) tuples, in the same order as the prompts.
+        """
+
+        async def gather_responses():
+            return await asyncio.gather(
+                *[
+                    self.call_model_async(prompt, max_tokens=max_tokens)
+                    for prompt in prompts
+                ]
+            )
+
+        return asyncio.run(gather_responses())
+
+    def _get_semaphore(self):
+        """
+        Return the semaphore limiting the in-flight calls of the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrent_calls)
+        return self._semaphores[loop]
+
+    def _build_messages(self, prompt: dict):
+        """
+        Build the chat messages sent to the language model from the prompt dictionary.
+
+        Parameters:
+            prompt (dict): The prompt, containing the 'system' and 'user' keys.
+
+        Returns:
+            list: A list of chat messages.
+        """
         if "system" not in prompt or "user" not in prompt:
             raise KeyError(
                 "The prompt dictionary must contain 'system' and 'user' keys."
@@ -40,13 +183,25 @@ class AICaller:
                 {"role": "system", "content": prompt["system"]},
                 {"role": "user", "content": prompt["user"]},
             ]
+        return messages
+
+    def _build_completion_params(self, messages: list, max_tokens: int):
+        """
+        Build the parameters of the completion request.
+
+        Parameters:
+            messages (list): The chat messages sent to the language model.
+            max_tokens (int): The maximum number of tokens to generate in the response.
 
+        Returns:
+            dict: The completion parameters.
+        """
         # Default Completion parameters
         completion_params = {
             "model": self.model,
             "messages": messages,
             "max_tokens": max_tokens,
-            "stream": True,
+            "stream": self.stream,
             "temperature": 0.2,
         }
 
@@ -58,23 +213,40 @@ class AICaller:
         ):
             completion_params["api_base"] = self.api_base
 
-        response = litellm.completion(**completion_params)
+        return completion_params
+
+    def _lookup_cache(self, completion_params: dict):
+        """
+        Look up the response of a completion request in the response cache.
+
+        Parameters:
+            completion_params (dict): The parameters of the completion request.
+
+        Returns:
+            tuple: The cache key of the request (None when there is no cache) and the cached response (None on a cache miss).
+        """
+        if self.cache is None:
+            return None, None
+        cache_key = ResponseCache.make_key(
+            model=completion_params["model"],
+            messages=completion_params["messages"],
+            max_tokens=completion_params["max_tokens"],
+            temperature=completion_params["temperature"],
+        )
+        return cache_key, self.cache.get(cache_key)
+
+    def _process_model_response(self, prompt: dict, model_response, cache_key=None):
+        """
+        Log the model response, if Weights & Biases is configured, and extract the response content and token counts.
 
-        chunks = []
-        print("Streaming results from LLM model...")
-        try:
-            for chunk in response:
-                print(chunk.choices[0].delta.content or "", end="", flush=True)
-                chunks.append(chunk)
-                time.sleep(
-                    0.01
-                )  # Optional: Delay to simulate more 'natural' response pacing
-        except Exception as e:
-            print(f"Error during streaming: {e}")
-        print("\n")
-
-        model_response = litellm.stream_chunk_builder(chunks, messages=messages)
+        Parameters:
+            prompt (dict): The prompt sent to the language model.
+            model_response: The complete response of the language model.
+            cache_key (str, optional): The cache key under which the response is stored, if the model finished it normally. Defaults to None.
 
+        Returns:
+            tuple: A tuple containing the response generated by the language model, the number of tokens used from the prompt, and the total number of tokens in the response.
+        """
         if "WANDB_API_KEY" in os.environ:
             root_span = Trace(
                 name="inference_"
@@ -91,8 +263,12 @@ class AICaller:
             root_span.log(name="inference")
 
         # Returns: Response, Prompt token count, and Response token count
-        return (
+        result = (
             model_response["choices"][0]["message"]["content"],
             int(model_response["usage"]["prompt_tokens"]),
             int(model_response["usage"]["completion_tokens"]),
         )
+        # A truncated or filtered response would be replayed as is on every identical request
+        if cache_key and model_response["choices"][0].get("finish_reason") == "stop":
+            self.cache.put(cache_key, *result)
+        return result
@@ -0,0 +1,164 @@
+import base64
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from cover_agent.CustomLogger import CustomLogger
+from cover_agent.ResponseCache import evict_least_recently_used
+
+
+class CommandResultCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        input_files: list = None,
+        input_globs: list = None,
+        output_files: list = None,
+        max_size_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Initializes a content-addressed, on-disk cache of test command results.
+
+        A result is keyed on the command, its working directory and the content of its input files, so running the same
+        command on byte-identical inputs returns the cached exit code and output, and restores the output files (e.g. the
+        coverage report) it produced, without running the command again. Entries are evicted like LLM responses are, the
+        least recently used first.
+
+        Parameters:
+            cache_dir (str): The directory in which the results are stored.
+            input_files (list, optional): The files the result depends on, e.g. the source and the test file. Defaults to None.
+            input_globs (list, optional): Glob patterns of other files the result depends on, relative to the working
+                directory of the command. Defaults to None.
+            output_files (list, optional): The files written by the command, which are restored on a cache hit. Defaults to None.
+            max_size_bytes (int, optional): The maximum total size of the cached results, in bytes. Defaults to 512 MB.
+        """
+        self.cache_dir = cache_dir
+        self.input_files = list(input_files or [])
+        self.input_globs = list(input_globs or [])
+        self.output_files = list(output_files or [])
+        self.max_size_bytes = max_size_bytes
+        self.logger = CustomLogger.get_logger(__name__)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, command: str, cwd: str = None):
+        """
+        Compute the cache key of a command, from the command, its working directory and the content of its inputs.
+
+        Parameters:
+            command (str): The shell command.
+            cwd (str, optional): The working directory of the command. Defaults to None.
+
+        Returns:
+            str: The SHA-256 hex digest of the command and its inputs.
+        """
+        cwd = os.path.abspath(cwd or os.getcwd())
+        input_paths = {os.path.abspath(path) for path in self.input_files}
+        for pattern in self.input_globs:
+            for path in glob.glob(os.path.join(cwd, pattern), recursive=True):
+                if os.path.isfile(path):
+                    input_paths.add(os.path.abspath(path))
+        inputs = {path: _hash_file(path) for path in sorted(input_paths)}
+        request = json.dumps(
+            {"command": command, "cwd": cwd, "inputs": inputs}, sort_keys=True
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a cached result, and restore the output files it produced.
+
+        Parameters:
+            key (str): The cache key of the command.
+
+        Returns:
+            tuple: A tuple containing the standard output, standard error, exit code, and the time of the restore in
+            milliseconds (before which the output files are older), or None on a cache miss.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+            # Refresh the modification time, which is used as the LRU order
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+
+        restore_time = int(round(time.time() * 1000))
+        for path, content in entry["output_files"].items():
+            try:
+                with open(path, "wb") as f:
+                    f.write(base64.b64decode(content))
+                # The restored file must look newer than the command, like a file written by the command
+                mtime_ns = max(time.time_ns(), (restore_time + 1) * 1_000_000)
+                os.utime(path, ns=(mtime_ns, mtime_ns))
+            except OSError as e:
+                self.logger.warning(f"Failed to restore cached output file {path}: {e}")
+                return None
+        self.logger.info(f"Using cached result of test command {key[:12]}")
+        return entry["stdout"], entry["stderr"], int(entry["exit_code"]), restore_time
+
+    def put(
+        self,
+        key: str,
+        stdout: str,
+        stderr: str,
+        exit_code: int,
+        command_start_time: int,
+    ):
+        """
+        Store the result of a command in the cache, along with the output files it wrote, and evict the least recently
+        used entries if the cache grew too large.
+
+        Parameters:
+            key (str): The cache key of the command.
+            stdout (str): The standard output of the command.
+            stderr (str): The standard error of the command.
+            exit_code (int): The exit code of the command.
+            command_start_time (int): The time the command was run, in milliseconds. Output files that were not written
+                since then are not stored.
+        """
+        output_files = {}
+        for path in self.output_files:
+            path = os.path.abspath(path)
+            try:
+                if os.path.getmtime(path) * 1000 < command_start_time:
+                    continue
+                with open(path, "rb") as f:
+                    output_files[path] = base64.b64encode(f.read()).decode("ascii")
+            except OSError:
+                continue
+        entry = {
+            "stdout": stdout,
+            "stderr": stderr,
+            "exit_code": exit_code,
+            "output_files": output_files,
+        }
+        # Write to a temporary file first, so a concurrent reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError as e:
+            self.logger.warning(f"Failed to store test command result in the cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        evict_least_recently_used(self.cache_dir, self.max_size_bytes)
+
+    def _entry_path(self, key: str):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+
+def _hash_file(path: str):
+    sha256 = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(chunk)
+    except OSError:
+        return None
+    return sha256.hexdigest()
@@ -0,0 +1,140 @@
+import ast
+import math
+import re
+
+from cover_agent.SourceSlicer import header_lines, node_lines, render_lines
+
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+class CondensedTestFile:
+    def __init__(self, path_to_file: str, content: str):
+        """
+        Builds condensed views of a test file, whose size does not grow with the number of tests in the file.
+
+        Parameters:
+            path_to_file (str): The path of the test file, used to pick how the file is condensed.
+            content (str): The content of the test file.
+        """
+        self.path_to_file = path_to_file
+        self.content = content
+        self.content_lines = content.split("\n")
+
+        # List of rules/action key pair.
+        # Add your new rule and how to condense the test file (function) here
+        self.rules = [(self._is_python_file, self._condense_python)]
+
+    def condense(self, query: str, top_k: int):
+        """
+        Build a view of the test file that keeps the code shared by the tests verbatim, along with the 'top_k' tests that
+        are the most relevant to the query, and reduces the other tests to their signatures. Omitted lines are replaced
+        with a line containing '...', and the original line numbers are kept in the numbered view.
+
+        Parameters:
+            query (str): The code the tests should be relevant to, e.g. the source code around the missed lines.
+            top_k (int): The number of tests kept verbatim.
+
+        Returns:
+            tuple: The condensed view and the line-numbered condensed view, or None if the test file cannot be condensed.
+        """
+        for condition, action in self.rules:
+            if condition():
+                kept_lines = action(query, top_k)
+                if kept_lines is None:
+                    return None
+                return (
+                    render_lines(self.content_lines, kept_lines, numbered=False),
+                    render_lines(self.content_lines, kept_lines),
+                )
+        return None  # No condensed view for this kind of test file
+
+    def _is_python_file(self) -> bool:
+        """
+        Rule to check if the file is a Python file.
+        """
+        return self.path_to_file.endswith(".py")
+
+    def _condense_python(self, query: str, top_k: int):
+        """
+        Action to condense Python test files with the ast module.
+
+        Imports, fixtures, helpers and the other module-level statements are kept verbatim, as are the non-test members
+        of test classes. The tests are ranked by the overlap of their identifiers with the query, weighted by how rare
+        each identifier is among the tests (as in BM25).
+        """
+        try:
+            parsed_ast = ast.parse(self.content)
+        except SyntaxError:
+            return None
+
+        kept_lines = set()
+        tests = []
+        for node in parsed_ast.body:
+            if _is_test_function(node):
+                tests.append(node)
+            elif isinstance(node, ast.ClassDef) and any(
+                _is_test_function(child) for child in node.body
+            ):
+                kept_lines.update(header_lines(node))
+                for child in node.body:
+                    if _is_test_function(child):
+                        tests.append(child)
+                    else:
+                        kept_lines.update(node_lines(child))
+            else:
+                kept_lines.update(node_lines(node))
+
+        test_identifiers = [
+            _identifiers(ast.get_source_segment(self.content, test) or "")
+            for test in tests
+        ]
+        query_identifiers = _identifiers(query)
+        document_frequency = {}
+        for identifiers in test_identifiers:
+            for identifier in identifiers & query_identifiers:
+                document_frequency[identifier] = (
+                    document_frequency.get(identifier, 0) + 1
+                )
+
+        # fsum is exactly rounded, so equally relevant tests get equal scores whatever the order of the set
+        scores = [
+            math.fsum(
+                _inverse_document_frequency(
+                    len(tests), document_frequency[identifier]
+                )
+                for identifier in identifiers & query_identifiers
+            )
+            for identifiers in test_identifiers
+        ]
+        # Rank by relevance, keeping the file order among equally relevant tests
+        ranking = sorted(range(len(tests)), key=lambda index: -scores[index])
+        selected_tests = set(ranking[:top_k])
+        for index, test in enumerate(tests):
+            if index in selected_tests:
+                kept_lines.update(node_lines(test))
+            else:
+                kept_lines.update(header_lines(test))
+        return kept_lines
+
+
+def _is_test_function(node) -> bool:
+    return isinstance(
+        node, (ast.FunctionDef, ast.AsyncFunctionDef)
+    ) and node.name.startswith("test")
+
+
+def _inverse_document_frequency(test_count: int, frequency: int) -> float:
+    # BM25 weight: identifiers shared by most tests (e.g. 'assert', 'self') barely count
+    return math.log(1 + (test_count - frequency + 0.5) / (frequency + 0.5))
+
+
+def _identifiers(code: str) -> set:
+    """
+    The identifiers of a piece of code, along with the words of the snake_case ones, in lower case.
+    """
+    identifiers = set()
+    for identifier in IDENTIFIER_PATTERN.findall(code):
+        identifier = identifier.lower()
+        identifiers.add(identifier)
+        identifiers.update(word for word in identifier.split("_") if len(word) > 2)
+    return identifiers
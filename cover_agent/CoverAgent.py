@@ -15,6 +15,7 @@ class CoverAgent:
         self.logger = CustomLogger.get_logger(__name__)
 
         self._validate_paths()
+        self._validate_validation_mode()
         self._duplicate_test_file()
 
         self.test_gen = UnitTestGenerator(
@@ -24,11 +25,25 @@ class CoverAgent:
             test_command=args.test_command,
             test_command_dir=args.test_command_dir,
             included_files=args.included_files,
+            included_files_mode=args.included_files_mode,
             coverage_type=args.coverage_type,
             desired_coverage=args.desired_coverage,
             additional_instructions=args.additional_instructions,
             llm_model=args.model,
             api_base=args.api_base,
+            max_concurrent_llm_calls=args.max_concurrent_llm_calls,
+            llm_cache_dir=args.llm_cache_dir,
+            llm_cache_mode=args.llm_cache_mode,
+            llm_cache_max_size_mb=args.llm_cache_max_size_mb,
+            llm_streaming=not args.disable_streaming,
+            targeted_validation=args.targeted_validation,
+            targeted_test_command=args.targeted_test_command,
+            branch_coverage=args.branch_coverage,
+            test_command_timeout=args.test_command_timeout,
+            test_cache_dir=args.test_cache_dir,
+            test_cache_inputs=args.test_cache_inputs,
+            max_prompt_tokens=args.max_prompt_tokens,
+            condensed_test_file_top_k=args.condensed_test_file_top_k,
         )
 
     def _validate_paths(self):
@@ -41,6 +56,24 @@ class CoverAgent:
                 f"Test file not found at {self.args.test_file_path}"
             )
 
+    def _validate_validation_mode(self):
+        validation_modes = [
+            flag
+            for flag, enabled in (
+                ("--incremental-validation", self.args.incremental_validation),
+                ("--batched-validation", self.args.batched_validation),
+                (
+                    "--parallel-validation-workers",
+                    self.args.parallel_validation_workers > 1,
+                ),
+            )
+            if enabled
+        ]
+        if len(validation_modes) > 1:
+            raise ValueError(
+                f"Only one validation mode can be used at a time, got {' and '.join(validation_modes)}"
+            )
+
     def _duplicate_test_file(self):
         if self.args.test_file_output_path != "":
             shutil.copy(self.args.test_file_path, self.args.test_file_output_path)
@@ -68,19 +101,40 @@ class CoverAgent:
             )
             self.logger.info(f"Desired Coverage: {self.test_gen.desired_coverage}%")
 
-            generated_tests_dict = self.test_gen.generate_tests(max_tokens=4096)
-
-            for generated_test in generated_tests_dict.get("new_tests", []):
-                test_result = self.test_gen.validate_test(
-                    generated_test, generated_tests_dict
+            if self.args.incremental_validation:
+                # Validate each test as soon as it is generated, while the LLM keeps generating the next ones
+                generated_tests_dict = {"new_tests": []}
+                for generated_test in self.test_gen.generate_tests_incrementally(
+                    max_tokens=4096
+                ):
+                    generated_tests_dict["new_tests"].append(generated_test)
+                    test_result = self.test_gen.validate_test(
+                        generated_test, generated_tests_dict
+                    )
+                    test_results_list.append(test_result)
+            elif self.args.batched_validation:
+                generated_tests_dict = self.test_gen.generate_tests(max_tokens=4096)
+                test_results_list.extend(
+                    self.test_gen.validate_tests_batched(generated_tests_dict)
+                )
+            elif self.args.parallel_validation_workers > 1:
+                generated_tests_dict = self.test_gen.generate_tests(max_tokens=4096)
+                test_results_list.extend(
+                    self.test_gen.validate_tests_parallel(
+                        generated_tests_dict,
+                        max_workers=self.args.parallel_validation_workers,
+                    )
                 )
-                test_results_list.append(test_result)
+            else:
+                generated_tests_dict = self.test_gen.generate_tests(max_tokens=4096)
+                for generated_test in generated_tests_dict.get("new_tests", []):
+                    test_result = self.test_gen.validate_test(
+                        generated_test, generated_tests_dict
+                    )
+                    test_results_list.append(test_result)
 
             iteration_count += 1
 
-            if self.test_gen.current_coverage < (self.test_gen.desired_coverage / 100):
-                self.test_gen.run_coverage()
-
         if self.test_gen.current_coverage >= (self.test_gen.desired_coverage / 100):
             self.logger.info(
                 f"Reached above target coverage of {self.test_gen.desired_coverage}% (Current Coverage: {round(self.test_gen.current_coverage * 100, 2)}%) in {iteration_count} iterations."
@@ -102,6 +156,11 @@ class CoverAgent:
             f"Total number of output tokens used for LLM model {self.test_gen.ai_caller.model}: {self.test_gen.total_output_token_count}"
         )
 
+        # Provide metrics on where the time was spent
+        self.logger.info(
+            f"Time and resources spent per phase:\n{self.test_gen.format_phase_metrics()}"
+        )
+
         ReportGenerator.generate_report(test_results_list, self.args.report_filepath)
 
         if "WANDB_API_KEY" in os.environ:
@@ -3,8 +3,66 @@ import os
 import time
 import re
 import csv
+import hashlib
+import threading
 import xml.etree.ElementTree as ET
 from cover_agent.CustomLogger import CustomLogger
+from cover_agent.LineSet import LineSet
+
+# e.g. condition-coverage="50% (1/2)"
+_COBERTURA_CONDITION_COVERAGE_PATTERN = re.compile(r"\((\d+)/(\d+)\)")
+_JAVA_PACKAGE_PATTERN = re.compile(r"^\s*package\s+([\w\.]+)\s*;.*$")
+_JAVA_CLASS_PATTERN = re.compile(
+    r"^\s*((?:(?:public|protected|private|abstract|static|final|sealed|non-sealed|strictfp)\s+)*)"
+    r"(class|interface|enum|record|@interface)\s+(\w+)"
+)
+_JAVA_COMMENT_OR_LITERAL_PATTERN = re.compile(
+    r'//.*$|/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\''
+)
+
+# Package and top-level types of each Java source file, keyed on the file path and modification time
+_java_source_info_cache = {}
+
+# Parse results of each coverage report, keyed on the report path, along with the signature of the parsed report
+_report_parse_cache = {}
+_report_parse_cache_lock = threading.Lock()
+# Total size of the cached reports, as the parse results grow with the size of the reports
+_REPORT_PARSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_REPORT_HASH_PREFIX_BYTES = 64 * 1024
+
+# Prefix of the temporary directories in which generated tests are validated, whose reports are read only once
+SANDBOX_DIR_PREFIX = "cover_agent_sandbox_"
+
+
+def get_report_signature(path: str):
+    """
+    Computes a signature of a coverage report, which changes whenever the report is rewritten.
+
+    The hash of the beginning of the report catches rewrites within the modification time resolution of the file system.
+
+    Args:
+        path (str): The path to the coverage report file.
+
+    Returns:
+        tuple: The size, the modification time in nanoseconds, and a hash of the first bytes of the report.
+    """
+    stat = os.stat(path)
+    with open(path, "rb") as file:
+        prefix_hash = hashlib.sha256(file.read(_REPORT_HASH_PREFIX_BYTES)).hexdigest()
+    return stat.st_size, stat.st_mtime_ns, prefix_hash
+
+
+def normalize_report_path(path: str) -> str:
+    """
+    Normalizes a file path found in a coverage report, so paths can be compared across reports and platforms.
+
+    Args:
+        path (str): The file path.
+
+    Returns:
+        str: The normalized path, with '/' separators.
+    """
+    return os.path.normpath(path).replace("\\", "/")
 
 
 class CoverageProcessor:
@@ -12,7 +70,9 @@ class CoverageProcessor:
         self,
         file_path: str,
         src_file_path: str,
-        coverage_type: Literal["cobertura", "lcov", "jacoco"],
+        coverage_type: Literal["cobertura", "lcov", "jacoco", "coveragepy"],
+        run_dir: str = None,
+        project_dir: str = None,
     ):
         """
         Initializes a CoverageProcessor object.
@@ -20,12 +80,16 @@ class CoverageProcessor:
         Args:
             file_path (str): The path to the coverage report file.
             src_file_path (str): The fully qualified path of the file for which coverage data is being processed.
-            coverage_type (Literal["cobertura", "lcov"]): The type of coverage report being processed.
+            coverage_type (Literal["cobertura", "lcov", "jacoco", "coveragepy"]): The type of coverage report being processed.
+            run_dir (str, optional): The directory in which the test command ran. Absolute paths recorded under it in the
+                report are mapped to the same relative path under 'project_dir'. Defaults to None, which keeps the paths.
+            project_dir (str, optional): The project directory that 'run_dir' is a copy of, e.g. when the tests ran in a
+                validation sandbox. Defaults to 'run_dir'.
 
         Attributes:
             file_path (str): The path to the coverage report file.
             src_file_path (str): The fully qualified path of the file for which coverage data is being processed.
-            coverage_type (Literal["cobertura", "lcov"]): The type of coverage report being processed.
+            coverage_type (Literal["cobertura", "lcov", "jacoco", "coveragepy"]): The type of coverage report being processed.
             logger (CustomLogger): The logger object for logging messages.
 
         Returns:
@@ -34,11 +98,13 @@ class CoverageProcessor:
         self.file_path = file_path
         self.src_file_path = src_file_path
         self.coverage_type = coverage_type
+        self.run_dir = run_dir
+        self.project_dir = project_dir or run_dir
         self.logger = CustomLogger.get_logger(__name__)
 
     def process_coverage_report(
         self, time_of_test_command: int
-    ) -> Tuple[list, list, float]:
+    ) -> Tuple[LineSet, LineSet, float]:
         """
         Verifies the coverage report's existence and update time, and then
         parses the report based on its type to extract coverage data.
@@ -47,7 +113,7 @@ class CoverageProcessor:
             time_of_test_command (int): The time the test command was run, in milliseconds.
 
         Returns:
-            Tuple[list, list, float]: A tuple containing lists of covered and missed line numbers, and the coverage percentage.
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
         """
         self.verify_report_update(time_of_test_command)
         return self.parse_coverage_report()
@@ -73,122 +139,707 @@ class CoverageProcessor:
             file_mod_time_ms > time_of_test_command
         ), f"Fatal: The coverage report file was not updated after the test command. file_mod_time_ms: {file_mod_time_ms}, time_of_test_command: {time_of_test_command}. {file_mod_time_ms > time_of_test_command}"
 
-    def parse_coverage_report(self) -> Tuple[list, list, float]:
+    def parse_coverage_report(self) -> Tuple[LineSet, LineSet, float]:
         """
         Parses a code coverage report to extract covered and missed line numbers for a specific file,
         and calculates the coverage percentage, based on the specified coverage report type.
 
+        The result is cached for the whole process, so reading the same report again, e.g. after a rollback, is free as long
+        as the report has not been rewritten.
+
         Returns:
-            Tuple[list, list, float]: A tuple containing lists of covered and missed line numbers, and the coverage percentage.
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
         """
+        return self._get_cached_parse_result(
+            self._src_cache_key("parse"), self._parse_coverage_report_uncached
+        )
+
+    def _parse_coverage_report_uncached(self) -> Tuple[LineSet, LineSet, float]:
         if self.coverage_type == "cobertura":
             return self.parse_coverage_report_cobertura()
         elif self.coverage_type == "lcov":
-            # Placeholder for LCOV report parsing
-            raise NotImplementedError(
-                f"Parsing for {self.coverage_type} coverage reports is not implemented yet."
-            )
+            return self.parse_coverage_report_lcov()
         elif self.coverage_type == "jacoco":
             return self.parse_coverage_report_jacoco()
+        elif self.coverage_type == "coveragepy":
+            return self.parse_coverage_report_coveragepy()
         else:
             raise ValueError(f"Unsupported coverage report type: {self.coverage_type}")
 
-    def parse_coverage_report_cobertura(self) -> Tuple[list, list, float]:
+    def parse_branch_coverage(self) -> dict:
+        """
+        Parses the branch coverage of a specific file from the code coverage report.
+
+        Branches are read from the 'condition-coverage' attribute of Cobertura lines, the 'BRDA' records of LCOV reports,
+        the 'mb'/'cb' attributes of JaCoCo XML lines and the arcs of coverage.py data files collected with branch
+        coverage. JaCoCo CSV totals do not provide branches per line, and an empty dictionary is returned for them.
+
+        Returns:
+            dict: A dictionary mapping each line number with branches to a tuple of the number of covered branches and the
+            total number of branches of the line.
+        """
+        return self._get_cached_parse_result(
+            self._src_cache_key("branches"), self._parse_branch_coverage_uncached
+        )
+
+    def _parse_branch_coverage_uncached(self) -> dict:
+        if self.coverage_type == "cobertura":
+            file_entry = self.find_file_in_index(self.get_cobertura_index())
+            return dict(file_entry["branches"]) if file_entry else {}
+        elif self.coverage_type == "lcov":
+            return self._read_lcov_file_records()[1]
+        elif self.coverage_type == "jacoco" and self.file_path.endswith(".xml"):
+            xml_lines = self._read_jacoco_xml_lines()
+            return {
+                line_number: (cb, mb + cb)
+                for line_number, (_, _, mb, cb) in xml_lines.items()
+                if mb + cb > 0
+            }
+        elif self.coverage_type == "coveragepy":
+            cov, analyzed_file = self._load_coveragepy_data()
+            if analyzed_file is None or not cov.get_data().has_arcs():
+                return {}
+            # The public analysis API has no branch data
+            branch_stats = cov._analyze(analyzed_file).branch_stats()
+            return {
+                line_number: (taken_exits, total_exits)
+                for line_number, (total_exits, taken_exits) in branch_stats.items()
+            }
+        return {}
+
+    @staticmethod
+    def combined_coverage_percentage(
+        lines_covered, lines_missed, branches: dict
+    ) -> float:
+        """
+        Computes the coverage percentage of lines and branches together, like coverage.py does with branch coverage:
+        (covered lines + covered branches) / (lines + branches).
+
+        Args:
+            lines_covered (LineSet): The covered lines.
+            lines_missed (LineSet): The missed lines.
+            branches (dict): The number of covered and total branches of each line.
+
+        Returns:
+            float: The combined coverage percentage.
+        """
+        covered = len(lines_covered) + sum(covered for covered, _ in branches.values())
+        total = (
+            len(lines_covered)
+            + len(lines_missed)
+            + sum(total for _, total in branches.values())
+        )
+        return (covered / total) if total > 0 else 0
+
+    def _src_cache_key(self, kind: str) -> tuple:
+        """
+        Returns the key of a parse result for the source file, which also changes when the source file is modified.
+        """
+        try:
+            src_mtime_ns = os.stat(self.src_file_path).st_mtime_ns
+        except OSError:
+            src_mtime_ns = None
+        return (
+            kind,
+            self.coverage_type,
+            os.path.abspath(self.src_file_path),
+            src_mtime_ns,
+            self.run_dir,
+            self.project_dir,
+        )
+
+    def parse_coverage_report_cobertura(self) -> Tuple[LineSet, LineSet, float]:
         """
         Parses a Cobertura XML code coverage report to extract covered and missed line numbers for a specific file,
         and calculates the coverage percentage.
 
+        The lines of the file are looked up in the filename index of the report, which is built once per report.
+
+        Returns:
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
+        """
+        file_entry = self.find_file_in_index(self.get_cobertura_index())
+        if not file_entry:
+            return LineSet(), LineSet(), 0
+        lines_covered = file_entry["covered"]
+        lines_missed = file_entry["lines"] - lines_covered
+
+        total_lines = len(file_entry["lines"])
+        coverage_percentage = (
+            (len(lines_covered) / total_lines) if total_lines > 0 else 0
+        )
+
+        return lines_covered, lines_missed, coverage_percentage
+
+    def get_cobertura_index(self) -> dict:
+        """
+        Returns the filename index of the Cobertura report, building it if the report changed since it was last indexed.
+
+        The report is streamed once with `iterparse`, and elements are cleared once they were read, so the memory used
+        only grows with the number of files in the report and not with the size of the XML: the hits of each line are only
+        kept while its class element is read, and each file is stored as compact line sets. All the class entries of a
+        file are aggregated, since Cobertura may emit several class entries for one file.
+
+        Returns:
+            dict: A dictionary mapping each normalized file path of the report to its entry: a dictionary with the line set
+            of the covered lines under 'covered', the line set of all the lines under 'lines', and the number of covered
+            and total branches of the lines with conditions under 'branches'.
+        """
+        return self._get_cached_parse_result(
+            ("cobertura_index",), self._build_cobertura_index
+        )
+
+    def _build_cobertura_index(self) -> dict:
+        index = {}
+        file_entry = None
+        # The hits and branches of the lines of the class being read, folded into the line sets of its file at its end
+        class_hits, class_branches = {}, {}
+        methods_depth = 0
+        for event, elem in ET.iterparse(self.file_path, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "class":
+                    name_attr = elem.get("filename")
+                    file_entry = (
+                        index.setdefault(
+                            normalize_report_path(name_attr),
+                            {"covered": LineSet(), "lines": LineSet(), "branches": {}},
+                        )
+                        if name_attr
+                        else None
+                    )
+                elif elem.tag == "methods":
+                    methods_depth += 1
+                continue
+
+            if elem.tag == "line":
+                # Lines under <methods> repeat the lines of the class
+                if file_entry is not None and not methods_depth:
+                    line_number = int(elem.get("number"))
+                    hits = int(elem.get("hits"))
+                    class_hits[line_number] = max(hits, class_hits.get(line_number, 0))
+                    branch_match = _COBERTURA_CONDITION_COVERAGE_PATTERN.search(
+                        elem.get("condition-coverage") or ""
+                    )
+                    if branch_match:
+                        class_branches[line_number] = max(
+                            (int(branch_match.group(1)), int(branch_match.group(2))),
+                            class_branches.get(line_number, (0, 0)),
+                        )
+                elem.clear()
+            elif elem.tag == "methods":
+                methods_depth -= 1
+            elif elem.tag in ("class", "package"):
+                if file_entry is not None:
+                    file_entry["covered"] |= LineSet(
+                        line_number for line_number, hits in class_hits.items() if hits > 0
+                    )
+                    file_entry["lines"] |= LineSet(class_hits)
+                    file_branches = file_entry["branches"]
+                    for line_number, branch in class_branches.items():
+                        file_branches[line_number] = max(
+                            branch, file_branches.get(line_number, (0, 0))
+                        )
+                file_entry = None
+                class_hits, class_branches = {}, {}
+                elem.clear()
+
+        return index
+
+    def _get_cached_parse_result(self, key: tuple, parse):
+        """
+        Returns a parse result of the coverage report from the process-wide cache, parsing the report on a cache miss.
+
+        The cached results of a report are dropped as soon as its signature changes, and the least recently parsed
+        reports are dropped when the total size of the cached reports exceeds the limit. Reports that cannot be read are
+        parsed without caching, so the parser reports the error, and so are the reports of validation sandboxes, which
+        are deleted right after being read.
+
+        Args:
+            key (tuple): The key of the parse result, within the results of the report.
+            parse (callable): The function that parses the report, called on a cache miss.
+
+        Returns:
+            The parse result.
+        """
+        report_path = os.path.abspath(self.file_path)
+        if any(
+            part.startswith(SANDBOX_DIR_PREFIX) for part in report_path.split(os.sep)
+        ):
+            return parse()
+        try:
+            signature = get_report_signature(report_path)
+        except OSError:
+            return parse()
+
+        with _report_parse_cache_lock:
+            cached = _report_parse_cache.get(report_path)
+            if cached is not None and cached[0] == signature and key in cached[1]:
+                return cached[1][key]
+
+        # Parse outside of the lock, so reports of different runs are parsed concurrently
+        result = parse()
+
+        report_size = signature[0]
+        with _report_parse_cache_lock:
+            cached = _report_parse_cache.get(report_path)
+            if cached is None or cached[0] != signature:
+                _report_parse_cache.pop(report_path, None)
+                if report_size > _REPORT_PARSE_CACHE_MAX_BYTES:
+                    return result
+                cached_size = sum(
+                    entry[0][0] for entry in _report_parse_cache.values()
+                )
+                while _report_parse_cache and (
+                    cached_size + report_size > _REPORT_PARSE_CACHE_MAX_BYTES
+                ):
+                    # Drop the least recently parsed report
+                    oldest_path = next(iter(_report_parse_cache))
+                    cached_size -= _report_parse_cache.pop(oldest_path)[0][0]
+                cached = (signature, {})
+                _report_parse_cache[report_path] = cached
+            cached[1].setdefault(key, result)
+            return cached[1][key]
+
+    def find_file_in_index(self, index: dict, src_file_path: str = None):
+        """
+        Finds the entry of a source file in the filename index of a report.
+
+        Report paths are usually relative to a source root, so the entry whose path is the longest suffix of the source
+        file path, on path component boundaries, is selected. A report entry 'utils.py' does not match 'myutils.py', and
+        'pkg/utils.py' is preferred over 'utils.py' for 'src/pkg/utils.py'.
+
+        Args:
+            index (dict): The filename index of the report.
+            src_file_path (str, optional): The path of the source file. Defaults to the source file of this processor.
+
+        Returns:
+            The entry of the source file, or None if the file is not in the report.
+        """
+        parts = self._src_path_parts(src_file_path)
+        match = None
+        for i in range(len(parts) - 1, -1, -1):
+            candidate = "/".join(parts[i:])
+            if candidate in index:
+                match = index[candidate]
+        return match
+
+    def parse_coverage_report_lcov(self) -> Tuple[LineSet, LineSet, float]:
+        """
+        Parses an LCOV code coverage report to extract covered and missed line numbers for a specific file,
+        and calculates the coverage percentage.
+
+        The report is streamed line by line, and only the 'DA' records of the sections of the source file are parsed. When
+        several sections match the source file, for instance one per test, their line hits are aggregated.
+
         Returns:
-            Tuple[list, list, float]: A tuple containing lists of covered and missed line numbers, and the coverage percentage.
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
         """
-        tree = ET.parse(self.file_path)
-        root = tree.getroot()
+        line_hits = self._read_lcov_file_records()[0]
+
         lines_covered, lines_missed = [], []
-        filename = os.path.basename(self.src_file_path)
-
-        for cls in root.findall(".//class"):
-            name_attr = cls.get("filename")
-            if name_attr and name_attr.endswith(filename):
-                for line in cls.findall(".//line"):
-                    line_number = int(line.get("number"))
-                    hits = int(line.get("hits"))
-                    if hits > 0:
-                        lines_covered.append(line_number)
-                    else:
-                        lines_missed.append(line_number)
-                break  # Assuming filename is unique, break after finding and processing it
+        for line_number, hits in sorted(line_hits.items()):
+            if hits > 0:
+                lines_covered.append(line_number)
+            else:
+                lines_missed.append(line_number)
 
         total_lines = len(lines_covered) + len(lines_missed)
         coverage_percentage = (
             (len(lines_covered) / total_lines) if total_lines > 0 else 0
         )
 
-        return lines_covered, lines_missed, coverage_percentage
+        return LineSet(lines_covered), LineSet(lines_missed), coverage_percentage
 
-    def parse_coverage_report_jacoco(self) -> Tuple[list, list, float]:
+    def _read_lcov_file_records(self):
         """
-        Parses a JaCoCo XML code coverage report to extract covered and missed line numbers for a specific file,
+        Streams an LCOV report, and reads the 'DA' and 'BRDA' records of the sections of the source file.
+
+        Returns:
+            tuple: A dictionary of the hits of each line, and a dictionary of the number of covered and total branches of
+            each line.
+        """
+        return self._get_cached_parse_result(
+            self._src_cache_key("lcov_records"), self._read_lcov_file_records_uncached
+        )
+
+    def _read_lcov_file_records_uncached(self):
+        src_parts = self._src_path_parts()
+        best_match_length = 0
+        line_hits = {}
+        branch_hits = {}
+        in_target_section = False
+        with open(self.file_path, "r") as file:
+            for line in file:
+                if line.startswith("SF:"):
+                    # Sections written in a validation sandbox have absolute paths in the sandbox
+                    match_length = self._path_suffix_match_length(
+                        src_parts, self._map_report_path(line[3:].strip())
+                    )
+                    if match_length > best_match_length:
+                        # A more specific match than the sections read so far
+                        best_match_length = match_length
+                        line_hits = {}
+                        branch_hits = {}
+                    in_target_section = (
+                        match_length > 0 and match_length == best_match_length
+                    )
+                elif in_target_section and line.startswith("DA:"):
+                    fields = line[3:].strip().split(",")
+                    try:
+                        line_number = int(fields[0])
+                        # The hit count can be a float, or '-' with some generators
+                        hits = float(fields[1]) if fields[1] != "-" else 0
+                    except (IndexError, ValueError):
+                        self.logger.warning(
+                            f"Skipping malformed LCOV record: {line.strip()}"
+                        )
+                        continue
+                    line_hits[line_number] = max(hits, line_hits.get(line_number, 0))
+                elif in_target_section and line.startswith("BRDA:"):
+                    # BRDA:<line>,<block>,<branch>,<taken>, where <taken> is '-' if the line was never executed
+                    fields = line[5:].strip().split(",")
+                    try:
+                        branch = (int(fields[0]), fields[1], fields[2])
+                        taken = float(fields[3]) if fields[3] != "-" else 0
+                    except (IndexError, ValueError):
+                        self.logger.warning(
+                            f"Skipping malformed LCOV record: {line.strip()}"
+                        )
+                        continue
+                    branch_hits[branch] = max(taken, branch_hits.get(branch, 0))
+                elif line.startswith("end_of_record"):
+                    in_target_section = False
+
+        branches = {}
+        for (line_number, _, _), taken in branch_hits.items():
+            covered, total = branches.get(line_number, (0, 0))
+            branches[line_number] = (covered + (taken > 0), total + 1)
+        return line_hits, branches
+
+    def parse_coverage_report_coveragepy(self) -> Tuple[LineSet, LineSet, float]:
+        """
+        Reads the covered and missed line numbers of a specific file from a coverage.py data file (e.g. '.coverage'),
+        and calculates the coverage percentage.
+
+        The SQLite database written by coverage.py is queried through its own data API, so the test command does not need
+        to generate an XML report. The statements of the file are found by coverage.py analyzing the source file, with the
+        configuration (e.g. exclusions) of the directory in which the test command ran.
+
+        Returns:
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
+
+        Raises:
+            ImportError: If coverage.py is not installed.
+        """
+        cov, analyzed_file = self._load_coveragepy_data()
+        if analyzed_file is None:
+            return LineSet(), LineSet(), 0
+
+        _, statements, _, missing, _ = cov.analysis2(analyzed_file)
+        missing_lines = set(missing)
+        lines_covered = [line for line in statements if line not in missing_lines]
+        lines_missed = sorted(missing_lines)
+
+        total_lines = len(lines_covered) + len(lines_missed)
+        coverage_percentage = (
+            (len(lines_covered) / total_lines) if total_lines > 0 else 0
+        )
+
+        return LineSet(lines_covered), LineSet(lines_missed), coverage_percentage
+
+    def _load_coveragepy_data(self):
+        """
+        Loads a coverage.py data file, and finds the source file in the measured files.
+
+        Returns:
+            tuple: The loaded coverage.Coverage object, and the path of the source file to analyze, or None if the source
+            file was not measured.
+
+        Raises:
+            ImportError: If coverage.py is not installed.
+        """
+        try:
+            import coverage
+        except ImportError:
+            self.logger.error(
+                "The coveragepy coverage type requires coverage.py: pip install coverage"
+            )
+            raise
+
+        cov = coverage.Coverage(
+            data_file=self.file_path, config_file=self._find_coveragepy_config()
+        )
+        cov.load()
+        # Files measured in a validation sandbox are recorded with their absolute path in the sandbox
+        measured_files = {
+            normalize_report_path(self._map_report_path(measured_file)): measured_file
+            for measured_file in cov.get_data().measured_files()
+        }
+        measured_file = self.find_file_in_index(measured_files)
+        if measured_file is None:
+            return cov, None
+
+        # The data may have been collected from a directory that no longer exists, e.g. a removed sandbox
+        analyzed_file = (
+            measured_file if os.path.exists(measured_file) else self.src_file_path
+        )
+        return cov, analyzed_file
+
+    def _find_coveragepy_config(self):
+        """
+        Finds the coverage.py configuration file of the directory in which the test command ran, the way coverage.py
+        finds it in its current directory.
+
+        Returns:
+            The path of the configuration file, or False if there is none, so the defaults are used rather than the
+            configuration of the current directory.
+        """
+        config_dir = self.run_dir or os.path.dirname(os.path.abspath(self.file_path))
+        for file_name, section_marker in (
+            (".coveragerc", None),
+            ("setup.cfg", "[coverage:"),
+            ("tox.ini", "[coverage:"),
+            ("pyproject.toml", "[tool.coverage"),
+        ):
+            config_path = os.path.join(config_dir, file_name)
+            if not os.path.isfile(config_path):
+                continue
+            if section_marker is None:
+                return config_path
+            with open(config_path, "r", errors="replace") as config_file:
+                if section_marker in config_file.read():
+                    return config_path
+        return False
+
+    def _map_report_path(self, report_path: str) -> str:
+        """
+        Maps an absolute path recorded under the directory in which the test command ran, to the same path in the project
+        directory, so a report written in a validation sandbox matches the real source file.
+
+        Args:
+            report_path (str): A file path found in the report.
+
+        Returns:
+            str: The mapped path, or the path itself if it is not under the directory in which the test command ran.
+        """
+        if not self.run_dir or not os.path.isabs(report_path):
+            return report_path
+        try:
+            relative_path = os.path.relpath(
+                os.path.normpath(report_path), os.path.abspath(self.run_dir)
+            )
+        except ValueError:
+            return report_path  # On another drive
+        if relative_path == os.pardir or relative_path.startswith(
+            os.pardir + os.sep
+        ):
+            return report_path
+        return os.path.join(os.path.abspath(self.project_dir), relative_path)
+
+    def _src_path_parts(self, src_file_path: str = None) -> list:
+        """
+        Returns the components of the normalized absolute path of a source file.
+        """
+        return normalize_report_path(
+            os.path.abspath(src_file_path or self.src_file_path)
+        ).split("/")
+
+    @staticmethod
+    def _path_suffix_match_length(src_parts: list, report_path: str) -> int:
+        """
+        Returns the number of path components of a report path if it is a suffix of the source file path, or 0.
+        """
+        report_parts = normalize_report_path(report_path).split("/")
+        if len(report_parts) > len(src_parts):
+            return 0
+        if src_parts[-len(report_parts) :] != report_parts:
+            return 0
+        return len(report_parts)
+
+    def parse_coverage_report_jacoco(self) -> Tuple[LineSet, LineSet, float]:
+        """
+        Parses a JaCoCo code coverage report to extract covered and missed line numbers for a specific file,
         and calculates the coverage percentage.
 
-        Returns: Tuple[list, list, float]: A tuple containing empty lists of covered and missed line numbers,
-        and the coverage percentage. The reason being the format of the report for jacoco gives the totals we do not
-        sum them up. to stick with the current contract of the code and to do little change returning empty arrays.
-        I expect this should bring up a discussion on introduce a factory for different CoverageProcessors. Where the
-        total coverage percentage is returned to be evaluated only.
+        XML reports ('.xml') are parsed line by line. CSV reports only contain the totals of each class, so the sets of
+        covered and missed lines are empty, and the coverage percentage is computed from the totals of all the classes
+        declared in the source file.
+
+        Returns:
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
         """
+        if self.file_path.endswith(".xml"):
+            return self.parse_coverage_report_jacoco_xml()
+
         lines_covered, lines_missed = [], []
 
         package_name, class_name = self.extract_package_and_class_java()
-        missed, covered = self.parse_missed_covered_lines_jacoco(
-            package_name, class_name
-        )
+        missed, covered = 0, 0
+        for name in self._java_source_info()[1] or [class_name]:
+            class_missed, class_covered = self.parse_missed_covered_lines_jacoco(
+                package_name, name
+            )
+            missed += class_missed
+            covered += class_covered
 
         total_lines = missed + covered
         coverage_percentage = (float(covered) / total_lines) if total_lines > 0 else 0
 
-        return lines_covered, lines_missed, coverage_percentage
+        return LineSet(lines_covered), LineSet(lines_missed), coverage_percentage
+
+    def parse_coverage_report_jacoco_xml(self) -> Tuple[LineSet, LineSet, float]:
+        """
+        Parses a JaCoCo XML code coverage report to extract covered and missed line numbers for a specific file,
+        and calculates the coverage percentage.
+
+        The report is streamed with `iterparse`, and only the lines of the <sourcefile> element of the source file, in
+        the package declared by the source file, are read. A line is covered if at least one of its instructions is.
+
+        Returns:
+            Tuple[LineSet, LineSet, float]: A tuple containing the sets of covered and missed line numbers, and the coverage percentage.
+        """
+        lines_covered, lines_missed = [], []
+        xml_lines = self._read_jacoco_xml_lines()
+        for line_number, (mi, ci, _, _) in sorted(xml_lines.items()):
+            if ci > 0:
+                lines_covered.append(line_number)
+            elif mi > 0:
+                lines_missed.append(line_number)
+
+        total_lines = len(lines_covered) + len(lines_missed)
+        coverage_percentage = (
+            (len(lines_covered) / total_lines) if total_lines > 0 else 0
+        )
+
+        return LineSet(lines_covered), LineSet(lines_missed), coverage_percentage
+
+    def _read_jacoco_xml_lines(self) -> dict:
+        """
+        Streams a JaCoCo XML report, and reads the lines of the <sourcefile> element of the source file, in the package
+        declared by the source file.
+
+        Returns:
+            dict: A dictionary mapping each line number to its missed and covered instructions, and missed and covered
+            branches (the 'mi', 'ci', 'mb' and 'cb' attributes).
+        """
+        return self._get_cached_parse_result(
+            self._src_cache_key("jacoco_lines"), self._read_jacoco_xml_lines_uncached
+        )
+
+    def _read_jacoco_xml_lines_uncached(self) -> dict:
+        package_name, _ = self.extract_package_and_class_java()
+        package_path = package_name.replace(".", "/")
+        source_file_name = os.path.basename(self.src_file_path)
+
+        lines = {}
+        current_package = None
+        in_target_source_file = False
+        for event, elem in ET.iterparse(self.file_path, events=("start", "end")):
+            if event == "start":
+                if elem.tag == "package":
+                    current_package = elem.get("name")
+                elif elem.tag == "sourcefile":
+                    in_target_source_file = (
+                        current_package == package_path
+                        and elem.get("name") == source_file_name
+                    )
+                continue
+
+            if elem.tag == "line":
+                if in_target_source_file:
+                    lines[int(elem.get("nr"))] = tuple(
+                        int(elem.get(attribute, 0))
+                        for attribute in ("mi", "ci", "mb", "cb")
+                    )
+                elem.clear()
+            elif elem.tag == "sourcefile":
+                if in_target_source_file:
+                    break  # The source file is only reported once
+                elem.clear()
+            elif elem.tag in ("class", "package"):
+                elem.clear()
+
+        return lines
 
     def parse_missed_covered_lines_jacoco(
         self, package_name: str, class_name: str
     ) -> tuple[int, int]:
+        """
+        Sums the missed and covered lines of a class, and of its nested classes, in a JaCoCo CSV report.
+        """
         with open(self.file_path, "r") as file:
             reader = csv.DictReader(file)
             missed, covered = 0, 0
             for row in reader:
-                if row["PACKAGE"] == package_name and row["CLASS"] == class_name:
+                if row["PACKAGE"] == package_name and (
+                    row["CLASS"] == class_name
+                    or row["CLASS"].startswith(class_name + ".")
+                ):
                     try:
-                        missed = int(row["LINE_MISSED"])
-                        covered = int(row["LINE_COVERED"])
-                        break
+                        missed += int(row["LINE_MISSED"])
+                        covered += int(row["LINE_COVERED"])
                     except KeyError as e:
-                        self.logger.error("Missing expected column in CSV: {e}")
+                        self.logger.error(f"Missing expected column in CSV: {e}")
                         raise
 
         return missed, covered
 
     def extract_package_and_class_java(self):
-        package_pattern = re.compile(r"^\s*package\s+([\w\.]+)\s*;.*$")
-        class_pattern = re.compile(r"^\s*public\s+class\s+(\w+).*")
+        """
+        Extracts the package of the Java source file, and its main class: the public top-level type if there is one,
+        otherwise the first top-level type declared in the file.
+        """
+        package_name, class_names, public_class_name = self._java_source_info()
+        class_name = public_class_name or (class_names[0] if class_names else "")
+        return package_name, class_name
+
+    def _java_source_info(self):
+        """
+        Reads the package and the top-level types declared in the Java source file.
+
+        The result is cached per source file, and only read again once the file was modified.
+
+        Returns:
+            tuple: The package name, the names of the top-level types, and the name of the public top-level type (or "").
+        """
+        try:
+            cache_key = (
+                os.path.abspath(self.src_file_path),
+                os.path.getmtime(self.src_file_path),
+            )
+        except OSError:
+            cache_key = None  # The source file is only read, not cached
+        if cache_key in _java_source_info_cache:
+            return _java_source_info_cache[cache_key]
 
         package_name = ""
-        class_name = ""
+        class_names = []
+        public_class_name = ""
+        depth = 0
         try:
             with open(self.src_file_path, "r") as file:
                 for line in file:
                     if not package_name:  # Only match package if not already found
-                        package_match = package_pattern.match(line)
+                        package_match = _JAVA_PACKAGE_PATTERN.match(line)
                         if package_match:
                             package_name = package_match.group(1)
 
-                    if not class_name:  # Only match class if not already found
-                        class_match = class_pattern.match(line)
+                    # Only declarations outside of any brace are top-level types
+                    code = _JAVA_COMMENT_OR_LITERAL_PATTERN.sub("", line)
+                    if depth == 0:
+                        class_match = _JAVA_CLASS_PATTERN.match(code)
                         if class_match:
-                            class_name = class_match.group(1)
-
-                    if package_name and class_name:  # Exit loop if both are found
-                        break
+                            class_names.append(class_match.group(3))
+                            if not public_class_name and "public" in (
+                                class_match.group(1) or ""
+                            ).split():
+                                public_class_name = class_match.group(3)
+                    depth = max(0, depth + code.count("{") - code.count("}"))
         except (FileNotFoundError, IOError) as e:
             self.logger.error(f"Error reading file {self.src_file_path}: {e}")
             raise
 
-        return package_name, class_name
+        result = (package_name, class_names, public_class_name)
+        if cache_key is not None:
+            _java_source_info_cache[cache_key] = result
+        return result
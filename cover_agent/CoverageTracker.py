@@ -0,0 +1,127 @@
+import re
+
+from cover_agent.LineSet import LineSet
+
+
+class CoverageTracker:
+    def __init__(self):
+        """
+        Initializes a tracker of the coverage of the source file.
+
+        The tracker keeps the sets of covered and missed lines of the last accepted coverage run, so the coverage of a
+        new run can be compared to it line by line rather than by percentage.
+
+        Attributes:
+            lines_covered (LineSet): The lines covered by the last accepted run.
+            lines_missed (LineSet): The lines missed by the last accepted run.
+            percentage_covered (float): The coverage percentage of the last accepted run.
+            branches (dict): The number of covered and total branches of each line with branches, in the last accepted run.
+        """
+        self.lines_covered = LineSet()
+        self.lines_missed = LineSet()
+        self.percentage_covered = 0
+        self.branches = {}
+
+    def update(
+        self, lines_covered, lines_missed, percentage_covered: float, branches=None
+    ):
+        """
+        Makes the coverage of a run the new reference.
+
+        Parameters:
+            lines_covered (LineSet): The covered lines of the run.
+            lines_missed (LineSet): The missed lines of the run.
+            percentage_covered (float): The coverage percentage of the run.
+            branches (dict, optional): The number of covered and total branches of each line with branches. Defaults to None.
+        """
+        self.lines_covered = LineSet(lines_covered)
+        self.lines_missed = LineSet(lines_missed)
+        self.percentage_covered = percentage_covered
+        self.branches = dict(branches or {})
+
+    def compare(
+        self,
+        lines_covered,
+        lines_missed,
+        percentage_covered: float,
+        lines_to_cover=None,
+        branches=None,
+    ) -> dict:
+        """
+        Compares the coverage of a run to the reference coverage.
+
+        Parameters:
+            lines_covered (LineSet): The covered lines of the run.
+            lines_missed (LineSet): The missed lines of the run.
+            percentage_covered (float): The coverage percentage of the run.
+            lines_to_cover (optional): The lines that the tested change claims to cover, as line numbers or as text
+                containing line numbers and ranges (e.g. "12-14, 20"). Defaults to None.
+            branches (dict, optional): The number of covered and total branches of each line with branches. Defaults to None.
+
+        Returns:
+            dict: A dictionary containing:
+                - 'lines_covered' (LineSet): The covered lines of the run.
+                - 'lines_missed' (LineSet): The missed lines of the run.
+                - 'newly_covered' (LineSet): The lines covered by the run, that were not covered by the reference.
+                - 'newly_missed' (LineSet): The lines missed by the run, that were covered by the reference.
+                - 'lines_to_cover_covered' (LineSet): The claimed lines that are newly covered.
+                - 'lines_to_cover_missed' (LineSet): The claimed lines that are still missed.
+                - 'branches' (dict): The branches of the run.
+                - 'newly_covered_branches' (int): The number of branches covered by the run, that were not covered by
+                  the reference.
+                - 'percentage_covered' (float): The coverage percentage of the run.
+                - 'increased' (bool): Whether the run covers lines or branches that the reference did not. When the
+                  report has no line data (e.g. JaCoCo CSV totals), whether the coverage percentage increased.
+        """
+        lines_covered = LineSet(lines_covered)
+        lines_missed = LineSet(lines_missed)
+        claimed_lines = parse_line_numbers(lines_to_cover)
+        newly_covered = lines_covered - self.lines_covered
+        branches = dict(branches or {})
+        # A test can cover a new branch of a line that was already covered
+        newly_covered_branches = sum(
+            max(0, covered - self.branches.get(line_number, (0, 0))[0])
+            for line_number, (covered, _) in branches.items()
+        )
+        if lines_covered or lines_missed:
+            increased = bool(newly_covered) or newly_covered_branches > 0
+        else:
+            increased = percentage_covered > self.percentage_covered
+        return {
+            "lines_covered": lines_covered,
+            "lines_missed": lines_missed,
+            "newly_covered": newly_covered,
+            "newly_missed": lines_missed & self.lines_covered,
+            "lines_to_cover_covered": claimed_lines & newly_covered,
+            "lines_to_cover_missed": claimed_lines & lines_missed,
+            "branches": branches,
+            "newly_covered_branches": newly_covered_branches,
+            "percentage_covered": percentage_covered,
+            "increased": increased,
+        }
+
+
+def parse_line_numbers(lines) -> LineSet:
+    """
+    Parses line numbers written by a person or a model, e.g. "[12, 13]" or "12-14, 20", into a line set.
+
+    Parameters:
+        lines: A line set, an iterable of line numbers, text, or None.
+
+    Returns:
+        LineSet: The parsed line numbers.
+    """
+    if lines is None:
+        return LineSet()
+    if not isinstance(lines, str):
+        try:
+            return LineSet(lines)
+        except (TypeError, ValueError):
+            lines = str(lines)
+    line_set = LineSet()
+    for start, end in re.findall(r"(\d+)(?:\s*-\s*(\d+))?", lines):
+        start = int(start)
+        end = int(end) if end else start
+        if end >= start:
+            line_set |= LineSet.from_ranges([(start, end)])
+    return line_set
@@ -1,12 +1,24 @@
+import functools
 import logging
 import os
+import threading
 
-from jinja2 import Environment, StrictUndefined
+import litellm
+from jinja2 import Environment, StrictUndefined, meta
 
+from cover_agent.CondensedTestFile import CondensedTestFile
+from cover_agent.LineSet import LineSet
+from cover_agent.SourceSlicer import SourceSlicer
 from cover_agent.settings.config_loader import get_settings
 
 MAX_TESTS_PER_RUN = 4
 
+# Prompt templates are compiled once per process, keyed on their source
+_environment = Environment(undefined=StrictUndefined)
+_compiled_templates = {}
+_template_variables_cache = {}
+_templates_lock = threading.Lock()
+
 # Markdown text used as conditional appends
 ADDITIONAL_INCLUDES_TEXT = """
 ## Additional Includes
@@ -23,6 +35,18 @@ ADDITIONAL_INSTRUCTIONS_TEXT = """
 ======
 """
 
+# Template variables that are filled within the prompt token budget, from the highest to the lowest priority
+BUDGETED_SECTIONS = [
+    "code_coverage_report",
+    "source_file_numbered_sliced",
+    "source_file_numbered",
+    "source_file",
+    "failed_tests_section",
+    "test_file_numbered",
+    "test_file",
+    "additional_includes_section",
+]
+
 FAILED_TESTS_TEXT = """
 ## Previous Iterations Failed Tests
 Below is a list of failed tests that you generated in previous iterations. Do not generate the same tests again, and take the failed tests into account when generating new tests.
@@ -42,6 +66,10 @@ class PromptBuilder:
         additional_instructions: str = "",
         failed_test_runs: str = "",
         language: str = "python",
+        lines_missed=None,
+        model: str = "",
+        max_prompt_tokens: int = 0,
+        condensed_test_file_top_k: int = 0,
     ):
         """
         The `PromptBuilder` class is responsible for building a formatted prompt string by replacing placeholders with the actual content of files read during initialization. It takes in various paths and settings as parameters and provides a method to generate the prompt.
@@ -55,6 +83,15 @@ class PromptBuilder:
             additional_instructions (str): The formatted additional instructions section.
             failed_test_runs (str): The formatted failed test runs section.
             language (str): The programming language of the source and test files.
+            source_file_numbered_sliced (str): The numbered source file reduced to the code relevant to the missed lines,
+                or the full numbered source file when it cannot be sliced. Templates opt in to it instead of 'source_file_numbered'.
+            model (str): The model the prompt is sent to, whose tokenizer counts the tokens of the prompt.
+            max_prompt_tokens (int): The token budget of the prompt. When the prompt exceeds it, the sections in
+                'BUDGETED_SECTIONS' are filled in priority order and the lower priority ones are trimmed. 0 disables the budget.
+            condensed_test_file_top_k (int): When greater than 0, 'test_file' and 'test_file_numbered' are condensed:
+                the code shared by the tests is kept, along with the given number of tests that are the most relevant to the
+                missed lines, and the other tests are reduced to their signatures.
+            section_token_counts (dict): The number of tokens of each budgeted section in the last prompt built within a budget.
 
         Methods:
             __init__(self, prompt_template_path: str, source_file_path: str, test_file_path: str, code_coverage_report: str, included_files: str = "", additional_instructions: str = "", failed_test_runs: str = "")
@@ -63,22 +100,24 @@ class PromptBuilder:
             _read_file(self, file_path)
                 Helper method to read the content of a file.
 
+            update(self, code_coverage_report: str, failed_test_runs: str = "", lines_missed=None)
+                Re-reads the test file and refreshes the sections that change between iterations.
+
             build_prompt(self)
                 Replaces placeholders with the actual content of files read during initialization and returns the formatted prompt string.
         """
         self.source_file_name = os.path.basename(source_file_path)
         self.test_file_name = os.path.basename(test_file_path)
+        self.source_file_path = source_file_path
+        self.test_file_path = test_file_path
         self.source_file = self._read_file(source_file_path)
-        self.test_file = self._read_file(test_file_path)
-        self.code_coverage_report = code_coverage_report
         self.language = language
+        self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.condensed_test_file_top_k = condensed_test_file_top_k
+        self.section_token_counts = {}
         # add line numbers to each line in 'source_file'. start from 1
-        self.source_file_numbered = "\n".join(
-            [f"{i + 1} {line}" for i, line in enumerate(self.source_file.split("\n"))]
-        )
-        self.test_file_numbered = "\n".join(
-            [f"{i + 1} {line}" for i, line in enumerate(self.test_file.split("\n"))]
-        )
+        self.source_file_numbered = number_lines(self.source_file)
 
         # Conditionally fill in optional sections
         self.included_files = (
@@ -93,11 +132,45 @@ class PromptBuilder:
             if additional_instructions
             else ""
         )
+        self.update(code_coverage_report, failed_test_runs, lines_missed)
+
+    def update(
+        self, code_coverage_report: str, failed_test_runs: str = "", lines_missed=None
+    ):
+        """
+        Refresh the sections that change between iterations, so a single builder can be reused for the whole run: the
+        test file is read again, while the source file, which is not modified, is kept. Views derived from the files are
+        cached on their content, so they are only recomputed when their inputs changed.
+
+        Parameters:
+            code_coverage_report (str): The code coverage report.
+            failed_test_runs (str, optional): The failed test runs of the previous iterations. Defaults to an empty string.
+            lines_missed (iterable, optional): The line numbers that are not covered by the tests. Defaults to None.
+        """
+        self.code_coverage_report = code_coverage_report
         self.failed_test_runs = (
             FAILED_TESTS_TEXT.format(failed_test_runs=failed_test_runs)
             if failed_test_runs
             else ""
         )
+        # Reduced view of the source file around the missed lines, with the original line numbers
+        self.source_file_numbered_sliced = (
+            _slice_source(
+                self.source_file_path, self.source_file, LineSet(lines_missed or [])
+            )
+            or self.source_file_numbered
+        )
+        self.test_file = self._read_file(self.test_file_path)
+        self.test_file_numbered = number_lines(self.test_file)
+        if self.condensed_test_file_top_k > 0:
+            condensed_test_file = _condense_test_file(
+                self.test_file_path,
+                self.test_file,
+                self.source_file_numbered_sliced,
+                self.condensed_test_file_top_k,
+            )
+            if condensed_test_file:
+                self.test_file, self.test_file_numbered = condensed_test_file
 
     def _read_file(self, file_path):
         """
@@ -125,10 +198,17 @@ class PromptBuilder:
         Returns:
             str: The formatted prompt string.
         """
+        return self._render_prompt("test_generation_prompt")
+
+    def build_prompt_custom(self, file) -> dict:
+        return self._render_prompt(file)
+
+    def _render_prompt(self, file) -> dict:
         variables = {
             "source_file_name": self.source_file_name,
             "test_file_name": self.test_file_name,
             "source_file_numbered": self.source_file_numbered,
+            "source_file_numbered_sliced": self.source_file_numbered_sliced,
             "test_file_numbered": self.test_file_numbered,
             "source_file": self.source_file,
             "test_file": self.test_file,
@@ -139,46 +219,149 @@ class PromptBuilder:
             "language": self.language,
             "max_tests": MAX_TESTS_PER_RUN,
         }
-        environment = Environment(undefined=StrictUndefined)
         try:
-            system_prompt = environment.from_string(
-                get_settings().test_generation_prompt.system
-            ).render(variables)
-            user_prompt = environment.from_string(
-                get_settings().test_generation_prompt.user
-            ).render(variables)
+            system_template = get_settings().get(file).system
+            user_template = get_settings().get(file).user
+            if self.max_prompt_tokens:
+                variables = self._fit_token_budget(
+                    variables, [system_template, user_template]
+                )
+            system_prompt = compile_template(system_template).render(variables)
+            user_prompt = compile_template(user_template).render(variables)
         except Exception as e:
             logging.error(f"Error rendering prompt: {e}")
             return {"system": "", "user": ""}
 
-        # print(f"#### user_prompt:\n\n{user_prompt}")
         return {"system": system_prompt, "user": user_prompt}
 
-    def build_prompt_custom(self, file) -> dict:
-        variables = {
-            "source_file_name": self.source_file_name,
-            "test_file_name": self.test_file_name,
-            "source_file_numbered": self.source_file_numbered,
-            "test_file_numbered": self.test_file_numbered,
-            "source_file": self.source_file,
-            "test_file": self.test_file,
-            "code_coverage_report": self.code_coverage_report,
-            "additional_includes_section": self.included_files,
-            "failed_tests_section": self.failed_test_runs,
-            "additional_instructions_text": self.additional_instructions,
-            "language": self.language,
-            "max_tests": MAX_TESTS_PER_RUN,
-        }
-        environment = Environment(undefined=StrictUndefined)
-        try:
-            system_prompt = environment.from_string(
-                get_settings().get(file).system
-            ).render(variables)
-            user_prompt = environment.from_string(get_settings().get(file).user).render(
-                variables
+    def _fit_token_budget(self, variables: dict, templates: list):
+        """
+        Fill the budgeted sections used by the templates in priority order, within the prompt token budget.
+
+        The tokens of the rest of the prompt are counted first. Each section then gets the budget left by the sections
+        of higher priority: the full source file is replaced with its slice around the missed lines when it does not fit,
+        and sections that still do not fit are trimmed to their first lines.
+
+        Parameters:
+            variables (dict): The template variables.
+            templates (list): The templates of the prompt.
+
+        Returns:
+            dict: The template variables, with the budgeted sections fitted to the budget.
+        """
+        used_variables = set()
+        for template in templates:
+            used_variables |= _template_variables(template)
+        sections = [name for name in BUDGETED_SECTIONS if name in used_variables]
+
+        variables = dict(variables)
+        empty_sections = dict(variables, **{name: "" for name in sections})
+        remaining_tokens = self.max_prompt_tokens - sum(
+            count_tokens(compile_template(template).render(empty_sections), self.model)
+            for template in templates
+        )
+        self.section_token_counts = {}
+        for name in sections:
+            text = variables[name]
+            tokens = count_tokens(text, self.model)
+            if tokens > remaining_tokens and name == "source_file_numbered":
+                text = self.source_file_numbered_sliced
+                tokens = count_tokens(text, self.model)
+            if tokens > remaining_tokens:
+                text = self._trim_to_tokens(text, remaining_tokens)
+                tokens = count_tokens(text, self.model)
+            variables[name] = text
+            remaining_tokens -= tokens
+            self.section_token_counts[name] = tokens
+
+        logging.info(
+            f"Prompt section token counts (budget {self.max_prompt_tokens}): "
+            + ", ".join(
+                f"{name}={tokens}"
+                for name, tokens in self.section_token_counts.items()
             )
-        except Exception as e:
-            logging.error(f"Error rendering prompt: {e}")
-            return {"system": "", "user": ""}
+        )
+        return variables
 
-        return {"system": system_prompt, "user": user_prompt}
+    def _trim_to_tokens(self, text: str, max_tokens: int) -> str:
+        """
+        Keep the first lines of a text that fit in a number of tokens, followed by a note on the omitted lines.
+        """
+        lines = text.split("\n")
+        tokens = count_tokens(text, self.model)
+        # Estimate the number of lines that fit from the average line size, then shrink until they fit
+        kept_line_count = int(len(lines) * max(max_tokens, 0) / max(tokens, 1))
+        while kept_line_count > 0:
+            trimmed_text = "\n".join(lines[:kept_line_count]) + (
+                f"\n... [{len(lines) - kept_line_count} lines omitted to fit the prompt token budget]"
+            )
+            if count_tokens(trimmed_text, self.model) <= max_tokens:
+                return trimmed_text
+            kept_line_count = min(kept_line_count - 1, int(kept_line_count * 0.9))
+        return ""
+
+
+def compile_template(template: str):
+    """
+    Compile a prompt template, once per process for each template source.
+
+    Parameters:
+        template (str): The source of the Jinja2 template.
+
+    Returns:
+        Template: The compiled template.
+    """
+    with _templates_lock:
+        if template not in _compiled_templates:
+            _compiled_templates[template] = _environment.from_string(template)
+        return _compiled_templates[template]
+
+
+def _template_variables(template: str) -> frozenset:
+    with _templates_lock:
+        if template not in _template_variables_cache:
+            _template_variables_cache[template] = frozenset(
+                meta.find_undeclared_variables(_environment.parse(template))
+            )
+        return _template_variables_cache[template]
+
+
+@functools.lru_cache(maxsize=32)
+def number_lines(text: str) -> str:
+    """
+    Add line numbers to each line of a text, starting from 1. The numbered texts are cached on the content of the text.
+    """
+    return "\n".join([f"{i + 1} {line}" for i, line in enumerate(text.split("\n"))])
+
+
+@functools.lru_cache(maxsize=32)
+def _slice_source(source_file_path: str, source: str, lines_missed: LineSet):
+    return SourceSlicer(source_file_path, source).slice(lines_missed)
+
+
+@functools.lru_cache(maxsize=32)
+def _condense_test_file(test_file_path: str, test_file: str, query: str, top_k: int):
+    return CondensedTestFile(test_file_path, test_file).condense(query, top_k)
+
+
+@functools.lru_cache(maxsize=256)
+def count_tokens(text: str, model: str = "") -> int:
+    """
+    Count the tokens of a text with the tokenizer of a model, or estimate them as one token per 4 characters when the
+    tokenizer is not available. The counts are cached, as most sections do not change between iterations.
+
+    Parameters:
+        text (str): The text.
+        model (str, optional): The name of the model. Defaults to an empty string, which estimates the tokens.
+
+    Returns:
+        int: The number of tokens.
+    """
+    if not text:
+        return 0
+    if model:
+        try:
+            return litellm.token_counter(model=model, text=text)
+        except Exception:
+            pass
+    return len(text) // 4
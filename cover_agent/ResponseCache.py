@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import tempfile
+
+from cover_agent.CustomLogger import CustomLogger
+
+CACHE_MODES = ["read-write", "read-only", "bypass"]
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        cache_dir: str,
+        mode: str = "read-write",
+        max_size_bytes: int = 512 * 1024 * 1024,
+    ):
+        """
+        Initializes a content-addressed, on-disk cache of LLM responses.
+
+        Each response is stored in its own JSON file, named after the hash of the request that produced it. The file
+        modification time is refreshed on every hit, and the least recently used entries are evicted once the total size
+        of the cache exceeds 'max_size_bytes'.
+
+        Parameters:
+            cache_dir (str): The directory in which the responses are stored.
+            mode (str, optional): "read-write" to read and store responses, "read-only" to only read them, or "bypass" to disable the cache. Defaults to "read-write".
+            max_size_bytes (int, optional): The maximum total size of the cached responses, in bytes. Defaults to 512 MB.
+
+        Raises:
+            ValueError: If the cache mode is not supported.
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(
+                f"Unsupported cache mode: {mode}. Supported modes: {CACHE_MODES}"
+            )
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.max_size_bytes = max_size_bytes
+        self.logger = CustomLogger.get_logger(__name__)
+        if self.mode != "bypass":
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(model: str, messages: list, max_tokens: int, temperature: float):
+        """
+        Compute the cache key of a request.
+
+        Parameters:
+            model (str): The name of the model.
+            messages (list): The chat messages sent to the model.
+            max_tokens (int): The maximum number of tokens to generate in the response.
+            temperature (float): The sampling temperature.
+
+        Returns:
+            str: The SHA-256 hex digest of the request.
+        """
+        request = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """
+        Look up a cached response.
+
+        Parameters:
+            key (str): The cache key of the request.
+
+        Returns:
+            tuple: A tuple containing the response, the prompt token count and the response token count, or None on a cache miss.
+        """
+        if self.mode == "bypass":
+            return None
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+            # Refresh the modification time, which is used as the LRU order
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        self.logger.info(f"Using cached LLM response {key[:12]}")
+        return (
+            entry["response"],
+            int(entry["prompt_tokens"]),
+            int(entry["completion_tokens"]),
+        )
+
+    def put(
+        self, key: str, response: str, prompt_tokens: int, completion_tokens: int
+    ):
+        """
+        Store a response in the cache, and evict the least recently used entries if the cache grew too large.
+
+        Parameters:
+            key (str): The cache key of the request.
+            response (str): The response of the model.
+            prompt_tokens (int): The number of tokens used from the prompt.
+            completion_tokens (int): The number of tokens in the response.
+        """
+        if self.mode != "read-write":
+            return
+        entry = {
+            "response": response,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        # Write to a temporary file first, so a concurrent reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError as e:
+            self.logger.warning(f"Failed to store LLM response in the cache: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _entry_path(self, key: str):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _evict(self):
+        """
+        Remove the least recently used entries until the cache fits in 'max_size_bytes'.
+        """
+        evict_least_recently_used(self.cache_dir, self.max_size_bytes)
+
+
+def evict_least_recently_used(cache_dir: str, max_size_bytes: int):
+    """
+    Remove the least recently used JSON entries of a cache directory until their total size fits in 'max_size_bytes'.
+
+    Parameters:
+        cache_dir (str): The directory of the cache.
+        max_size_bytes (int): The maximum total size of the entries, in bytes.
+    """
+    entries = []
+    total_size = 0
+    with os.scandir(cache_dir) as it:
+        for dir_entry in it:
+            if not dir_entry.name.endswith(".json"):
+                continue
+            try:
+                stat = dir_entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, dir_entry.path))
+            total_size += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total_size <= max_size_bytes:
+            break
+        try:
+            os.remove(path)
+            total_size -= size
+        except OSError:
+            pass
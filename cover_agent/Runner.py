@@ -1,27 +1,367 @@
+import asyncio
+import collections
+import os
+import signal
 import subprocess
+import sys
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cover_agent.CustomLogger import CustomLogger
+
+# Default number of bytes of each output stream kept in memory: half from the start and half from the end of the stream
+DEFAULT_MAX_OUTPUT_BYTES = 1024 * 1024
+_READ_CHUNK_BYTES = 64 * 1024
+
+# Number of files holding the full output of long outputs that are kept; older ones are deleted
+MAX_SPILL_FILES = 10
+_spill_paths = collections.deque()
+_spill_paths_lock = threading.Lock()
+
+# The Proactor event loop of Windows cannot read the pipes of a Popen process, which are not overlapped
+_READ_PIPES_IN_THREADS = os.name != "posix"
+
+logger = CustomLogger.get_logger(__name__)
 
 
 class Runner:
     @staticmethod
-    def run_command(command, cwd=None):
+    def run_command(
+        command,
+        cwd=None,
+        timeout=None,
+        max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES,
+        cache=None,
+    ):
         """
         Executes a shell command in a specified working directory and returns its output, error, and exit code.
 
         Parameters:
             command (str): The shell command to execute.
             cwd (str, optional): The working directory in which to execute the command. Defaults to None.
+            timeout (float, optional): The maximum wall-clock time of the command, in seconds. When it is exceeded, the
+                whole process group of the command is killed. Defaults to None, which waits for the command to finish.
+            max_output_bytes (int, optional): The number of bytes of each output stream kept in memory. The beginning and
+                the end of a longer output are kept, and the full output is written to a temporary file. Defaults to 1 MiB.
+            cache (CommandResultCache, optional): A cache of command results. When the command was already run on the
+                same inputs, its cached result is returned without running it again. Defaults to None.
+
+        Returns:
+            CommandResult: A tuple containing the standard output ('stdout'), standard error ('stderr'), exit code ('exit_code'), and the time of the executed command ('command_start_time'), with the resources used by the command as attributes.
+        """
+        if cache is not None:
+            wall_start_time = time.perf_counter()
+            cache_key = cache.make_key(command, cwd)
+            cached_result = cache.get(cache_key)
+            if cached_result is not None:
+                return CommandResult(
+                    *cached_result,
+                    command=command,
+                    wall_time=time.perf_counter() - wall_start_time,
+                    cached=True,
+                )
+            command_result = Runner.run_command(
+                command, cwd=cwd, timeout=timeout, max_output_bytes=max_output_bytes
+            )
+            # A command killed on timeout may succeed on a less loaded machine
+            if not command_result.timed_out:
+                cache.put(cache_key, *command_result)
+            return command_result
+
+        coroutine = Runner.run_command_async(
+            command, cwd=cwd, timeout=timeout, max_output_bytes=max_output_bytes
+        )
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coroutine)
+        # An event loop is already running in this thread, so run the command in a thread with its own loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coroutine).result()
+
+    @staticmethod
+    async def run_command_async(
+        command, cwd=None, timeout=None, max_output_bytes=DEFAULT_MAX_OUTPUT_BYTES
+    ):
+        """
+        Asynchronously executes a shell command in its own process group. See `run_command` for the parameters.
+
+        On POSIX systems, the output pipes are read by the event loop, and the command is reaped with `os.wait4`, which
+        gives the resources used by the command and the processes it waited for, even when several commands run at the
+        same time. Elsewhere, the output pipes are read by threads.
 
         Returns:
-            tuple: A tuple containing the standard output ('stdout'), standard error ('stderr'), exit code ('exit_code'), and the time of the executed command ('command_start_time').
+            CommandResult: The result of the command, which unpacks like a (stdout, stderr, exit_code, command_start_time) tuple.
         """
+        loop = asyncio.get_running_loop()
         # Get the current time before running the test command, in milliseconds
         command_start_time = int(round(time.time() * 1000))
+        wall_start_time = time.perf_counter()
 
-        # Ensure the command is executed with shell=True for string commands
-        result = subprocess.run(
-            command, shell=True, cwd=cwd, text=True, capture_output=True
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Run the command in a new process group, so a timeout kills the processes it started too
+            start_new_session=os.name == "posix",
         )
+        stdout_capture = BoundedOutput(max_output_bytes)
+        stderr_capture = BoundedOutput(max_output_bytes)
+        wait_future = loop.run_in_executor(None, _wait_for_exit, process)
+        read_pipe = _read_pipe_in_thread if _READ_PIPES_IN_THREADS else _read_pipe
+        read_futures = [
+            asyncio.ensure_future(read_pipe(loop, process.stdout, stdout_capture)),
+            asyncio.ensure_future(read_pipe(loop, process.stderr, stderr_capture)),
+        ]
+        timed_out = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*read_futures, asyncio.shield(wait_future)),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            # Also kill the processes that outlived the command and keep its output pipes open
+            _kill_process_group(process)
+        finally:
+            if not wait_future.done():
+                _kill_process_group(process)
+            exit_code, rusage = await wait_future
+            # A reading thread closes its pipe itself, as it may still be reading from a process that outlived the command
+            if not _READ_PIPES_IN_THREADS:
+                process.stdout.close()
+                process.stderr.close()
+
+        stderr = stderr_capture.getvalue()
+        if timed_out:
+            stderr += f"\nCommand timed out after {timeout} seconds and was killed."
+        return CommandResult(
+            stdout_capture.getvalue(),
+            stderr,
+            exit_code,
+            command_start_time,
+            command=command,
+            wall_time=time.perf_counter() - wall_start_time,
+            user_time=rusage.ru_utime if rusage else None,
+            system_time=rusage.ru_stime if rusage else None,
+            max_rss_kb=_max_rss_kb(rusage) if rusage else None,
+            signal=-exit_code if exit_code < 0 else None,
+            timed_out=timed_out,
+        )
+
+
+class CommandResult(tuple):
+    """
+    The result of a command: its output, exit code and start time, along with the resources it used.
+
+    It is a (stdout, stderr, exit_code, command_start_time) tuple, so existing callers can keep unpacking it, with the
+    resource usage in additional attributes:
+        command (str): The executed command.
+        wall_time (float): The wall-clock time of the command, in seconds.
+        user_time (float): The user CPU time of the command, in seconds, or None if it is not available.
+        system_time (float): The system CPU time of the command, in seconds, or None if it is not available.
+        max_rss_kb (int): The maximum resident set size of the command, in kilobytes, or None if it is not available.
+        signal (int): The signal that terminated the command, or None if it exited.
+        timed_out (bool): Whether the command was killed because it exceeded its timeout.
+        cached (bool): Whether the result was returned from a cache instead of running the command.
+    """
+
+    def __new__(
+        cls,
+        stdout,
+        stderr,
+        exit_code,
+        command_start_time,
+        command="",
+        wall_time=0.0,
+        user_time=None,
+        system_time=None,
+        max_rss_kb=None,
+        signal=None,
+        timed_out=False,
+        cached=False,
+    ):
+        result = super().__new__(cls, (stdout, stderr, exit_code, command_start_time))
+        result.command = command
+        result.wall_time = wall_time
+        result.user_time = user_time
+        result.system_time = system_time
+        result.max_rss_kb = max_rss_kb
+        result.signal = signal
+        result.timed_out = timed_out
+        result.cached = cached
+        return result
+
+    @property
+    def stdout(self):
+        return self[0]
+
+    @property
+    def stderr(self):
+        return self[1]
+
+    @property
+    def exit_code(self):
+        return self[2]
+
+    @property
+    def command_start_time(self):
+        return self[3]
+
+
+class BoundedOutput:
+    def __init__(self, max_bytes: int = DEFAULT_MAX_OUTPUT_BYTES):
+        """
+        Captures an output stream with a bounded amount of memory.
+
+        The first and the last 'max_bytes / 2' bytes of the stream are kept in memory. As soon as the stream is longer
+        than 'max_bytes', the full stream is written to a temporary file instead of being held in memory. Only the
+        'MAX_SPILL_FILES' most recent temporary files are kept.
+
+        Parameters:
+            max_bytes (int, optional): The number of bytes kept in memory. Defaults to 1 MiB.
+        """
+        self.half_max_bytes = max(1, max_bytes // 2)
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total_bytes = 0
+        self.spill_file = None
+
+    @property
+    def spill_path(self):
+        """
+        The path of the temporary file holding the full output, or None if the full output fits in memory.
+        """
+        return self.spill_file.name if self.spill_file else None
+
+    def write(self, data: bytes):
+        self.total_bytes += len(data)
+        if self.spill_file is None and self.total_bytes > 2 * self.half_max_bytes:
+            # Nothing was dropped from the head and the tail yet, so they still hold the whole output
+            self.spill_file = tempfile.NamedTemporaryFile(
+                prefix="cover_agent_output_", suffix=".log", delete=False
+            )
+            self.spill_file.write(self.head)
+            self.spill_file.write(self.tail)
+            _register_spill_file(self.spill_file.name)
+        if self.spill_file is not None:
+            self.spill_file.write(data)
+
+        head_room = self.half_max_bytes - len(self.head)
+        if head_room > 0:
+            self.head += data[:head_room]
+            data = data[head_room:]
+        self.tail += data
+        if len(self.tail) > self.half_max_bytes:
+            del self.tail[: len(self.tail) - self.half_max_bytes]
+
+    def close(self):
+        if self.spill_file is not None:
+            self.spill_file.close()
+
+    def getvalue(self) -> str:
+        """
+        Returns the captured output as text. When the output was too long, the middle of the output is replaced with a
+        note giving the number of omitted bytes and the path of the file holding the full output.
+        """
+        self.close()
+        omitted_bytes = self.total_bytes - len(self.head) - len(self.tail)
+        output = self.head.decode(errors="replace")
+        if omitted_bytes > 0:
+            output += f"\n... [{omitted_bytes} bytes omitted, full output in {self.spill_path}] ...\n"
+        output += self.tail.decode(errors="replace")
+        # Translate newlines like text mode subprocess pipes do
+        return output.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _register_spill_file(path: str):
+    """
+    Records a new file holding a full output, and deletes the oldest ones beyond 'MAX_SPILL_FILES'.
+    """
+    logger.info(f"Full output of a long command output written to {path}")
+    with _spill_paths_lock:
+        _spill_paths.append(path)
+        expired_paths = []
+        while len(_spill_paths) > MAX_SPILL_FILES:
+            expired_paths.append(_spill_paths.popleft())
+    for expired_path in expired_paths:
+        try:
+            os.remove(expired_path)
+        except OSError:
+            pass
+
+
+async def _read_pipe(loop, pipe, capture: BoundedOutput):
+    reader = asyncio.StreamReader(limit=_READ_CHUNK_BYTES)
+    await loop.connect_read_pipe(
+        lambda: asyncio.StreamReaderProtocol(reader, loop=loop), pipe
+    )
+    while True:
+        data = await reader.read(_READ_CHUNK_BYTES)
+        if not data:
+            break
+        capture.write(data)
+
+
+async def _read_pipe_in_thread(loop, pipe, capture: BoundedOutput):
+    done = loop.create_future()
+
+    def set_done():
+        if not done.done():
+            done.set_result(None)
+
+    def read():
+        try:
+            while True:
+                data = pipe.read1(_READ_CHUNK_BYTES)
+                if not data:
+                    break
+                capture.write(data)
+        except (OSError, ValueError):
+            pass  # The capture was closed after a timeout
+        finally:
+            pipe.close()
+            try:
+                loop.call_soon_threadsafe(set_done)
+            except RuntimeError:
+                pass  # The event loop is already closed
+
+    # A daemon thread rather than the loop executor, which asyncio.run waits for on shutdown
+    threading.Thread(target=read, daemon=True).start()
+    await done
+
+
+def _wait_for_exit(process):
+    """
+    Waits for a process to exit, and returns its exit code and resource usage (None if it is not available).
+
+    The exit code is negative when the process was terminated by a signal, like `subprocess` reports it.
+    """
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+    _, status, rusage = os.wait4(process.pid, 0)
+    exit_code = os.waitstatus_to_exitcode(status)
+    # The process was reaped here, so Popen must not wait for it again
+    process.returncode = exit_code
+    return exit_code, rusage
+
+
+def _max_rss_kb(rusage) -> int:
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss // 1024
+    return rusage.ru_maxrss
+
 
-        # Return a dictionary with the desired information
-        return result.stdout, result.stderr, result.returncode, command_start_time
+def _kill_process_group(process):
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except (ProcessLookupError, PermissionError):
+        pass  # The processes already exited
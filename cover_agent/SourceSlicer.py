@@ -0,0 +1,182 @@
+import ast
+
+
+class SourceSlicer:
+    def __init__(self, path_to_file: str, source: str):
+        """
+        Builds reduced, line-numbered views of a source file around its missed lines.
+
+        Parameters:
+            path_to_file (str): The path of the source file, used to pick how the file is sliced.
+            source (str): The content of the source file.
+        """
+        self.path_to_file = path_to_file
+        self.source = source
+        self.source_lines = source.split("\n")
+
+        # List of rules/action key pair.
+        # Add your new rule and how to slice the source file (function) here
+        self.rules = [(self._is_python_file, self._slice_python)]
+
+    def slice(self, lines_missed):
+        """
+        Build a view of the source file with the code that is relevant to cover the missed lines, keeping the original
+        line numbers. Omitted lines are replaced with a line containing '...'.
+
+        Parameters:
+            lines_missed (iterable): The line numbers that are not covered by the tests.
+
+        Returns:
+            str: The line-numbered view, or None if the source file cannot be sliced.
+        """
+        lines_missed = sorted(set(lines_missed or []))
+        if not lines_missed:
+            return None
+        for condition, action in self.rules:
+            if condition():
+                kept_lines = action(lines_missed)
+                if kept_lines is None:
+                    return None
+                return render_lines(self.source_lines, kept_lines)
+        return None  # No slicing for this kind of source file
+
+    def _is_python_file(self) -> bool:
+        """
+        Rule to check if the file is a Python file.
+        """
+        return self.path_to_file.endswith(".py")
+
+    def _slice_python(self, lines_missed: list):
+        """
+        Action to slice Python source files with the ast module.
+
+        The view keeps the functions and top-level statements containing missed lines, the headers of their enclosing
+        classes, the signatures of the other methods of those classes, and the module-level imports, constants,
+        functions and classes they reference (the functions and classes as signatures only).
+        """
+        try:
+            parsed_ast = ast.parse(self.source)
+        except SyntaxError:
+            return None
+
+        kept_lines = set()
+        selected_nodes = []
+        missed = set(lines_missed)
+        for node in parsed_ast.body:
+            if not missed.intersection(node_lines(node)):
+                continue
+            if isinstance(node, ast.ClassDef):
+                kept_lines.update(header_lines(node))
+                for child in node.body:
+                    if missed.intersection(node_lines(child)) or not isinstance(
+                        child, (ast.FunctionDef, ast.AsyncFunctionDef)
+                    ):
+                        kept_lines.update(node_lines(child))
+                        selected_nodes.append(child)
+                    else:
+                        kept_lines.update(header_lines(child))
+            else:
+                kept_lines.update(node_lines(node))
+                selected_nodes.append(node)
+
+        # Add the module-level names that the selected code references, and the names that those reference in turn
+        referenced_names = set()
+        pending_nodes = list(selected_nodes)
+        while pending_nodes:
+            new_names = self._referenced_names(pending_nodes.pop()) - referenced_names
+            referenced_names |= new_names
+            for node in parsed_ast.body:
+                bound_names = self._bound_names(node)
+                if not bound_names & new_names:
+                    continue
+                if isinstance(
+                    node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+                ):
+                    kept_lines.update(header_lines(node))
+                elif not kept_lines.issuperset(node_lines(node)):
+                    kept_lines.update(node_lines(node))
+                    if not isinstance(node, (ast.Import, ast.ImportFrom)):
+                        pending_nodes.append(node)
+        return kept_lines
+
+    @staticmethod
+    def _referenced_names(node) -> set:
+        return {
+            child.id
+            for child in ast.walk(node)
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load)
+        }
+
+    @staticmethod
+    def _bound_names(node) -> set:
+        """
+        The module-level names bound by a top-level statement.
+        """
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return {node.name}
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            return {
+                (alias.asname or alias.name).split(".")[0] for alias in node.names
+            }
+        if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            return {
+                child.id
+                for target in targets
+                for child in ast.walk(target)
+                if isinstance(child, ast.Name)
+            }
+        return set()
+
+
+def node_lines(node) -> range:
+    """
+    The lines of a statement, including its decorators.
+    """
+    first_line = min(
+        [node.lineno]
+        + [decorator.lineno for decorator in getattr(node, "decorator_list", [])]
+    )
+    return range(first_line, node.end_lineno + 1)
+
+
+def header_lines(node) -> range:
+    """
+    The lines of the decorators and the signature of a function or a class, without its body.
+    """
+    first_line = node_lines(node).start
+    last_line = max(node.lineno, node.body[0].lineno - 1)
+    return range(first_line, last_line + 1)
+
+
+def render_lines(source_lines: list, kept_lines, numbered: bool = True) -> str:
+    """
+    Render the kept lines of a file, replacing each stretch of omitted lines with a line containing '...'. Blank lines
+    between kept lines are kept.
+
+    Parameters:
+        source_lines (list): The lines of the file.
+        kept_lines (iterable): The line numbers to keep, starting from 1.
+        numbered (bool, optional): Whether to prefix each line with its line number. Defaults to True.
+
+    Returns:
+        str: The rendered lines.
+    """
+    rendered_lines = []
+    previous_line = 0
+    for line_number in sorted(kept_lines):
+        if not 1 <= line_number <= len(source_lines):
+            continue
+        omitted_lines = range(previous_line + 1, line_number)
+        if any(source_lines[omitted - 1].strip() for omitted in omitted_lines):
+            rendered_lines.append("...")
+        else:
+            # Keep the blank lines between kept lines rather than marking them as omitted
+            for omitted in omitted_lines:
+                rendered_lines.append(f"{omitted} " if numbered else "")
+        line = source_lines[line_number - 1]
+        rendered_lines.append(f"{line_number} {line}" if numbered else line)
+        previous_line = line_number
+    if any(line.strip() for line in source_lines[previous_line:]):
+        rendered_lines.append("...")
+    return "\n".join(rendered_lines)
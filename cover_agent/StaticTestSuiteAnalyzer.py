@@ -0,0 +1,93 @@
+import ast
+import hashlib
+
+# Analysis results, keyed on the hash of the analyzed test file content
+_analysis_cache = {}
+
+
+class StaticTestSuiteAnalyzer:
+    def __init__(self, path_to_file):
+        self.path_to_file = path_to_file
+
+        # List of rules/action key pair.
+        # Add your new rule and how to analyze the test file (function) here
+        self.rules = [(self._is_python_file, self._analyze_python)]
+
+    def analyze(self):
+        """
+        Statically analyze the test file, to find the indentation of the test headers and the line numbers after which new tests and imports should be inserted.
+
+        Returns:
+            dict: A dictionary with the 'test_headers_indentation', 'relevant_line_number_to_insert_tests_after' and
+            'relevant_line_number_to_insert_imports_after' keys, or None if the test file cannot be analyzed statically.
+        """
+        for condition, action in self.rules:
+            if condition():
+                try:
+                    with open(self.path_to_file, "r") as file:
+                        content = file.read()
+                except (FileNotFoundError, IOError):
+                    return None
+                content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+                if content_hash not in _analysis_cache:
+                    _analysis_cache[content_hash] = action(content)
+                return _analysis_cache[content_hash]
+        return None  # No static analysis for this kind of test file
+
+    def _is_python_file(self) -> bool:
+        """
+        Rule to check if the file is a Python file.
+        """
+        return self.path_to_file.endswith(".py")
+
+    def _analyze_python(self, content: str):
+        """
+        Action to analyze Python test files with the ast module.
+
+        New tests are inserted after the last test in the file. If the last test is a test class, they are inserted at the
+        end of that class, with the indentation of its methods. New imports are inserted after the last top-level import,
+        or after the module docstring when there is no top-level import, or else at the top of the file.
+        """
+        try:
+            parsed_ast = ast.parse(content)
+        except SyntaxError:
+            return None
+
+        last_test_node = None
+        for node in parsed_ast.body:
+            if self._is_test_function(node) or (
+                isinstance(node, ast.ClassDef)
+                and any(self._is_test_function(child) for child in node.body)
+            ):
+                last_test_node = node
+        if last_test_node is None:
+            return None
+
+        if isinstance(last_test_node, ast.ClassDef):
+            test_methods = [
+                child
+                for child in last_test_node.body
+                if self._is_test_function(child)
+            ]
+            test_headers_indentation = test_methods[-1].col_offset
+        else:
+            test_headers_indentation = last_test_node.col_offset
+
+        relevant_line_number_to_insert_imports_after = 0
+        if ast.get_docstring(parsed_ast) is not None:
+            relevant_line_number_to_insert_imports_after = parsed_ast.body[0].end_lineno
+        for node in parsed_ast.body:
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                relevant_line_number_to_insert_imports_after = node.end_lineno
+
+        return {
+            "test_headers_indentation": test_headers_indentation,
+            "relevant_line_number_to_insert_tests_after": last_test_node.end_lineno,
+            "relevant_line_number_to_insert_imports_after": relevant_line_number_to_insert_imports_after,
+        }
+
+    @staticmethod
+    def _is_test_function(node) -> bool:
+        return isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef)
+        ) and node.name.startswith("test")
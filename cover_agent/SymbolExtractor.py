@@ -0,0 +1,183 @@
+import ast
+import hashlib
+import os
+
+from cover_agent.SourceSlicer import header_lines, node_lines, render_lines
+
+# Definitions with at most this number of lines are included with their full body
+SMALL_DEFINITION_LINES = 15
+
+# Top-level definitions of the parsed included files, keyed on the hash of the file content
+_definitions_cache = {}
+
+
+class SymbolExtractor:
+    def __init__(self, source_file_path: str):
+        """
+        Extracts, from included files, the definitions of the symbols that a source file imports and uses.
+
+        Parameters:
+            source_file_path (str): The path of the source file whose imports are resolved.
+        """
+        self.source_file_path = source_file_path
+        self.imports = self._read_imports()
+
+    def extract(self, included_file_path: str, content: str):
+        """
+        Extract the definitions used by the source file from an included file. Small definitions are included in full,
+        larger ones as their signatures and docstrings.
+
+        Parameters:
+            included_file_path (str): The path of the included file.
+            content (str): The content of the included file.
+
+        Returns:
+            str: The extracted definitions, or None if the used symbols of the included file cannot be resolved.
+        """
+        if not (
+            self.source_file_path.endswith(".py") and included_file_path.endswith(".py")
+        ):
+            return None
+        used_names = self._used_names(included_file_path)
+        if not used_names:
+            return None
+
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if content_hash not in _definitions_cache:
+            _definitions_cache[content_hash] = _parse_definitions(content)
+        definitions = _definitions_cache[content_hash]
+        if definitions is None:
+            return None
+        extracted = [
+            definitions[name] for name in sorted(used_names) if name in definitions
+        ]
+        return "\n\n".join(extracted) if extracted else None
+
+    def _read_imports(self):
+        """
+        Read the imports of the source file, with the names it uses from each imported module.
+
+        Returns:
+            list: (module path components, used names) tuples. For 'from module import name', the used names are the
+            imported names, and for 'import module', the attributes the source file accesses on the module.
+        """
+        try:
+            with open(self.source_file_path, "r") as f:
+                parsed_ast = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            return []
+
+        module_aliases = {}
+        imports = []
+        for node in ast.walk(parsed_ast):
+            if isinstance(node, ast.ImportFrom) and node.module:
+                module_parts = node.module.split(".")
+                imported_names = {alias.name for alias in node.names} - {"*"}
+                imports.append((module_parts, imported_names))
+                # The imported names can be modules too, e.g. 'from package import module'
+                for alias in node.names:
+                    module_aliases[alias.asname or alias.name] = module_parts + [
+                        alias.name
+                    ]
+            elif isinstance(node, ast.ImportFrom):
+                # 'from . import module' imports modules rather than symbols
+                for alias in node.names:
+                    module_aliases[alias.asname or alias.name] = [alias.name]
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.asname:
+                        module_aliases[alias.asname] = alias.name.split(".")
+                    else:
+                        module_aliases[alias.name] = alias.name.split(".")
+
+        accessed_attributes = {}
+        for node in ast.walk(parsed_ast):
+            if isinstance(node, ast.Attribute):
+                dotted_name = _dotted_name(node.value)
+                if dotted_name in module_aliases:
+                    accessed_attributes.setdefault(dotted_name, set()).add(node.attr)
+        for alias, module_parts in module_aliases.items():
+            imports.append((module_parts, accessed_attributes.get(alias, set())))
+        return imports
+
+    def _used_names(self, included_file_path: str) -> set:
+        """
+        The names the source file uses from the module of an included file.
+        """
+        path_parts = os.path.normpath(os.path.abspath(included_file_path)).split(
+            os.sep
+        )
+        path_parts[-1] = path_parts[-1][: -len(".py")]
+        if path_parts[-1] == "__init__":
+            path_parts.pop()
+        used_names = set()
+        for module_parts, names in self.imports:
+            if path_parts[-len(module_parts) :] == module_parts:
+                used_names |= names
+        return used_names
+
+
+def _dotted_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        prefix = _dotted_name(node.value)
+        return f"{prefix}.{node.attr}" if prefix else None
+    return None
+
+
+def _parse_definitions(content: str):
+    """
+    Parse the top-level definitions of a Python file.
+
+    Returns:
+        dict: The text of each top-level function, class and assignment, keyed on the name it defines, or None if the
+        file cannot be parsed.
+    """
+    try:
+        parsed_ast = ast.parse(content)
+    except SyntaxError:
+        return None
+
+    content_lines = content.split("\n")
+    definitions = {}
+    for node in parsed_ast.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = [node.name]
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            names = [target.id for target in targets if isinstance(target, ast.Name)]
+        else:
+            continue
+
+        lines = node_lines(node)
+        kept_lines = lines
+        if len(lines) > SMALL_DEFINITION_LINES and isinstance(
+            node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+        ):
+            kept_lines = _signature_lines(node)
+        # Render the lines of the definition only, so the omitted lines are marked within the definition
+        text = render_lines(
+            content_lines[lines.start - 1 : lines.stop - 1],
+            [line - lines.start + 1 for line in kept_lines],
+            numbered=False,
+        )
+        for name in names:
+            definitions[name] = text
+    return definitions
+
+
+def _signature_lines(node) -> set:
+    """
+    The lines of the signature and the docstring of a function, or of a class along with its methods and attributes.
+    """
+    lines = set(header_lines(node))
+    if ast.get_docstring(node) is not None:
+        lines.update(node_lines(node.body[0]))
+    if isinstance(node, ast.ClassDef):
+        for child in node.body:
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                lines.update(_signature_lines(child))
+            elif isinstance(child, (ast.Assign, ast.AnnAssign)):
+                lines.update(node_lines(child))
+    return lines
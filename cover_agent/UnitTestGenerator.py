@@ -1,19 +1,38 @@
+import ast
 import datetime
 import logging
 import os
 import re
 import json
+import queue
+import shlex
+import shutil
+import tempfile
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from wandb.sdk.data_types.trace_tree import Trace
 
 from cover_agent.Runner import Runner
-from cover_agent.CoverageProcessor import CoverageProcessor
+from cover_agent.CommandResultCache import CommandResultCache
+from cover_agent.CoverageProcessor import CoverageProcessor, SANDBOX_DIR_PREFIX
+from cover_agent.CoverageTracker import CoverageTracker, parse_line_numbers
+from cover_agent.LineSet import LineSet
 from cover_agent.CustomLogger import CustomLogger
 from cover_agent.PromptBuilder import PromptBuilder
 from cover_agent.AICaller import AICaller
+from cover_agent.ResponseCache import ResponseCache
 from cover_agent.FilePreprocessor import FilePreprocessor
-from cover_agent.utils import load_yaml
+from cover_agent.StaticTestSuiteAnalyzer import StaticTestSuiteAnalyzer
+from cover_agent.SymbolExtractor import SymbolExtractor
+from cover_agent.utils import iter_yaml_list_items, load_yaml
 from cover_agent.settings.config_loader import get_settings
 
+# Exit code of pytest when no tests were collected
+PYTEST_NO_TESTS_COLLECTED_EXIT_CODE = 5
+
 
 class UnitTestGenerator:
     def __init__(
@@ -26,9 +45,23 @@ class UnitTestGenerator:
         api_base: str = "",
         test_command_dir: str = os.getcwd(),
         included_files: list = None,
+        included_files_mode: str = "full",
         coverage_type="cobertura",
         desired_coverage: int = 90,  # Default to 90% coverage if not specified
         additional_instructions: str = "",
+        max_concurrent_llm_calls: int = 4,
+        llm_cache_dir: str = "",
+        llm_cache_mode: str = "read-write",
+        llm_cache_max_size_mb: int = 512,
+        llm_streaming: bool = True,
+        targeted_validation: bool = False,
+        targeted_test_command: str = "",
+        branch_coverage: bool = False,
+        test_command_timeout: float = None,
+        test_cache_dir: str = "",
+        test_cache_inputs: list = None,
+        max_prompt_tokens: int = 0,
+        condensed_test_file_top_k: int = 0,
     ):
         """
         Initialize the UnitTestGenerator class with the provided parameters.
@@ -42,9 +75,23 @@ class UnitTestGenerator:
             api_base (str, optional): The base API url to use in case model is set to Ollama or Hugging Face. Defaults to an empty string.
             test_command_dir (str, optional): The directory where the test command should be executed. Defaults to the current working directory.
             included_files (list, optional): A list of paths to included files. Defaults to None.
+            included_files_mode (str, optional): "full" to include the whole included files, or "symbols" to only include the definitions that the source file imports and uses. Defaults to "full".
             coverage_type (str, optional): The type of coverage report. Defaults to "cobertura".
             desired_coverage (int, optional): The desired coverage percentage. Defaults to 90.
             additional_instructions (str, optional): Additional instructions for test generation. Defaults to an empty string.
+            max_concurrent_llm_calls (int, optional): The maximum number of LLM calls that are sent at the same time. Defaults to 4.
+            llm_cache_dir (str, optional): The directory of the LLM response cache. Defaults to an empty string, which disables the cache.
+            llm_cache_mode (str, optional): The mode of the LLM response cache: "read-write", "read-only" or "bypass". Defaults to "read-write".
+            llm_cache_max_size_mb (int, optional): The maximum size of the LLM response cache, in megabytes. Defaults to 512.
+            llm_streaming (bool, optional): Whether to stream the responses of the LLM. Defaults to True.
+            targeted_validation (bool, optional): Whether to run each new test on its own before running the full test command. Defaults to False.
+            targeted_test_command (str, optional): The command that runs a single test, with '{test_file}' and '{test_name}' placeholders. Defaults to an empty string, which derives it from the test command when it runs pytest.
+            branch_coverage (bool, optional): Whether the coverage percentage counts branches along with lines, when the coverage report has branch data. Defaults to False.
+            test_command_timeout (float, optional): The maximum wall-clock time of each test command run, in seconds. A run that exceeds it is killed, along with the processes it started, and fails. Defaults to None, which waits for the test command to finish.
+            test_cache_dir (str, optional): The directory of a cache of test command results, keyed on the command and the content of the source file, the test file and the test cache inputs. Defaults to an empty string, which disables the cache.
+            test_cache_inputs (list, optional): Glob patterns of other files the test results depend on, relative to the test command directory. Defaults to None.
+            max_prompt_tokens (int, optional): The token budget of the test generation prompt. Lower priority sections of the prompt are trimmed to fit it. Defaults to 0, which disables the budget.
+            condensed_test_file_top_k (int, optional): The number of existing tests shown in full in the prompts, the most relevant to the missed lines. The other tests are shown as signatures only. Defaults to 0, which shows the full test file.
 
         Returns:
             None
@@ -55,14 +102,46 @@ class UnitTestGenerator:
         self.code_coverage_report_path = code_coverage_report_path
         self.test_command = test_command
         self.test_command_dir = test_command_dir
-        self.included_files = self.get_included_files(included_files)
+        self.included_files = self.get_included_files(
+            included_files, included_files_mode, source_file_path
+        )
         self.coverage_type = coverage_type
         self.desired_coverage = desired_coverage
         self.additional_instructions = additional_instructions
+        self.targeted_validation = targeted_validation
+        self.targeted_test_command = targeted_test_command
+        self.branch_coverage = branch_coverage
+        self.test_command_timeout = test_command_timeout
+        self.max_prompt_tokens = max_prompt_tokens
+        self.condensed_test_file_top_k = condensed_test_file_top_k
         self.language = self.get_code_language(source_file_path)
 
         # Objects to instantiate
-        self.ai_caller = AICaller(model=llm_model, api_base=api_base)
+        self.ai_caller = AICaller(
+            model=llm_model,
+            api_base=api_base,
+            max_concurrent_calls=max_concurrent_llm_calls,
+            cache=(
+                ResponseCache(
+                    cache_dir=llm_cache_dir,
+                    mode=llm_cache_mode,
+                    max_size_bytes=llm_cache_max_size_mb * 1024 * 1024,
+                )
+                if llm_cache_dir
+                else None
+            ),
+            stream=llm_streaming,
+        )
+        self.command_cache = (
+            CommandResultCache(
+                cache_dir=test_cache_dir,
+                input_files=[self.source_file_path, self.test_file_path],
+                input_globs=test_cache_inputs,
+                output_files=[self.code_coverage_report_path],
+            )
+            if test_cache_dir
+            else None
+        )
 
         # Get the logger instance from CustomLogger
         self.logger = CustomLogger.get_logger(__name__)
@@ -70,6 +149,11 @@ class UnitTestGenerator:
         # States to maintain within this class
         self.preprocessor = FilePreprocessor(self.test_file_path)
         self.failed_test_runs = []
+        self.prompt_builder = None
+        self.coverage_tracker = CoverageTracker()
+        # Time and resources spent in each phase: "baseline", "validation", "coverage_parsing" and "llm"
+        self.phase_metrics = {}
+        self._phase_metrics_lock = threading.Lock()
         self.total_input_token_count = 0
         self.total_output_token_count = 0
 
@@ -126,8 +210,10 @@ class UnitTestGenerator:
         self.logger.info(
             f'Running build/test command to generate coverage report: "{self.test_command}"'
         )
-        stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
-            command=self.test_command, cwd=self.test_command_dir
+        stdout, stderr, exit_code, time_of_test_command = self._run_test_command(
+            command=self.test_command,
+            cwd=self.test_command_dir,
+            phase="baseline",
         )
         assert (
             exit_code == 0
@@ -142,15 +228,28 @@ class UnitTestGenerator:
 
         # Use the process_coverage_report method of CoverageProcessor, passing in the time the test command was executed
         try:
-            lines_covered, lines_missed, percentage_covered = (
-                coverage_processor.process_coverage_report(
-                    time_of_test_command=time_of_test_command
+            with self._measure_phase("coverage_parsing"):
+                lines_covered, lines_missed, percentage_covered = (
+                    coverage_processor.process_coverage_report(
+                        time_of_test_command=time_of_test_command
+                    )
                 )
-            )
+                branches = coverage_processor.parse_branch_coverage()
 
             # Process the extracted coverage metrics
+            if self.branch_coverage and not branches:
+                self.logger.warning(
+                    "Branch coverage is enabled, but the coverage report has no branch data for the source file. The coverage is measured on lines only."
+                )
+            if self.branch_coverage:
+                percentage_covered = CoverageProcessor.combined_coverage_percentage(
+                    lines_covered, lines_missed, branches
+                )
+            self.coverage_tracker.update(
+                lines_covered, lines_missed, percentage_covered, branches=branches
+            )
             self.current_coverage = percentage_covered
-            self.code_coverage_report = f"Lines covered: {lines_covered}\nLines missed: {lines_missed}\nPercentage covered: {round(percentage_covered * 100, 2)}%"
+            self.code_coverage_report = self._format_coverage_report()
         except AssertionError as error:
             # Handle the case where the coverage report does not exist or was not updated after the test command
             self.logger.error(f"Error in coverage processing: {error}")
@@ -165,13 +264,208 @@ class UnitTestGenerator:
             with open(self.code_coverage_report_path, "r") as f:
                 self.code_coverage_report = f.read()
 
+    def _format_coverage_report(self):
+        """
+        Format the tracked coverage of the source file for the prompt.
+
+        Line sets are rendered as ranges of consecutive lines (e.g. "12-40, 57").
+        """
+        tracker = self.coverage_tracker
+        coverage_report = f"Lines covered: {tracker.lines_covered or 'none'}\nLines missed: {tracker.lines_missed or 'none'}\n"
+        partial_branches = [
+            f"{line_number} ({covered}/{total})"
+            for line_number, (covered, total) in sorted(tracker.branches.items())
+            if covered < total
+        ]
+        if partial_branches:
+            coverage_report += f"Lines with uncovered branches (covered/total branches): {', '.join(partial_branches)}\n"
+        if self.branch_coverage:
+            coverage_report += f"Percentage covered (lines and branches): {round(tracker.percentage_covered * 100, 2)}%"
+        else:
+            coverage_report += f"Percentage covered: {round(tracker.percentage_covered * 100, 2)}%"
+        return coverage_report
+
+    def _measure_coverage_delta(
+        self,
+        coverage_report_path: str,
+        time_of_test_command: int,
+        generated_tests: list,
+        run_dir: str = None,
+    ):
+        """
+        Process a coverage report, and compare it line by line to the tracked coverage.
+
+        Parameters:
+            coverage_report_path (str): The path of the coverage report to process.
+            time_of_test_command (int): The time the test command was run, in milliseconds.
+            generated_tests (list): The generated tests that were run, whose 'lines_to_cover' claims are checked.
+            run_dir (str, optional): The directory in which the test command ran, e.g. a validation sandbox. Defaults to the test command directory.
+
+        Returns:
+            dict: The coverage delta, as returned by `CoverageTracker.compare`.
+        """
+        coverage_processor = CoverageProcessor(
+            file_path=coverage_report_path,
+            src_file_path=self.source_file_path,
+            coverage_type=self.coverage_type,
+            run_dir=run_dir or self.test_command_dir,
+            project_dir=self.test_command_dir,
+        )
+        with self._measure_phase("coverage_parsing"):
+            lines_covered, lines_missed, percentage_covered = (
+                coverage_processor.process_coverage_report(
+                    time_of_test_command=time_of_test_command
+                )
+            )
+            branches = coverage_processor.parse_branch_coverage()
+        if self.branch_coverage:
+            percentage_covered = CoverageProcessor.combined_coverage_percentage(
+                lines_covered, lines_missed, branches
+            )
+        lines_to_cover = parse_line_numbers(None)
+        for generated_test in generated_tests:
+            lines_to_cover |= parse_line_numbers(generated_test.get("lines_to_cover"))
+        return self.coverage_tracker.compare(
+            lines_covered,
+            lines_missed,
+            percentage_covered,
+            lines_to_cover=lines_to_cover,
+            branches=branches,
+        )
+
+    def _accept_coverage_delta(self, coverage_delta: dict):
+        """
+        Make the coverage of an accepted run the tracked coverage, and update the coverage report of the next prompt.
+
+        Parameters:
+            coverage_delta (dict): The coverage delta of the accepted run.
+        """
+        self.coverage_tracker.update(
+            coverage_delta["lines_covered"],
+            coverage_delta["lines_missed"],
+            coverage_delta["percentage_covered"],
+            branches=coverage_delta["branches"],
+        )
+        self.current_coverage = coverage_delta["percentage_covered"]
+        self.code_coverage_report = self._format_coverage_report()
+        if coverage_delta["newly_covered"]:
+            self.logger.info(f"Newly covered lines: {coverage_delta['newly_covered']}")
+        if coverage_delta["newly_covered_branches"]:
+            self.logger.info(
+                f"Newly covered branches: {coverage_delta['newly_covered_branches']}"
+            )
+        if coverage_delta["newly_missed"]:
+            self.logger.warning(
+                f"Lines that are no longer covered: {coverage_delta['newly_missed']}"
+            )
+        if coverage_delta["lines_to_cover_missed"]:
+            self.logger.info(
+                f"Lines the tests claimed to cover but did not: {coverage_delta['lines_to_cover_missed']}"
+            )
+
+    def _run_test_command(self, command: str, cwd: str, phase: str = "validation"):
+        """
+        Run a test command with the test command timeout, and record the resources it used in the metrics of a phase.
+
+        Parameters:
+            command (str): The test command.
+            cwd (str): The directory in which to run the command.
+            phase (str, optional): The phase the command belongs to. Defaults to "validation".
+
+        Returns:
+            CommandResult: The result of the command, which unpacks like a (stdout, stderr, exit_code, command_start_time) tuple.
+        """
+        command_result = Runner.run_command(
+            command=command,
+            cwd=cwd,
+            timeout=self.test_command_timeout,
+            # The cache keys on the files of the test command directory, not on the copies in a sandbox
+            cache=self.command_cache if cwd == self.test_command_dir else None,
+        )
+        self._record_phase_metrics(
+            phase,
+            wall_time=command_result.wall_time,
+            user_time=command_result.user_time,
+            system_time=command_result.system_time,
+            max_rss_kb=command_result.max_rss_kb,
+            timed_out=command_result.timed_out,
+            cached=command_result.cached,
+        )
+        return command_result
+
+    @contextmanager
+    def _measure_phase(self, phase: str):
+        """
+        Measure the wall-clock time of a block of code, and record it in the metrics of a phase.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record_phase_metrics(
+                phase, wall_time=time.perf_counter() - start_time
+            )
+
+    def _record_phase_metrics(
+        self,
+        phase: str,
+        wall_time: float,
+        user_time: float = None,
+        system_time: float = None,
+        max_rss_kb: int = None,
+        timed_out: bool = False,
+        cached: bool = False,
+    ):
+        with self._phase_metrics_lock:
+            metrics = self.phase_metrics.setdefault(
+                phase,
+                {
+                    "count": 0,
+                    "wall_time": 0.0,
+                    "user_time": 0.0,
+                    "system_time": 0.0,
+                    "max_rss_kb": 0,
+                    "timeouts": 0,
+                    "cache_hits": 0,
+                },
+            )
+            metrics["count"] += 1
+            metrics["wall_time"] += wall_time
+            metrics["user_time"] += user_time or 0.0
+            metrics["system_time"] += system_time or 0.0
+            metrics["max_rss_kb"] = max(metrics["max_rss_kb"], max_rss_kb or 0)
+            metrics["timeouts"] += int(timed_out)
+            metrics["cache_hits"] += int(cached)
+
+    def format_phase_metrics(self):
+        """
+        Format the time and resources spent in each phase, to see whether the run is bound by the test suite, the LLM or
+        the parsing of the coverage reports.
+
+        Returns:
+            str: One line per phase.
+        """
+        lines = []
+        for phase, metrics in self.phase_metrics.items():
+            line = f"{phase}: {metrics['count']} runs, {metrics['wall_time']:.2f}s wall time"
+            if phase in ("baseline", "validation"):
+                line += f", {metrics['user_time']:.2f}s user CPU, {metrics['system_time']:.2f}s system CPU, {metrics['max_rss_kb']} KB max RSS, {metrics['timeouts']} timeouts, {metrics['cache_hits']} cache hits"
+            lines.append(line)
+        return "\n".join(lines)
+
     @staticmethod
-    def get_included_files(included_files):
+    def get_included_files(
+        included_files, included_files_mode="full", source_file_path=""
+    ):
         """
         A method to read and concatenate the contents of included files into a single string.
 
         Parameters:
             included_files (list): A list of paths to included files.
+            included_files_mode (str, optional): "full" to include the whole files, or "symbols" to only include the
+                definitions that the source file imports and uses from them. Files whose used definitions cannot be
+                resolved are included whole. Defaults to "full".
+            source_file_path (str, optional): The path of the source file, used by the "symbols" mode. Defaults to an empty string.
 
         Returns:
             str: A string containing the concatenated contents of the included files, or an empty string if the input list is empty.
@@ -179,11 +473,21 @@ class UnitTestGenerator:
         if included_files:
             included_files_content = []
             file_names = []
+            symbol_extractor = (
+                SymbolExtractor(source_file_path)
+                if included_files_mode == "symbols"
+                else None
+            )
             for file_path in included_files:
                 try:
                     with open(file_path, "r") as file:
-                        included_files_content.append(file.read())
-                        file_names.append(file_path)
+                        content = file.read()
+                    if symbol_extractor:
+                        content = (
+                            symbol_extractor.extract(file_path, content) or content
+                        )
+                    included_files_content.append(content)
+                    file_names.append(file_path)
                 except IOError as e:
                     print(f"Error reading file {file_path}: {str(e)}")
             out_str = ""
@@ -237,16 +541,28 @@ class UnitTestGenerator:
             []
         )  # Reset the failed test runs. we don't want a list which grows indefinitely, and will take all the prompt tokens
 
-        # Call PromptBuilder to build the prompt
-        self.prompt_builder = PromptBuilder(
-            source_file_path=self.source_file_path,
-            test_file_path=self.test_file_path,
-            code_coverage_report=self.code_coverage_report,
-            included_files=self.included_files,
-            additional_instructions=self.additional_instructions,
-            failed_test_runs=failed_test_runs_value,
-            language=self.language,
-        )
+        # Call PromptBuilder to build the prompt. The builder is created once, and only the sections that change
+        # between iterations are refreshed afterwards
+        if self.prompt_builder is None:
+            self.prompt_builder = PromptBuilder(
+                source_file_path=self.source_file_path,
+                test_file_path=self.test_file_path,
+                code_coverage_report=self.code_coverage_report,
+                included_files=self.included_files,
+                additional_instructions=self.additional_instructions,
+                failed_test_runs=failed_test_runs_value,
+                language=self.language,
+                lines_missed=self.coverage_tracker.lines_missed,
+                model=self.ai_caller.model,
+                max_prompt_tokens=self.max_prompt_tokens,
+                condensed_test_file_top_k=self.condensed_test_file_top_k,
+            )
+        else:
+            self.prompt_builder.update(
+                code_coverage_report=self.code_coverage_report,
+                failed_test_runs=failed_test_runs_value,
+                lines_missed=self.coverage_tracker.lines_missed,
+            )
 
         return self.prompt_builder.build_prompt()
 
@@ -254,9 +570,11 @@ class UnitTestGenerator:
         """
         Perform the initial analysis of the test suite structure.
 
+        Test files that StaticTestSuiteAnalyzer supports (Python) are analyzed statically, and the AI model is not called.
         This method iterates through a series of attempts to analyze the test suite structure by interacting with the AI model.
         It constructs prompts based on specific files and calls to the AI model to gather information such as test headers indentation,
         relevant line numbers for inserting new tests, and relevant line numbers for inserting imports.
+        The first attempts of the two analyses are sent to the AI model concurrently, and only failed analyses are retried.
         The method handles multiple attempts to gather this information and raises exceptions if the analysis fails.
 
         Raises:
@@ -267,18 +585,55 @@ class UnitTestGenerator:
             None
         """
         try:
-            test_headers_indentation = None
+            # Some test files can be analyzed exactly, without calling the AI model
+            static_analysis = StaticTestSuiteAnalyzer(self.test_file_path).analyze()
+            if static_analysis:
+                self.logger.info(f"Test suite analyzed statically: {static_analysis}")
+                self.test_headers_indentation = static_analysis[
+                    "test_headers_indentation"
+                ]
+                self.relevant_line_number_to_insert_tests_after = static_analysis[
+                    "relevant_line_number_to_insert_tests_after"
+                ]
+                self.relevant_line_number_to_insert_imports_after = static_analysis[
+                    "relevant_line_number_to_insert_imports_after"
+                ]
+                return
+
+            # The first attempt of both analyses is independent, so both prompts are sent at the same time
+            prompt_headers_indentation = self.prompt_builder.build_prompt_custom(
+                file="analyze_suite_test_headers_indentation"
+            )
+            prompt_test_insert_line = self.prompt_builder.build_prompt_custom(
+                file="analyze_suite_test_insert_line"
+            )
+            with self._measure_phase("llm"):
+                responses = self.ai_caller.call_models(
+                    [prompt_headers_indentation, prompt_test_insert_line]
+                )
+            for _, prompt_token_count, response_token_count in responses:
+                self.total_input_token_count += prompt_token_count
+                self.total_output_token_count += response_token_count
+
+            tests_dict = load_yaml(responses[0][0])
+            test_headers_indentation = tests_dict.get("test_headers_indentation", None)
+            tests_dict = load_yaml(responses[1][0])
+            relevant_line_number_to_insert_tests_after = tests_dict.get(
+                "relevant_line_number_to_insert_tests_after", None
+            )
+            relevant_line_number_to_insert_imports_after = tests_dict.get(
+                "relevant_line_number_to_insert_imports_after", None
+            )
+
             allowed_attempts = 3
-            counter_attempts = 0
+            counter_attempts = 1
             while (
                 test_headers_indentation is None and counter_attempts < allowed_attempts
             ):
-                prompt_headers_indentation = self.prompt_builder.build_prompt_custom(
-                    file="analyze_suite_test_headers_indentation"
-                )
-                response, prompt_token_count, response_token_count = (
-                    self.ai_caller.call_model(prompt=prompt_headers_indentation)
-                )
+                with self._measure_phase("llm"):
+                    response, prompt_token_count, response_token_count = (
+                        self.ai_caller.call_model(prompt=prompt_headers_indentation)
+                    )
                 self.total_input_token_count += prompt_token_count
                 self.total_output_token_count += response_token_count
                 tests_dict = load_yaml(response)
@@ -290,20 +645,15 @@ class UnitTestGenerator:
             if test_headers_indentation is None:
                 raise Exception("Failed to analyze the test headers indentation")
 
-            relevant_line_number_to_insert_tests_after = None
-            relevant_line_number_to_insert_imports_after = None
-            allowed_attempts = 3
-            counter_attempts = 0
+            counter_attempts = 1
             while (
                 not relevant_line_number_to_insert_tests_after
                 and counter_attempts < allowed_attempts
             ):
-                prompt_test_insert_line = self.prompt_builder.build_prompt_custom(
-                    file="analyze_suite_test_insert_line"
-                )
-                response, prompt_token_count, response_token_count = (
-                    self.ai_caller.call_model(prompt=prompt_test_insert_line)
-                )
+                with self._measure_phase("llm"):
+                    response, prompt_token_count, response_token_count = (
+                        self.ai_caller.call_model(prompt=prompt_test_insert_line)
+                    )
                 self.total_input_token_count += prompt_token_count
                 self.total_output_token_count += response_token_count
                 tests_dict = load_yaml(response)
@@ -355,15 +705,16 @@ class UnitTestGenerator:
         if dry_run:
             response = "```def test_something():\n    pass```\n```def test_something_else():\n    pass```\n```def test_something_different():\n    pass```"
         else:
-            response, prompt_token_count, response_token_count = (
-                self.ai_caller.call_model(prompt=self.prompt, max_tokens=max_tokens)
-            )
+            with self._measure_phase("llm"):
+                response, prompt_token_count, response_token_count = (
+                    self.ai_caller.call_model(prompt=self.prompt, max_tokens=max_tokens)
+                )
             self.total_input_token_count += prompt_token_count
             self.total_output_token_count += response_token_count
         try:
             tests_dict = load_yaml(
                 response,
-                keys_fix_yaml=["test_tags", "test_code", "test_name", "test_behavior"],
+                keys_fix_yaml=["test_tags:", "test_code:", "test_name:", "test_behavior:"],
             )
             if tests_dict is None:
                 return {}
@@ -383,6 +734,295 @@ class UnitTestGenerator:
 
         return tests_dict
 
+    def generate_tests_incrementally(self, max_tokens=4096):
+        """
+        Generate tests using the AI model, and yield each generated test as soon as its YAML entry is complete.
+
+        The AI model is called in a background thread, so the response keeps streaming while the caller validates the tests
+        that were already yielded. Once the response is complete, it is parsed again with `load_yaml`, which can repair
+        malformed YAML, and the tests that could not be parsed incrementally are yielded then.
+
+        Parameters:
+            max_tokens (int, optional): The maximum number of tokens to use for generating tests. Defaults to 4096.
+
+        Yields:
+            dict: Each generated test, containing test code, additional imports and the lines to cover.
+        """
+        self.prompt = self.build_prompt()
+
+        chunk_queue = queue.Queue()
+        model_result = {}
+
+        def call_model():
+            try:
+                with self._measure_phase("llm"):
+                    model_result["response"] = self.ai_caller.call_model(
+                        prompt=self.prompt,
+                        max_tokens=max_tokens,
+                        on_chunk=chunk_queue.put,
+                    )
+            except Exception as e:
+                model_result["error"] = e
+            finally:
+                chunk_queue.put(None)  # Signal the end of the response
+
+        model_thread = threading.Thread(target=call_model, daemon=True)
+        model_thread.start()
+
+        yielded_test_codes = set()
+        for generated_test in iter_yaml_list_items(
+            iter(chunk_queue.get, None), list_key="new_tests"
+        ):
+            yielded_test_codes.add(str(generated_test.get("test_code", "")).strip())
+            yield generated_test
+        model_thread.join()
+
+        if "error" in model_result:
+            self.logger.error(f"Error during test generation: {model_result['error']}")
+            return
+        response, prompt_token_count, response_token_count = model_result["response"]
+        self.total_input_token_count += prompt_token_count
+        self.total_output_token_count += response_token_count
+
+        try:
+            tests_dict = load_yaml(
+                response,
+                keys_fix_yaml=["test_tags:", "test_code:", "test_name:", "test_behavior:"],
+            )
+        except Exception as e:
+            self.logger.error(f"Error during test generation: {e}")
+            return
+        if not isinstance(tests_dict, dict):
+            tests_dict = {}
+        remaining_tests = [
+            generated_test
+            for generated_test in tests_dict.get("new_tests") or []
+            if isinstance(generated_test, dict)
+            and str(generated_test.get("test_code", "")).strip()
+            not in yielded_test_codes
+        ]
+        if remaining_tests and yielded_test_codes:
+            self.logger.info(
+                f"{len(remaining_tests)} generated tests could not be parsed while streaming, and were parsed from the complete response"
+            )
+        for generated_test in remaining_tests:
+            yield generated_test
+
+    def get_targeted_test_command(self, generated_test: dict, processed_test: str):
+        """
+        Build the command that runs only a newly inserted test, when targeted validation is enabled.
+
+        The command is built from the targeted test command template, where '{test_file}' is replaced with the path of the
+        test file relative to the test command directory, and '{test_name}' with the name of the new test. For Python test
+        files, the test name is taken from the test code, and prefixed with its test class ('TestClass::test_name'). When
+        no template is configured and the test command runs pytest, the template defaults to '<pytest> {test_file}::{test_name}',
+        with '--no-cov' when the test command or the pytest configuration of the project measures coverage with pytest-cov.
+
+        Parameters:
+            generated_test (dict): The generated test, containing the test code and the test name.
+            processed_test (str): The content of the test file after the generated test was inserted.
+
+        Returns:
+            str: The targeted test command, or an empty string if the new test cannot be run on its own.
+        """
+        if not self.targeted_validation:
+            return ""
+        template = self.targeted_test_command or self._get_default_targeted_test_command()
+        if not template:
+            return ""
+
+        test_name = ""
+        is_python_test_file = self.test_file_path.endswith(".py")
+        if is_python_test_file:
+            try:
+                test_code_tree = ast.parse(
+                    textwrap.dedent(generated_test.get("test_code", ""))
+                )
+                test_name = next(
+                    (
+                        node.name
+                        for node in test_code_tree.body
+                        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+                    ),
+                    "",
+                )
+            except SyntaxError:
+                pass
+        if not test_name:
+            test_name = str(generated_test.get("test_name", "")).strip()
+        if not re.fullmatch(r"[\w.\[\]-]+", test_name):
+            return ""
+
+        if is_python_test_file:
+            try:
+                # Tests inserted into a test class are addressed through their class
+                for node in ast.parse(processed_test).body:
+                    if isinstance(node, ast.ClassDef) and any(
+                        isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))
+                        and child.name == test_name
+                        for child in node.body
+                    ):
+                        test_name = f"{node.name}::{test_name}"
+                        break
+            except SyntaxError:
+                pass
+
+        test_file = os.path.relpath(
+            os.path.abspath(self.test_file_path), os.path.abspath(self.test_command_dir)
+        )
+        return template.replace("{test_file}", shlex.quote(test_file)).replace(
+            "{test_name}", test_name
+        )
+
+    def _get_default_targeted_test_command(self):
+        """
+        Derive a targeted test command template from the test command, if the test command runs pytest.
+
+        Returns:
+            str: The targeted test command template, or an empty string if the test command does not run pytest.
+        """
+        try:
+            tokens = shlex.split(self.test_command)
+        except ValueError:
+            return ""
+        for i, token in enumerate(tokens):
+            if os.path.basename(token) in ("pytest", "py.test"):
+                template_tokens = [shlex.quote(token) for token in tokens[: i + 1]]
+                template_tokens.append("{test_file}::{test_name}")
+                # A single test cannot reach the coverage threshold of the whole suite (e.g. --cov-fail-under in addopts)
+                if any(
+                    "--cov" in token for token in tokens
+                ) or self._pytest_config_uses_cov():
+                    template_tokens.append("--no-cov")
+                return " ".join(template_tokens)
+        return ""
+
+    def _pytest_config_uses_cov(self):
+        """
+        Check whether the pytest configuration of the project enables pytest-cov, through '--cov' options in 'addopts'
+        or in the PYTEST_ADDOPTS environment variable.
+
+        The configuration file is looked up the way pytest finds it: in the test command directory and then in its
+        parents, the first of 'pytest.ini', '.pytest.ini', 'pyproject.toml', 'tox.ini' and 'setup.cfg' holding a pytest
+        section is used.
+
+        Returns:
+            bool: True if pytest-cov is enabled by the pytest configuration, False otherwise.
+        """
+        if "--cov" in os.environ.get("PYTEST_ADDOPTS", ""):
+            return True
+        config_sections = [
+            ("pytest.ini", None),
+            (".pytest.ini", None),
+            ("pyproject.toml", "[tool.pytest.ini_options]"),
+            ("tox.ini", "[pytest]"),
+            ("setup.cfg", "[tool:pytest]"),
+        ]
+        directory = os.path.abspath(self.test_command_dir)
+        while True:
+            for config_name, section_header in config_sections:
+                config_path = os.path.join(directory, config_name)
+                if not os.path.isfile(config_path):
+                    continue
+                try:
+                    with open(config_path, "r", encoding="utf-8") as f:
+                        config_lines = f.read().splitlines()
+                except (OSError, UnicodeDecodeError):
+                    continue
+                if section_header is None:
+                    section_lines = config_lines
+                else:
+                    section_lines, in_section, has_section = [], False, False
+                    for line in config_lines:
+                        if line.strip().startswith("["):
+                            in_section = line.strip() == section_header
+                            has_section = has_section or in_section
+                        elif in_section:
+                            section_lines.append(line)
+                    if not has_section:
+                        continue
+                # Options outside 'addopts' cannot hold '--cov', so the whole section is searched, without comments
+                return any(
+                    "--cov" in re.split(r"(?:^|\s)[#;]", line, maxsplit=1)[0]
+                    for line in section_lines
+                )
+            parent_directory = os.path.dirname(directory)
+            if parent_directory == directory:
+                return False
+            directory = parent_directory
+
+    def _insert_test(
+        self,
+        original_content: str,
+        generated_test: dict,
+        relevant_line_number_to_insert_tests_after: int,
+        relevant_line_number_to_insert_imports_after: int,
+    ):
+        """
+        Insert a generated test, and its additional imports, into the content of a test file.
+
+        Parameters:
+            original_content (str): The content of the test file before the insertion.
+            generated_test (dict): The generated test, containing test code and additional imports.
+            relevant_line_number_to_insert_tests_after (int): The line number after which the test code is inserted.
+            relevant_line_number_to_insert_imports_after (int): The line number after which the additional imports are inserted.
+
+        Returns:
+            tuple: A tuple containing the processed test file content and the number of import lines that were inserted.
+        """
+        # Step 0: no pre-process.
+        # We asked the model that each generated test should be a self-contained independent test
+        test_code = generated_test.get("test_code", "").rstrip()
+        additional_imports = generated_test.get("new_imports_code", "").strip()
+        if (
+            additional_imports
+            and additional_imports[0] == '"'
+            and additional_imports[-1] == '"'
+        ):
+            additional_imports = additional_imports.strip('"')
+
+        # check if additional_imports only contains '"':
+        if additional_imports and additional_imports == '""':
+            additional_imports = ""
+
+        needed_indent = self.test_headers_indentation
+        # remove initial indent of the test code, and insert the needed indent
+        test_code_indented = test_code
+        if needed_indent:
+            initial_indent = len(test_code) - len(test_code.lstrip())
+            delta_indent = int(needed_indent) - initial_indent
+            if delta_indent > 0:
+                test_code_indented = "\n".join(
+                    [delta_indent * " " + line for line in test_code.split("\n")]
+                )
+        test_code_indented = "\n" + test_code_indented.strip("\n") + "\n"
+
+        original_content_lines = original_content.split("\n")
+        test_code_lines = test_code_indented.split("\n")
+        # insert the test code at the relevant line
+        processed_test_lines = (
+            original_content_lines[:relevant_line_number_to_insert_tests_after]
+            + test_code_lines
+            + original_content_lines[relevant_line_number_to_insert_tests_after:]
+        )
+        # insert the additional imports at line 'relevant_line_number_to_insert_imports_after'
+        processed_test = "\n".join(processed_test_lines)
+        additional_imports_lines = []
+        if (
+            relevant_line_number_to_insert_imports_after is not None
+            and additional_imports
+            and additional_imports not in processed_test
+        ):
+            additional_imports_lines = additional_imports.split("\n")
+            processed_test_lines = (
+                processed_test_lines[:relevant_line_number_to_insert_imports_after]
+                + additional_imports_lines
+                + processed_test_lines[relevant_line_number_to_insert_imports_after:]
+            )
+        processed_test = "\n".join(processed_test_lines)
+
+        return processed_test, len(additional_imports_lines)
+
     def validate_test(self, generated_test: dict, generated_tests_dict: dict):
         """
         Validate a generated test by inserting it into the test file, running the test, and checking for pass/fail.
@@ -404,93 +1044,60 @@ class UnitTestGenerator:
             6. Run the test using the Runner class.
             7. Check the exit code to determine if the test passed or failed.
             8. If the test failed, roll back the test file to its original content and log the failure.
-            9. If the test passed, check if the code coverage has increased using the CoverageProcessor class.
-            10. If the coverage has not increased, roll back the test file and log the failure.
-            11. If the coverage has increased, update the current coverage and log the success.
+            9. If the test passed, compare the covered lines with the tracked coverage, to find the lines the test newly covers.
+            10. If the test does not cover any new line, roll back the test file and log the failure.
+            11. If the test covers new lines, update the tracked coverage and the coverage report of the next prompt, and log the success.
             12. Handle any exceptions that occur during the validation process, log the errors, and roll back the test file if necessary.
             13. Log additional details and error messages for failed tests, and optionally, use the Trace class for detailed logging if 'WANDB_API_KEY' is present in the environment variables.
         """
         try:
-            # Step 0: no pre-process.
-            # We asked the model that each generated test should be a self-contained independent test
-            test_code = generated_test.get("test_code", "").rstrip()
-            additional_imports = generated_test.get("new_imports_code", "").strip()
-            if (
-                additional_imports
-                and additional_imports[0] == '"'
-                and additional_imports[-1] == '"'
-            ):
-                additional_imports = additional_imports.strip('"')
-
-            # check if additional_imports only contains '"':
-            if additional_imports and additional_imports == '""':
-                additional_imports = ""
-            relevant_line_number_to_insert_tests_after = (
-                self.relevant_line_number_to_insert_tests_after
-            )
-            relevant_line_number_to_insert_imports_after = (
-                self.relevant_line_number_to_insert_imports_after
-            )
-
-            needed_indent = self.test_headers_indentation
-            # remove initial indent of the test code, and insert the needed indent
-            test_code_indented = test_code
-            if needed_indent:
-                initial_indent = len(test_code) - len(test_code.lstrip())
-                delta_indent = int(needed_indent) - initial_indent
-                if delta_indent > 0:
-                    test_code_indented = "\n".join(
-                        [delta_indent * " " + line for line in test_code.split("\n")]
-                    )
-            test_code_indented = "\n" + test_code_indented.strip("\n") + "\n"
-
-            if test_code_indented and relevant_line_number_to_insert_tests_after:
+            if self.relevant_line_number_to_insert_tests_after:
 
                 # Step 1: Append the generated test to the relevant line in the test file
                 with open(self.test_file_path, "r") as test_file:
                     original_content = test_file.read()  # Store original content
-                original_content_lines = original_content.split("\n")
-                test_code_lines = test_code_indented.split("\n")
-                # insert the test code at the relevant line
-                processed_test_lines = (
-                    original_content_lines[:relevant_line_number_to_insert_tests_after]
-                    + test_code_lines
-                    + original_content_lines[
-                        relevant_line_number_to_insert_tests_after:
-                    ]
+                processed_test, additional_imports_lines_count = self._insert_test(
+                    original_content,
+                    generated_test,
+                    self.relevant_line_number_to_insert_tests_after,
+                    self.relevant_line_number_to_insert_imports_after,
                 )
-                # insert the additional imports at line 'relevant_line_number_to_insert_imports_after'
-                processed_test = "\n".join(processed_test_lines)
-                if (
-                    relevant_line_number_to_insert_imports_after
-                    and additional_imports
-                    and additional_imports not in processed_test
-                ):
-                    additional_imports_lines = additional_imports.split("\n")
-                    processed_test_lines = (
-                        processed_test_lines[
-                            :relevant_line_number_to_insert_imports_after
-                        ]
-                        + additional_imports_lines
-                        + processed_test_lines[
-                            relevant_line_number_to_insert_imports_after:
-                        ]
-                    )
-                    self.relevant_line_number_to_insert_tests_after += len(
-                        additional_imports_lines
-                    )  # this is important, otherwise the next test will be inserted at the wrong line
-                processed_test = "\n".join(processed_test_lines)
+                self.relevant_line_number_to_insert_tests_after += (
+                    additional_imports_lines_count
+                )  # this is important, otherwise the next test will be inserted at the wrong line
 
                 with open(self.test_file_path, "w") as test_file:
                     test_file.write(processed_test)
 
                 # Step 2: Run the test using the Runner class
-                self.logger.info(
-                    f'Running test with the following command: "{self.test_command}"'
-                )
-                stdout, stderr, exit_code, time_of_test_command = Runner.run_command(
-                    command=self.test_command, cwd=self.test_command_dir
+                exit_code = 0
+                targeted_test_command = self.get_targeted_test_command(
+                    generated_test, processed_test
                 )
+                if targeted_test_command:
+                    # Check whether the new test passes on its own first, and only run the full test command if it does
+                    self.logger.info(
+                        f'Running the new test with the following command: "{targeted_test_command}"'
+                    )
+                    stdout, stderr, exit_code, time_of_test_command = (
+                        self._run_test_command(
+                            command=targeted_test_command,
+                            cwd=self.test_command_dir,
+                        )
+                    )
+                    if exit_code == PYTEST_NO_TESTS_COLLECTED_EXIT_CODE:
+                        # The new test was not found, so the targeted run is inconclusive
+                        exit_code = 0
+                if exit_code == 0:
+                    self.logger.info(
+                        f'Running test with the following command: "{self.test_command}"'
+                    )
+                    stdout, stderr, exit_code, time_of_test_command = (
+                        self._run_test_command(
+                            command=self.test_command,
+                            cwd=self.test_command_dir,
+                        )
+                    )
 
                 # Step 3: Check for pass/fail from the Runner object
                 if exit_code != 0:
@@ -530,19 +1137,14 @@ class UnitTestGenerator:
 
                 # If test passed, check for coverage increase
                 try:
-                    # Step 4: Check that the coverage has increased using the CoverageProcessor class
-                    new_coverage_processor = CoverageProcessor(
-                        file_path=self.code_coverage_report_path,
-                        src_file_path=self.source_file_path,
-                        coverage_type=self.coverage_type,
-                    )
-                    _, _, new_percentage_covered = (
-                        new_coverage_processor.process_coverage_report(
-                            time_of_test_command=time_of_test_command
-                        )
+                    # Step 4: Check that the test covers new lines, compared to the tracked coverage
+                    coverage_delta = self._measure_coverage_delta(
+                        self.code_coverage_report_path,
+                        time_of_test_command,
+                        [generated_test],
                     )
 
-                    if new_percentage_covered <= self.current_coverage:
+                    if not coverage_delta["increased"]:
                         # Coverage has not increased, rollback the test by removing it from the test file
                         with open(self.test_file_path, "w") as test_file:
                             test_file.write(original_content)
@@ -598,9 +1200,9 @@ class UnitTestGenerator:
                     return fail_details
 
                 # If everything passed and coverage increased, update current coverage and log success
-                self.current_coverage = new_percentage_covered
+                self._accept_coverage_delta(coverage_delta)
                 self.logger.info(
-                    f"Test passed and coverage increased. Current coverage: {round(new_percentage_covered * 100, 2)}%"
+                    f"Test passed and coverage increased. Current coverage: {round(self.current_coverage * 100, 2)}%"
                 )
                 return {
                     "status": "PASS",
@@ -609,6 +1211,10 @@ class UnitTestGenerator:
                     "stderr": stderr,
                     "stdout": stdout,
                     "test": generated_test,
+                    "newly_covered_lines": coverage_delta["newly_covered"],
+                    "newly_covered_branches": coverage_delta[
+                        "newly_covered_branches"
+                    ],
                 }
         except Exception as e:
             self.logger.error(f"Error validating test: {e}")
@@ -621,6 +1227,489 @@ class UnitTestGenerator:
                 "test": generated_test,
             }
 
+    def validate_tests_parallel(self, generated_tests_dict: dict, max_workers: int = 4):
+        """
+        Validate all generated tests concurrently, each one in its own sandbox, and merge the accepted tests back into the test file.
+
+        Every candidate is inserted into a private copy of the test command directory, so it gets its own test file and its
+        own coverage report. The sandboxes are run on a bounded worker pool. Candidates that pass and increase the coverage,
+        beyond what the candidates before them cover, are then inserted into the real test file in the order in which they
+        were generated, each credited with the coverage it adds to the earlier candidates, and the test command is run
+        once on the merged test file. If the merged test file does not pass, or does not increase the coverage, the test file
+        is rolled back and the accepted candidates are validated one by one using `validate_test`.
+
+        Parameters:
+            generated_tests_dict (dict): A dictionary containing the generated tests under the 'new_tests' key.
+            max_workers (int, optional): The maximum number of sandboxes to run at the same time. Defaults to 4.
+
+        Returns:
+            list: A list of test validation results, in the same order as the generated tests.
+        """
+        generated_tests = generated_tests_dict.get("new_tests", [])
+        if not generated_tests or not self.relevant_line_number_to_insert_tests_after:
+            return [
+                self.validate_test(generated_test, generated_tests_dict)
+                for generated_test in generated_tests
+            ]
+
+        test_command_dir = os.path.abspath(self.test_command_dir)
+        for path in (self.test_file_path, self.code_coverage_report_path):
+            if os.path.commonpath([test_command_dir, os.path.abspath(path)]) != (
+                test_command_dir
+            ):
+                self.logger.warning(
+                    f'"{path}" is not inside the test command directory "{test_command_dir}". Validating the generated tests sequentially.'
+                )
+                return [
+                    self.validate_test(generated_test, generated_tests_dict)
+                    for generated_test in generated_tests
+                ]
+
+        with open(self.test_file_path, "r") as test_file:
+            original_content = test_file.read()
+
+        self.logger.info(
+            f"Validating {len(generated_tests)} generated tests in parallel sandboxes (max workers: {max_workers})"
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            sandbox_results = list(
+                executor.map(
+                    lambda generated_test: self._run_test_in_sandbox(
+                        generated_test, original_content
+                    ),
+                    generated_tests,
+                )
+            )
+
+        results = [None] * len(generated_tests)
+        accepted_indices = []
+        # Every sandbox is compared to the same coverage, so a candidate that only covers what an earlier candidate
+        # covers is dropped, and each accepted candidate is credited with what it adds to the earlier ones
+        covered_by_candidates = LineSet()
+        branches_covered_by_candidates = dict(self.coverage_tracker.branches)
+        for i, (generated_test, sandbox_result) in enumerate(
+            zip(generated_tests, sandbox_results)
+        ):
+            if not sandbox_result["reason"]:
+                newly_covered_lines = (
+                    sandbox_result["newly_covered_lines"] - covered_by_candidates
+                )
+                newly_covered_branches = sum(
+                    max(
+                        0,
+                        covered
+                        - branches_covered_by_candidates.get(line_number, (0, 0))[0],
+                    )
+                    for line_number, (covered, _) in sandbox_result["branches"].items()
+                )
+                if newly_covered_lines or newly_covered_branches > 0:
+                    sandbox_result["newly_covered_lines"] = newly_covered_lines
+                    sandbox_result["newly_covered_branches"] = newly_covered_branches
+                    covered_by_candidates |= newly_covered_lines
+                    for line_number, (covered, total) in sandbox_result[
+                        "branches"
+                    ].items():
+                        if (
+                            covered
+                            > branches_covered_by_candidates.get(line_number, (0, 0))[0]
+                        ):
+                            branches_covered_by_candidates[line_number] = (
+                                covered,
+                                total,
+                            )
+                else:
+                    sandbox_result["reason"] = "Coverage did not increase"
+                    sandbox_result["error_message"] = (
+                        "did not increase code coverage beyond another generated test"
+                    )
+            if sandbox_result["reason"]:
+                results[i] = self._record_failed_test(generated_test, sandbox_result)
+            else:
+                accepted_indices.append(i)
+
+        if not accepted_indices:
+            return results
+
+        # Merge the accepted tests back into the real test file, in a fixed order
+        processed_test, relevant_line_number_to_insert_tests_after = (
+            self._insert_tests(
+                original_content, [generated_tests[i] for i in accepted_indices]
+            )
+        )
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(processed_test)
+
+        self.logger.info(
+            f'Running merged test file with the following command: "{self.test_command}"'
+        )
+        stdout, stderr, exit_code, time_of_test_command = self._run_test_command(
+            command=self.test_command,
+            cwd=self.test_command_dir,
+        )
+        coverage_delta = None
+        if exit_code == 0:
+            try:
+                coverage_delta = self._measure_coverage_delta(
+                    self.code_coverage_report_path,
+                    time_of_test_command,
+                    [generated_tests[i] for i in accepted_indices],
+                )
+            except Exception as e:
+                self.logger.error(f"Error during coverage verification: {e}")
+
+        if coverage_delta is None or not coverage_delta["increased"]:
+            # The accepted tests do not work together, fall back to validating them one by one
+            self.logger.info(
+                "Merged test file did not pass or did not increase coverage. Validating the accepted tests sequentially."
+            )
+            with open(self.test_file_path, "w") as test_file:
+                test_file.write(original_content)
+            for i in accepted_indices:
+                results[i] = self.validate_test(
+                    generated_tests[i], generated_tests_dict
+                )
+            return results
+
+        self.relevant_line_number_to_insert_tests_after = (
+            relevant_line_number_to_insert_tests_after
+        )
+        self._accept_coverage_delta(coverage_delta)
+        self.logger.info(
+            f"{len(accepted_indices)} tests passed and coverage increased. Current coverage: {round(self.current_coverage * 100, 2)}%"
+        )
+        for i in accepted_indices:
+            results[i] = {
+                "status": "PASS",
+                "reason": "",
+                "exit_code": sandbox_results[i]["exit_code"],
+                "stderr": sandbox_results[i]["stderr"],
+                "stdout": sandbox_results[i]["stdout"],
+                "test": generated_tests[i],
+                "newly_covered_lines": sandbox_results[i]["newly_covered_lines"],
+                "newly_covered_branches": sandbox_results[i][
+                    "newly_covered_branches"
+                ],
+            }
+        return results
+
+    def validate_tests_batched(self, generated_tests_dict: dict):
+        """
+        Validate all generated tests with a single run of the test command, and bisect the batch to find the bad tests.
+
+        All the generated tests are inserted into the test file at once, and the test command is run once. If the run passes
+        and each test newly covers some of the lines it claims to cover ('lines_to_cover'), other than the lines claimed by
+        the tests before it, all the tests are accepted, each credited with its own claimed lines. If the run passes but
+        the coverage did not increase, none of the tests can increase it, so all of them are rejected. Otherwise, the
+        batch is rolled back, split in half, and each half is validated the same way, down to single tests: a single test
+        is accepted only if it passes and increases the coverage on its own.
+
+        Parameters:
+            generated_tests_dict (dict): A dictionary containing the generated tests under the 'new_tests' key.
+
+        Returns:
+            list: A list of test validation results, in the same order as the generated tests.
+        """
+        generated_tests = generated_tests_dict.get("new_tests", [])
+        if not generated_tests or not self.relevant_line_number_to_insert_tests_after:
+            return [
+                self.validate_test(generated_test, generated_tests_dict)
+                for generated_test in generated_tests
+            ]
+
+        results = [None] * len(generated_tests)
+        self._validate_batch(list(range(len(generated_tests))), generated_tests, results)
+        return results
+
+    def _validate_batch(self, indices: list, generated_tests: list, results: list):
+        """
+        Validate a batch of generated tests with a single run of the test command, bisecting it when it fails or when the
+        coverage it adds cannot be attributed to each of its tests.
+
+        Parameters:
+            indices (list): The indices of the generated tests in the batch.
+            generated_tests (list): All the generated tests.
+            results (list): The test validation results, filled in place at the indices of the batch.
+        """
+        batch = [generated_tests[i] for i in indices]
+        with open(self.test_file_path, "r") as test_file:
+            original_content = test_file.read()
+        processed_test, relevant_line_number_to_insert_tests_after = (
+            self._insert_tests(original_content, batch)
+        )
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(processed_test)
+
+        self.logger.info(
+            f'Running a batch of {len(batch)} tests with the following command: "{self.test_command}"'
+        )
+        stdout, stderr, exit_code, time_of_test_command = self._run_test_command(
+            command=self.test_command,
+            cwd=self.test_command_dir,
+        )
+        batch_result = {
+            "reason": "",
+            "exit_code": exit_code,
+            "stderr": stderr,
+            "stdout": stdout,
+            "error_message": "",
+        }
+        if exit_code == 0:
+            try:
+                coverage_delta = self._measure_coverage_delta(
+                    self.code_coverage_report_path, time_of_test_command, batch
+                )
+                if not coverage_delta["increased"]:
+                    batch_result["reason"] = "Coverage did not increase"
+                    batch_result["error_message"] = "did not increase code coverage"
+            except Exception as e:
+                self.logger.error(f"Error during coverage verification: {e}")
+                batch_result["reason"] = "Runtime error"
+                batch_result["error_message"] = "coverage verification error"
+        else:
+            batch_result["reason"] = "Test failed"
+            batch_result["error_message"] = extract_error_message_python(stdout)
+
+        if not batch_result["reason"] and len(indices) == 1:
+            credited_lines = [coverage_delta["newly_covered"]]
+        elif not batch_result["reason"]:
+            credited_lines = self._attribute_newly_covered_lines(
+                batch, coverage_delta["newly_covered"]
+            )
+        else:
+            credited_lines = None
+
+        if credited_lines is not None:
+            self.relevant_line_number_to_insert_tests_after = (
+                relevant_line_number_to_insert_tests_after
+            )
+            self._accept_coverage_delta(coverage_delta)
+            self.logger.info(
+                f"{len(batch)} tests passed and coverage increased. Current coverage: {round(self.current_coverage * 100, 2)}%"
+            )
+            for i, generated_test, newly_covered_lines in zip(
+                indices, batch, credited_lines
+            ):
+                results[i] = {
+                    "status": "PASS",
+                    "reason": "",
+                    "exit_code": exit_code,
+                    "stderr": stderr,
+                    "stdout": stdout,
+                    "test": generated_test,
+                    "newly_covered_lines": newly_covered_lines,
+                    # New branches cannot be attributed to one of several tests
+                    "newly_covered_branches": (
+                        coverage_delta["newly_covered_branches"]
+                        if len(batch) == 1
+                        else 0
+                    ),
+                }
+            return
+
+        # Roll back the batch
+        with open(self.test_file_path, "w") as test_file:
+            test_file.write(original_content)
+
+        if batch_result["reason"] not in ("", "Test failed") or len(indices) == 1:
+            # A passing batch that does not increase the coverage has no subset that does
+            for i in indices:
+                results[i] = self._record_failed_test(generated_tests[i], batch_result)
+            return
+
+        # Split a failing batch to find the bad tests, and a passing one whose coverage cannot be attributed to each test
+        # to measure the coverage each test adds on its own, against the coverage accepted so far
+        middle = len(indices) // 2
+        self._validate_batch(indices[:middle], generated_tests, results)
+        self._validate_batch(indices[middle:], generated_tests, results)
+
+    @staticmethod
+    def _attribute_newly_covered_lines(generated_tests: list, newly_covered):
+        """
+        Attribute the lines newly covered by a batch of tests to the tests that claimed to cover them.
+
+        Parameters:
+            generated_tests (list): The generated tests of the batch, in the order they were inserted.
+            newly_covered (LineSet): The lines newly covered by the batch.
+
+        Returns:
+            list: The lines credited to each test, or None if a test claims no newly covered line that an earlier test of
+            the batch did not already claim.
+        """
+        attributed_lines = LineSet()
+        credited_lines = []
+        for generated_test in generated_tests:
+            claimed_lines = (
+                parse_line_numbers(generated_test.get("lines_to_cover"))
+                & newly_covered
+            ) - attributed_lines
+            if not claimed_lines:
+                return None
+            attributed_lines |= claimed_lines
+            credited_lines.append(claimed_lines)
+        return credited_lines
+
+    def _insert_tests(self, original_content: str, generated_tests: list):
+        """
+        Insert several generated tests into the content of a test file, one after the other, in the given order.
+
+        Parameters:
+            original_content (str): The content of the test file before the insertion.
+            generated_tests (list): The generated tests to insert.
+
+        Returns:
+            tuple: A tuple containing the processed test file content and the line number after which the next test should be inserted.
+        """
+        processed_test = original_content
+        relevant_line_number_to_insert_tests_after = (
+            self.relevant_line_number_to_insert_tests_after
+        )
+        # Lines after the insertion point are never touched, so the next test goes right before them
+        trailing_lines_count = (
+            len(original_content.split("\n"))
+            - self.relevant_line_number_to_insert_tests_after
+        )
+        for generated_test in generated_tests:
+            processed_test, _ = self._insert_test(
+                processed_test,
+                generated_test,
+                relevant_line_number_to_insert_tests_after,
+                self.relevant_line_number_to_insert_imports_after,
+            )
+            relevant_line_number_to_insert_tests_after = (
+                len(processed_test.split("\n")) - trailing_lines_count
+            )
+        return processed_test, relevant_line_number_to_insert_tests_after
+
+    def _run_test_in_sandbox(self, generated_test: dict, original_content: str):
+        """
+        Run a generated test in a private copy of the test command directory.
+
+        Parameters:
+            generated_test (dict): The generated test to run.
+            original_content (str): The content of the test file the generated test is inserted into.
+
+        Returns:
+            dict: A dictionary containing the failure reason (empty if the test passed and increased the coverage), exit code, stderr, stdout and error message.
+        """
+        test_command_dir = os.path.abspath(self.test_command_dir)
+        sandbox_dir = tempfile.mkdtemp(prefix=SANDBOX_DIR_PREFIX)
+        try:
+            shutil.copytree(
+                test_command_dir,
+                sandbox_dir,
+                symlinks=True,
+                dirs_exist_ok=True,
+                ignore=shutil.ignore_patterns(".git", "__pycache__", ".pytest_cache"),
+            )
+            sandbox_test_file_path = os.path.join(
+                sandbox_dir,
+                os.path.relpath(os.path.abspath(self.test_file_path), test_command_dir),
+            )
+            sandbox_coverage_report_path = os.path.join(
+                sandbox_dir,
+                os.path.relpath(
+                    os.path.abspath(self.code_coverage_report_path), test_command_dir
+                ),
+            )
+
+            processed_test, _ = self._insert_test(
+                original_content,
+                generated_test,
+                self.relevant_line_number_to_insert_tests_after,
+                self.relevant_line_number_to_insert_imports_after,
+            )
+            with open(sandbox_test_file_path, "w") as test_file:
+                test_file.write(processed_test)
+
+            stdout, stderr, exit_code, time_of_test_command = self._run_test_command(
+                command=self.test_command,
+                cwd=sandbox_dir,
+            )
+            sandbox_result = {
+                "reason": "",
+                "exit_code": exit_code,
+                "stderr": stderr,
+                "stdout": stdout,
+                "error_message": "",
+            }
+            if exit_code != 0:
+                sandbox_result["reason"] = "Test failed"
+                sandbox_result["error_message"] = extract_error_message_python(stdout)
+                return sandbox_result
+
+            try:
+                coverage_delta = self._measure_coverage_delta(
+                    sandbox_coverage_report_path,
+                    time_of_test_command,
+                    [generated_test],
+                    run_dir=sandbox_dir,
+                )
+            except Exception as e:
+                self.logger.error(f"Error during coverage verification: {e}")
+                sandbox_result["reason"] = "Runtime error"
+                sandbox_result["error_message"] = "coverage verification error"
+                return sandbox_result
+
+            sandbox_result["newly_covered_lines"] = coverage_delta["newly_covered"]
+            sandbox_result["newly_covered_branches"] = coverage_delta[
+                "newly_covered_branches"
+            ]
+            sandbox_result["branches"] = coverage_delta["branches"]
+            if not coverage_delta["increased"]:
+                sandbox_result["reason"] = "Coverage did not increase"
+                sandbox_result["error_message"] = "did not increase code coverage"
+            return sandbox_result
+        except Exception as e:
+            self.logger.error(f"Error validating test in sandbox: {e}")
+            return {
+                "reason": f"Error validating test: {e}",
+                "exit_code": None,
+                "stderr": str(e),
+                "stdout": "",
+                "error_message": "",
+            }
+        finally:
+            shutil.rmtree(sandbox_dir, ignore_errors=True)
+
+    def _record_failed_test(self, generated_test: dict, run_result: dict):
+        """
+        Record a generated test that failed a parallel or batched validation, so it is reported in the next prompt.
+
+        Parameters:
+            generated_test (dict): The generated test that failed.
+            run_result (dict): The reason of the failure, and the exit code, stderr, stdout and error message of the run.
+
+        Returns:
+            dict: A dictionary containing the failure details of the test.
+        """
+        self.logger.info(
+            f"Skipping a generated test that failed: {run_result['reason']}"
+        )
+        fail_details = {
+            "status": "FAIL",
+            "reason": run_result["reason"],
+            "exit_code": run_result["exit_code"],
+            "stderr": run_result["stderr"],
+            "stdout": run_result["stdout"],
+            "test": generated_test,
+        }
+        self.failed_test_runs.append(
+            {"code": generated_test, "error_message": run_result["error_message"]}
+        )  # Append failure details to the list
+
+        if "WANDB_API_KEY" in os.environ:
+            fail_details["error_message"] = run_result["error_message"]
+            root_span = Trace(
+                name="fail_details_"
+                + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),
+                kind="llm",  # kind can be "llm", "chain", "agent" or "tool
+                inputs={"test_code": fail_details["test"]},
+                outputs=fail_details,
+            )
+            root_span.log(name="inference")
+
+        return fail_details
+
 
 def extract_error_message_python(fail_message):
     """
@@ -1,6 +1,7 @@
 import argparse
 import os
 from cover_agent.CoverAgent import CoverAgent
+from cover_agent.ResponseCache import CACHE_MODES
 from cover_agent.version import __version__
 
 
@@ -43,10 +44,16 @@ def parse_args():
         nargs="*",
         help='List of files to include in the coverage. For example, "--included-files library1.c library2.c." Default: %(default)s.',
     )
+    parser.add_argument(
+        "--included-files-mode",
+        default="full",
+        choices=["full", "symbols"],
+        help="How the included files are added to the prompt: 'full' adds the whole files, 'symbols' only adds the definitions that the source file imports and uses from Python included files, in full when they are small and as signatures and docstrings otherwise. Default: %(default)s.",
+    )
     parser.add_argument(
         "--coverage-type",
         default="cobertura",
-        help="Type of coverage report. Default: %(default)s.",
+        help="Type of coverage report: cobertura, lcov, jacoco, or coveragepy to read the coverage.py data file (e.g. .coverage) without generating a report. Default: %(default)s.",
     )
     parser.add_argument(
         "--report-filepath",
@@ -80,6 +87,96 @@ def parse_args():
         default="http://localhost:11434",
         help="The API url to use for Ollama or Hugging Face. Default: %(default)s.",
     )
+    # The generated tests are validated in one of these ways, the default being one after another
+    validation_mode = parser.add_mutually_exclusive_group()
+    validation_mode.add_argument(
+        "--parallel-validation-workers",
+        type=int,
+        default=1,
+        help="Number of generated tests to validate at the same time, each in its own copy of the test command directory. A value of 1 validates the generated tests one after another. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--max-concurrent-llm-calls",
+        type=int,
+        default=4,
+        help="The maximum number of independent LLM calls that are sent at the same time. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--max-prompt-tokens",
+        type=int,
+        default=0,
+        help="The token budget of the test generation prompt. When the prompt exceeds it, the coverage report, the source file, the failed tests, the test file and the included files are kept in this order of priority, and the lower priority ones are trimmed. Default: no budget.",
+    )
+    parser.add_argument(
+        "--condensed-test-file-top-k",
+        type=int,
+        default=0,
+        help="If greater than 0, the prompts show the test file condensed: imports, fixtures and helpers, this number of existing tests that are the most relevant to the missed lines, and the signatures of the other tests. Default: the full test file.",
+    )
+    parser.add_argument(
+        "--llm-cache-dir",
+        default="",
+        help="Directory of an on-disk cache of LLM responses. Identical prompts are answered from the cache instead of calling the LLM. Default: no cache.",
+    )
+    parser.add_argument(
+        "--llm-cache-mode",
+        default="read-write",
+        choices=CACHE_MODES,
+        help="How the LLM response cache is used. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--llm-cache-max-size-mb",
+        type=int,
+        default=512,
+        help="The maximum size of the LLM response cache. The least recently used responses are evicted first. Default: %(default)s.",
+    )
+    parser.add_argument(
+        "--disable-streaming",
+        action="store_true",
+        help="If set, LLM responses are requested in a single piece instead of being streamed. Default: False.",
+    )
+    validation_mode.add_argument(
+        "--incremental-validation",
+        action="store_true",
+        help="If set, each generated test is validated as soon as it is received from the LLM, while the remaining tests are still being generated. Default: False.",
+    )
+    validation_mode.add_argument(
+        "--batched-validation",
+        action="store_true",
+        help="If set, all the tests generated in an iteration are validated with a single run of the test command, and the batch is bisected to find the failing tests. Default: False.",
+    )
+    parser.add_argument(
+        "--targeted-validation",
+        action="store_true",
+        help="If set, each generated test is first run on its own, and the full test command only runs for tests that pass. Default: False.",
+    )
+    parser.add_argument(
+        "--targeted-test-command",
+        default="",
+        help='The command that runs a single test, used by --targeted-validation. "{test_file}" and "{test_name}" are replaced with the test file path and the test name. Default: derived from the test command when it runs pytest.',
+    )
+    parser.add_argument(
+        "--test-command-timeout",
+        type=float,
+        default=None,
+        help="The maximum time of a test command run, in seconds. A run that exceeds it is killed, with all the processes it started, and counts as failed. Default: no timeout.",
+    )
+    parser.add_argument(
+        "--branch-coverage",
+        action="store_true",
+        help="If set, --desired-coverage is measured on lines and branches together, when the coverage report has branch data (e.g. pytest --cov-branch). Default: False.",
+    )
+    parser.add_argument(
+        "--test-cache-dir",
+        default="",
+        help="Directory of an on-disk cache of test command results. A test command run on the same source file, test file and test cache inputs returns the cached result and coverage report instead of running the tests again. Default: no cache.",
+    )
+    parser.add_argument(
+        "--test-cache-inputs",
+        nargs="+",
+        default=None,
+        help="Glob patterns of other files the test results depend on (e.g. 'src/**/*.py'), relative to the test command directory. Used in the key of the test result cache. Default: None.",
+    )
     parser.add_argument(
         "--strict-coverage",
         action="store_true",
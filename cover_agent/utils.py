@@ -1,8 +1,9 @@
 import logging
 import re
+import textwrap
 import yaml
 
-from typing import List
+from typing import Iterable, List
 
 
 def load_yaml(response_text: str, keys_fix_yaml: List[str] = []) -> dict:
@@ -66,6 +67,11 @@ def try_fix_yaml(response_text: str, keys_fix_yaml: List[str] = []) -> dict:
             if (
                 key in response_text_lines_copy[i]
                 and not "|-" in response_text_lines_copy[i]
+                # Values that are already block scalars, e.g. 'test_code: |', are valid
+                and not response_text_lines_copy[i]
+                .split(key, 1)[1]
+                .strip()
+                .startswith(("|", ">"))
             ):
                 response_text_lines_copy[i] = response_text_lines_copy[i].replace(
                     f"{key}", f"{key} |-\n        "
@@ -143,3 +149,93 @@ def try_fix_yaml(response_text: str, keys_fix_yaml: List[str] = []) -> dict:
             pass
     except:
         pass
+
+
+def iter_yaml_list_items(chunks: Iterable[str], list_key: str = "new_tests"):
+    """
+    Incrementally parse a streamed YAML response, and yield the items of a top-level list as soon as each one is complete.
+
+    Parameters:
+    chunks (Iterable[str]): The text chunks of the response, in the order in which they were received.
+    list_key (str): The top-level key of the list whose items are yielded (default is 'new_tests').
+
+    Yields:
+    dict: Each parsed item of the list. Items that cannot be parsed are skipped.
+
+    An item is complete once the next item starts, the list ends (a line indented at or before the list items that is not
+    a new item, or a closing code fence), or the stream ends. This lets callers act on the first items while the rest of
+    the response is still being generated.
+
+    Example:
+        for new_test in iter_yaml_list_items(chunks, list_key='new_tests'):
+            ...
+    """
+    in_list = False
+    list_done = False
+    item_indent = None
+    item_lines = []
+    pending = ""
+
+    def parse_item(lines):
+        block = textwrap.dedent("\n".join(lines) + "\n")
+        try:
+            data = yaml.safe_load(block)
+        except Exception as e:
+            logging.info(f"Failed to parse streamed YAML item: {e}")
+            return None
+        if isinstance(data, list) and data and isinstance(data[0], dict):
+            return data[0]
+        return None
+
+    def process_line(line):
+        nonlocal in_list, list_done, item_indent, item_lines
+        stripped = line.strip()
+        if list_done:
+            return None
+        if not in_list:
+            if re.match(rf"^{re.escape(list_key)}:\s*$", line.rstrip()):
+                in_list = True
+            return None
+        if not stripped or stripped.startswith("#"):
+            if item_lines:
+                item_lines.append(line)
+            return None
+
+        indent = len(line) - len(line.lstrip())
+        if item_indent is None and stripped.startswith("- "):
+            item_indent = indent
+        if item_indent is None:
+            return None
+
+        completed_item = None
+        if indent == item_indent and stripped.startswith("- "):
+            # A new item starts, so the previous one is complete
+            if item_lines:
+                completed_item = parse_item(item_lines)
+            item_lines = [line]
+        elif indent <= item_indent or stripped.startswith("```"):
+            # The list ended
+            if item_lines:
+                completed_item = parse_item(item_lines)
+            item_lines = []
+            list_done = True
+        else:
+            item_lines.append(line)
+        return completed_item
+
+    for chunk in chunks:
+        pending += chunk
+        *complete_lines, pending = pending.split("\n")
+        for line in complete_lines:
+            item = process_line(line)
+            if item is not None:
+                yield item
+
+    if pending:
+        item = process_line(pending)
+        if item is not None:
+            yield item
+    if in_list and not list_done and item_lines:
+        item = parse_item(item_lines)
+        if item is not None:
+            yield item
@@ -1,8 +1,10 @@
+import asyncio
 import os
 
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from cover_agent.AICaller import AICaller
+from cover_agent.ResponseCache import ResponseCache
 
 
 class TestAICaller:
@@ -112,3 +114,171 @@ class TestAICaller:
             str(exc_info.value)
             == "\"The prompt dictionary must contain 'system' and 'user' keys.\""
         )
+
+    @pytest.mark.asyncio
+    @patch("cover_agent.AICaller.litellm.acompletion")
+    async def test_call_model_async(self, mock_acompletion, ai_caller):
+        async def stream():
+            yield {"choices": [{"delta": {"content": "response"}}]}
+
+        mock_acompletion.return_value = stream()
+        prompt = {"system": "", "user": "Hello, world!"}
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            mock_builder.return_value = {
+                "choices": [{"message": {"content": "response"}}],
+                "usage": {"prompt_tokens": 2, "completion_tokens": 10},
+            }
+            response, prompt_tokens, response_tokens = await ai_caller.call_model_async(
+                prompt
+            )
+            assert response == "response"
+            assert prompt_tokens == 2
+            assert response_tokens == 10
+            assert mock_acompletion.call_args.kwargs["stream"] is True
+
+    def test_call_models_limits_in_flight_calls(self, ai_caller):
+        ai_caller.max_concurrent_calls = 2
+        in_flight = 0
+        max_in_flight = 0
+
+        async def fake_acompletion(**kwargs):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+            async def stream():
+                yield kwargs["messages"][-1]["content"]
+
+            return stream()
+
+        def fake_builder(chunks, messages=None):
+            return {
+                "choices": [{"message": {"content": chunks[0]}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1},
+            }
+
+        prompts = [{"system": "", "user": f"prompt {i}"} for i in range(5)]
+        with patch(
+            "cover_agent.AICaller.litellm.acompletion", side_effect=fake_acompletion
+        ), patch(
+            "cover_agent.AICaller.litellm.stream_chunk_builder",
+            side_effect=fake_builder,
+        ):
+            responses = ai_caller.call_models(prompts)
+
+        assert [response for response, _, _ in responses] == [
+            f"prompt {i}" for i in range(5)
+        ]
+        assert max_in_flight == 2
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_uses_response_cache(self, mock_completion, tmp_path):
+        mock_completion.return_value = [
+            {"choices": [{"delta": {"content": "response"}}]}
+        ]
+        ai_caller = AICaller(
+            "test-model", "test-api", cache=ResponseCache(str(tmp_path))
+        )
+        prompt = {"system": "", "user": "Hello, world!"}
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            mock_builder.return_value = {
+                "choices": [
+                    {"message": {"content": "response"}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 2, "completion_tokens": 10},
+            }
+            first = ai_caller.call_model(prompt)
+            second = ai_caller.call_model(prompt)
+
+        assert first == second == ("response", 2, 10)
+        mock_completion.assert_called_once()
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_does_not_cache_failed_stream(self, mock_completion, tmp_path):
+        def interrupted_stream():
+            yield {"choices": [{"delta": {"content": "partial"}}]}
+            raise ConnectionError("Stream interrupted")
+
+        mock_completion.side_effect = lambda **kwargs: interrupted_stream()
+        ai_caller = AICaller(
+            "test-model", "test-api", cache=ResponseCache(str(tmp_path))
+        )
+        prompt = {"system": "", "user": "Hello, world!"}
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            mock_builder.return_value = {
+                "choices": [
+                    {"message": {"content": "partial"}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 2, "completion_tokens": 1},
+            }
+            ai_caller.call_model(prompt)
+            ai_caller.call_model(prompt)
+
+            # A stream cut off by the model is not cached either
+            mock_builder.return_value["choices"][0]["finish_reason"] = "length"
+            mock_completion.side_effect = None
+            mock_completion.return_value = []
+            ai_caller.call_model(prompt)
+            ai_caller.call_model(prompt)
+
+        assert mock_completion.call_count == 4
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_without_streaming(self, mock_completion):
+        mock_completion.return_value = {
+            "choices": [{"message": {"content": "response"}}],
+            "usage": {"prompt_tokens": 2, "completion_tokens": 10},
+        }
+        ai_caller = AICaller("test-model", "test-api", stream=False)
+        prompt = {"system": "", "user": "Hello, world!"}
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            response, prompt_tokens, response_tokens = ai_caller.call_model(prompt)
+            mock_builder.assert_not_called()
+        assert response == "response"
+        assert prompt_tokens == 2
+        assert response_tokens == 10
+        assert mock_completion.call_args.kwargs["stream"] is False
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_echoes_stream_only_to_tty(
+        self, mock_completion, ai_caller, capsys
+    ):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = "streamed"
+        mock_completion.return_value = [chunk]
+        prompt = {"system": "", "user": "Hello, world!"}
+        with patch(
+            "cover_agent.AICaller.litellm.stream_chunk_builder"
+        ) as mock_builder, patch("cover_agent.AICaller.sys.stdout") as mock_stdout:
+            mock_builder.return_value = {
+                "choices": [{"message": {"content": "response"}}],
+                "usage": {"prompt_tokens": 2, "completion_tokens": 10},
+            }
+            mock_stdout.isatty.return_value = False
+            ai_caller.call_model(prompt)
+            mock_stdout.write.assert_not_called()
+
+            mock_stdout.isatty.return_value = True
+            ai_caller.call_model(prompt)
+            written = "".join(c.args[0] for c in mock_stdout.write.call_args_list)
+            assert "streamed" in written
+
+    @patch("cover_agent.AICaller.litellm.completion")
+    def test_call_model_on_chunk(self, mock_completion, ai_caller):
+        chunks = []
+        for content in ["Hello", " ", "world"]:
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = content
+            chunks.append(chunk)
+        mock_completion.return_value = chunks
+        prompt = {"system": "", "user": "Hello, world!"}
+        received = []
+        with patch("cover_agent.AICaller.litellm.stream_chunk_builder") as mock_builder:
+            mock_builder.return_value = {
+                "choices": [{"message": {"content": "Hello world"}}],
+                "usage": {"prompt_tokens": 2, "completion_tokens": 10},
+            }
+            ai_caller.call_model(prompt, on_chunk=received.append)
+        assert received == ["Hello", " ", "world"]
@@ -0,0 +1,71 @@
+import os
+import time
+
+from cover_agent.CommandResultCache import CommandResultCache
+from cover_agent.Runner import Runner
+
+
+class TestCommandResultCache:
+    def test_make_key_depends_on_input_content(self, tmp_path):
+        test_file = tmp_path / "test_app.py"
+        test_file.write_text("def test_a(): pass\n")
+        cache = CommandResultCache(str(tmp_path / "cache"), input_files=[test_file])
+
+        key1 = cache.make_key("pytest", str(tmp_path))
+        assert cache.make_key("pytest", str(tmp_path)) == key1
+        assert cache.make_key("pytest -x", str(tmp_path)) != key1
+
+        test_file.write_text("def test_b(): pass\n")
+        assert cache.make_key("pytest", str(tmp_path)) != key1
+
+    def test_make_key_includes_input_globs(self, tmp_path):
+        (tmp_path / "pkg").mkdir()
+        module = tmp_path / "pkg" / "module.py"
+        module.write_text("x = 1\n")
+        cache = CommandResultCache(str(tmp_path / "cache"), input_globs=["pkg/*.py"])
+
+        key1 = cache.make_key("pytest", str(tmp_path))
+        module.write_text("x = 2\n")
+        assert cache.make_key("pytest", str(tmp_path)) != key1
+
+    def test_put_and_get_restores_output_files(self, tmp_path):
+        report = tmp_path / "coverage.xml"
+        cache = CommandResultCache(str(tmp_path / "cache"), output_files=[report])
+        command_start_time = int(round(time.time() * 1000)) - 1000
+        report.write_text("<coverage/>")
+        cache.put("key", "out", "err", 1, command_start_time)
+
+        report.write_text("<coverage>changed</coverage>")
+        stdout, stderr, exit_code, restore_time = cache.get("key")
+
+        assert (stdout, stderr, exit_code) == ("out", "err", 1)
+        assert report.read_text() == "<coverage/>"
+        # The restored report looks newer than the command that "produced" it
+        assert int(round(os.path.getmtime(report) * 1000)) > restore_time
+        assert cache.get("missing") is None
+
+    def test_put_skips_stale_output_files(self, tmp_path):
+        report = tmp_path / "coverage.xml"
+        report.write_text("<coverage/>")
+        past = time.time() - 10
+        os.utime(report, (past, past))
+        cache = CommandResultCache(str(tmp_path / "cache"), output_files=[report])
+        cache.put("key", "out", "", 0, int(round(time.time() * 1000)))
+
+        report.write_text("<coverage>changed</coverage>")
+        assert cache.get("key")[:3] == ("out", "", 0)
+        assert report.read_text() == "<coverage>changed</coverage>"
+
+    def test_runner_returns_cached_result(self, tmp_path):
+        counter = tmp_path / "counter"
+        cache = CommandResultCache(str(tmp_path / "cache"))
+        command = f"echo run >> {counter} && echo done"
+
+        first = Runner.run_command(command, cwd=str(tmp_path), cache=cache)
+        second = Runner.run_command(command, cwd=str(tmp_path), cache=cache)
+
+        assert not first.cached
+        assert second.cached
+        assert second.stdout == first.stdout == "done\n"
+        assert second.exit_code == 0
+        assert counter.read_text() == "run\n"
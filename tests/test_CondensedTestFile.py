@@ -0,0 +1,65 @@
+from cover_agent.CondensedTestFile import CondensedTestFile
+
+TEST_FILE = """import pytest
+from calculator import add, divide, multiply
+
+
+@pytest.fixture
+def numbers():
+    return 6, 3
+
+
+def make_pair(a, b):
+    return a, b
+
+
+def test_add(numbers):
+    assert add(*numbers) == 9
+
+
+def test_multiply(numbers):
+    assert multiply(*numbers) == 18
+
+
+class TestDivide:
+    def setup_method(self):
+        self.pair = make_pair(6, 3)
+
+    def test_divide(self):
+        assert divide(*self.pair) == 2
+
+    def test_divide_by_zero(self):
+        with pytest.raises(ZeroDivisionError):
+            divide(1, 0)
+"""
+
+
+class TestCondensedTestFile:
+    def test_condense_keeps_shared_code_and_relevant_tests(self):
+        query = (
+            "20 def divide(a, b):\n21     if b == 0:\n22         raise ZeroDivisionError"
+        )
+        condensed, condensed_numbered = CondensedTestFile(
+            "test_calculator.py", TEST_FILE
+        ).condense(query, top_k=1)
+
+        # Imports, fixtures, helpers and setup methods are kept verbatim
+        assert "from calculator import add, divide, multiply" in condensed
+        assert "    return 6, 3" in condensed
+        assert "    return a, b" in condensed
+        assert "        self.pair = make_pair(6, 3)" in condensed
+        # The most relevant test is kept verbatim, the other tests are reduced to their signatures
+        assert "            divide(1, 0)" in condensed
+        assert "    def test_divide(self):" in condensed
+        assert "        assert divide(*self.pair) == 2" not in condensed
+        assert "def test_add(numbers):" in condensed
+        assert "    assert add(*numbers) == 9" not in condensed
+        # The numbered view keeps the original line numbers
+        assert "14 def test_add(numbers):" in condensed_numbered.split("\n")
+        assert "31             divide(1, 0)" in condensed_numbered.split("\n")
+
+    def test_condense_returns_none_for_unsupported_or_invalid_files(self):
+        java_test_file = CondensedTestFile("TestCalculator.java", TEST_FILE)
+        assert java_test_file.condense("", 1) is None
+        broken_test_file = CondensedTestFile("test_broken.py", "def test(:\n")
+        assert broken_test_file.condense("", 1) is None
@@ -96,3 +96,23 @@ class TestCoverAgent:
                 agent = CoverAgent(args)
 
         assert str(exc_info.value) == f"Test file not found at {args.test_file_path}"
+
+    @patch("cover_agent.CoverAgent.os.path.isfile")
+    @patch("cover_agent.CoverAgent.UnitTestGenerator")
+    def test_agent_combined_validation_modes(self, mock_unit_cover_agent, mock_isfile):
+        args = argparse.Namespace(
+            source_file_path="test_source.py",
+            test_file_path="test_file.py",
+            incremental_validation=False,
+            batched_validation=True,
+            parallel_validation_workers=4,
+        )
+        mock_isfile.return_value = True
+
+        with pytest.raises(ValueError) as exc_info:
+            CoverAgent(args)
+
+        assert "--batched-validation and --parallel-validation-workers" in str(
+            exc_info.value
+        )
+        mock_unit_cover_agent.assert_not_called()
@@ -1,34 +1,44 @@
+import shutil
 import pytest
-import xml.etree.ElementTree as ET
 from cover_agent.CoverageProcessor import CoverageProcessor
+from cover_agent.LineSet import LineSet
 
 
 @pytest.fixture
-def mock_xml_tree(monkeypatch):
+def mock_xml_tree(tmp_path):
     """
-    Creates a mock function to simulate the ET.parse method, returning a mocked XML tree structure.
+    Writes a Cobertura XML report to a temporary file, and returns its path.
     """
-
-    def mock_parse(file_path):
-        # Mock XML structure for the test
-        xml_str = """<coverage>
-                        <packages>
-                            <package>
-                                <classes>
-                                    <class filename="app.py">
-                                        <lines>
-                                            <line number="1" hits="1"/>
-                                            <line number="2" hits="0"/>
-                                        </lines>
-                                    </class>
-                                </classes>
-                            </package>
-                        </packages>
-                     </coverage>"""
-        root = ET.ElementTree(ET.fromstring(xml_str))
-        return root
-
-    monkeypatch.setattr(ET, "parse", mock_parse)
+    # Mock XML structure for the test
+    xml_str = """<coverage>
+                    <packages>
+                        <package>
+                            <classes>
+                                <class filename="other.py">
+                                    <lines>
+                                        <line number="1" hits="0"/>
+                                    </lines>
+                                </class>
+                                <class filename="app.py">
+                                    <methods>
+                                        <method name="main">
+                                            <lines>
+                                                <line number="1" hits="1"/>
+                                            </lines>
+                                        </method>
+                                    </methods>
+                                    <lines>
+                                        <line number="1" hits="1"/>
+                                        <line number="2" hits="0"/>
+                                    </lines>
+                                </class>
+                            </classes>
+                        </package>
+                    </packages>
+                 </coverage>"""
+    report_path = tmp_path / "coverage.xml"
+    report_path.write_text(xml_str)
+    return str(report_path)
 
 
 class TestCoverageProcessor:
@@ -37,16 +47,201 @@ class TestCoverageProcessor:
         # Initializes CoverageProcessor with cobertura coverage type for each test
         return CoverageProcessor("fake_path", "app.py", "cobertura")
 
-    def test_parse_coverage_report_cobertura(self, mock_xml_tree, processor):
+    def test_parse_coverage_report_cobertura(self, mock_xml_tree):
         """
         Tests the parse_coverage_report method for correct line number and coverage calculation with Cobertura reports.
         """
+        processor = CoverageProcessor(mock_xml_tree, "app.py", "cobertura")
         covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report()
 
-        assert covered_lines == [1], "Should list line 1 as covered"
-        assert missed_lines == [2], "Should list line 2 as missed"
+        assert covered_lines == LineSet([1]), "Should list line 1 as covered"
+        assert missed_lines == LineSet([2]), "Should list line 2 as missed"
         assert coverage_pct == 0.5, "Coverage should be 50 percent"
 
+    def test_parse_coverage_report_cobertura_aggregates_classes(self, tmp_path):
+        """
+        Tests that all the class entries of a file are aggregated, and that the longest matching path suffix is used.
+        """
+        report_path = tmp_path / "coverage.xml"
+        report_path.write_text(
+            """<coverage><packages><package><classes>
+                <class filename="pkg/utils.py"><lines>
+                    <line number="1" hits="1"/><line number="2" hits="0"/>
+                </lines></class>
+                <class filename="pkg/utils.py"><lines>
+                    <line number="2" hits="3"/><line number="5" hits="0"/>
+                </lines></class>
+                <class filename="utils.py"><lines>
+                    <line number="1" hits="0"/>
+                </lines></class>
+                <class filename="myutils.py"><lines>
+                    <line number="7" hits="1"/>
+                </lines></class>
+            </classes></package></packages></coverage>"""
+        )
+
+        processor = CoverageProcessor(
+            str(report_path), str(tmp_path / "src" / "pkg" / "utils.py"), "cobertura"
+        )
+        assert processor.parse_coverage_report() == (
+            LineSet([1, 2]),
+            LineSet([5]),
+            2 / 3,
+        )
+        assert processor.get_cobertura_index()["pkg/utils.py"] == {
+            "covered": LineSet([1, 2]),
+            "lines": LineSet([1, 2, 5]),
+            "branches": {},
+        }
+
+        processor = CoverageProcessor(
+            str(report_path), str(tmp_path / "utils.py"), "cobertura"
+        )
+        assert processor.parse_coverage_report() == (LineSet(), LineSet([1]), 0)
+
+        processor = CoverageProcessor(
+            str(report_path), str(tmp_path / "missing.py"), "cobertura"
+        )
+        assert processor.parse_coverage_report() == (LineSet(), LineSet(), 0)
+
+    def test_get_cobertura_index_reused_until_report_changes(
+        self, mock_xml_tree, mocker
+    ):
+        """
+        Tests that the report is parsed once, and parsed again only after it was modified.
+        """
+        import os
+        import xml.etree.ElementTree as ET
+
+        iterparse = mocker.patch(
+            "cover_agent.CoverageProcessor.ET.iterparse", side_effect=ET.iterparse
+        )
+        processor = CoverageProcessor(mock_xml_tree, "app.py", "cobertura")
+        other_processor = CoverageProcessor(mock_xml_tree, "other.py", "cobertura")
+
+        assert processor.parse_coverage_report()[0] == LineSet([1])
+        assert other_processor.parse_coverage_report()[1] == LineSet([1])
+        assert iterparse.call_count == 1
+
+        stat = os.stat(mock_xml_tree)
+        os.utime(mock_xml_tree, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        processor.parse_coverage_report()
+        assert iterparse.call_count == 2
+
+    def test_parse_coverage_report_cached_until_report_rewritten(
+        self, mock_xml_tree, mocker
+    ):
+        """
+        Tests that parse results are reused, and that a rewrite keeping the size and modification time is detected.
+        """
+        import os
+
+        processor = CoverageProcessor(mock_xml_tree, "app.py", "cobertura")
+        parse = mocker.spy(processor, "_parse_coverage_report_uncached")
+
+        first_result = processor.parse_coverage_report()
+        assert CoverageProcessor(
+            mock_xml_tree, "app.py", "cobertura"
+        ).parse_coverage_report() == first_result
+        assert processor.parse_coverage_report() is first_result
+        assert parse.call_count == 1
+
+        stat = os.stat(mock_xml_tree)
+        with open(mock_xml_tree, "r") as report:
+            content = report.read()
+        with open(mock_xml_tree, "w") as report:
+            report.write(content.replace('hits="0"', 'hits="7"'))
+        os.utime(mock_xml_tree, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        covered_lines, missed_lines, _ = processor.parse_coverage_report()
+        assert covered_lines == LineSet([1, 2])
+        assert missed_lines == LineSet()
+        assert parse.call_count == 2
+
+    def test_parse_cache_skips_sandbox_reports_and_caps_size(
+        self, mock_xml_tree, tmp_path, mocker
+    ):
+        """
+        Tests that reports of validation sandboxes are not cached, and that old reports are dropped past the size limit.
+        """
+        import os
+        from cover_agent import CoverageProcessor as coverage_processor_module
+
+        sandbox_dir = tmp_path / f"{coverage_processor_module.SANDBOX_DIR_PREFIX}1"
+        sandbox_dir.mkdir()
+        sandbox_report = shutil.copy(mock_xml_tree, sandbox_dir / "coverage.xml")
+        CoverageProcessor(
+            str(sandbox_report), "app.py", "cobertura"
+        ).parse_coverage_report()
+        assert (
+            os.path.abspath(sandbox_report)
+            not in coverage_processor_module._report_parse_cache
+        )
+
+        other_report = shutil.copy(mock_xml_tree, tmp_path / "other.xml")
+        mocker.patch.object(
+            coverage_processor_module,
+            "_REPORT_PARSE_CACHE_MAX_BYTES",
+            os.path.getsize(mock_xml_tree) * 3 // 2,
+        )
+        CoverageProcessor(mock_xml_tree, "app.py", "cobertura").parse_coverage_report()
+        CoverageProcessor(
+            str(other_report), "app.py", "cobertura"
+        ).parse_coverage_report()
+        assert (
+            os.path.abspath(mock_xml_tree)
+            not in coverage_processor_module._report_parse_cache
+        )
+        assert (
+            os.path.abspath(other_report)
+            in coverage_processor_module._report_parse_cache
+        )
+
+    def test_parse_branch_coverage_cobertura(self, tmp_path):
+        report_path = tmp_path / "coverage.xml"
+        report_path.write_text(
+            """<coverage><packages><package><classes>
+                <class filename="app.py"><lines>
+                    <line number="1" hits="1"/>
+                    <line number="2" hits="1" branch="true" condition-coverage="50% (1/2)"/>
+                    <line number="5" hits="0" branch="true" condition-coverage="0% (0/2)"/>
+                </lines></class>
+            </classes></package></packages></coverage>"""
+        )
+        processor = CoverageProcessor(str(report_path), "app.py", "cobertura")
+
+        assert processor.parse_branch_coverage() == {2: (1, 2), 5: (0, 2)}
+        lines_covered, lines_missed, _ = processor.parse_coverage_report()
+        # (2 covered lines + 1 covered branch) / (3 lines + 4 branches)
+        assert CoverageProcessor.combined_coverage_percentage(
+            lines_covered, lines_missed, processor.parse_branch_coverage()
+        ) == 3 / 7
+
+    def test_parse_branch_coverage_lcov(self, tmp_path):
+        report_path = tmp_path / "lcov.info"
+        report_path.write_text(
+            "SF:app.js\nDA:3,1\nDA:4,0\n"
+            "BRDA:3,0,0,2\nBRDA:3,0,1,0\nBRDA:4,0,0,-\nBRDA:4,0,1,-\nend_of_record\n"
+            "SF:app.js\nBRDA:3,0,1,1\nend_of_record\n"
+        )
+        processor = CoverageProcessor(str(report_path), "app.js", "lcov")
+        assert processor.parse_branch_coverage() == {3: (2, 2), 4: (0, 2)}
+
+    def test_parse_branch_coverage_jacoco_xml(self, tmp_path):
+        src_path = tmp_path / "MyClass.java"
+        src_path.write_text("package com.example;\npublic class MyClass {}\n")
+        report_path = tmp_path / "jacoco.xml"
+        report_path.write_text(
+            """<report name="app"><package name="com/example">
+                <sourcefile name="MyClass.java">
+                    <line nr="3" mi="0" ci="2" mb="1" cb="1"/>
+                    <line nr="4" mi="3" ci="0" mb="0" cb="0"/>
+                </sourcefile>
+            </package></report>"""
+        )
+        processor = CoverageProcessor(str(report_path), str(src_path), "jacoco")
+        assert processor.parse_branch_coverage() == {3: (1, 2)}
+
     def test_correct_parsing_for_matching_package_and_class(self, mocker):
         # Setup
         mock_open = mocker.patch(
@@ -85,6 +280,10 @@ class TestCoverageProcessor:
             "cover_agent.CoverageProcessor.CoverageProcessor.extract_package_and_class_java",
             return_value=("com.example", "Example"),
         )
+        mocker.patch(
+            "cover_agent.CoverageProcessor.CoverageProcessor._java_source_info",
+            return_value=("com.example", ["Example"], "Example"),
+        )
         mocker.patch(
             "cover_agent.CoverageProcessor.CoverageProcessor.parse_missed_covered_lines_jacoco",
             return_value=(0, 0),
@@ -92,7 +291,7 @@ class TestCoverageProcessor:
 
         # Initialize the CoverageProcessor object
         coverage_processor = CoverageProcessor(
-            file_path="path/to/coverage.xml",
+            file_path="path/to/coverage.csv",
             src_file_path="path/to/example.java",
             coverage_type="jacoco",
         )
@@ -103,8 +302,8 @@ class TestCoverageProcessor:
         )
 
         # Assert the results
-        assert lines_covered == [], "Expected lines_covered to be an empty list"
-        assert lines_missed == [], "Expected lines_missed to be an empty list"
+        assert lines_covered == LineSet(), "Expected lines_covered to be empty"
+        assert lines_missed == LineSet(), "Expected lines_missed to be empty"
         assert coverage_percentage == 0, "Expected coverage percentage to be 0"
 
     def test_parse_coverage_report_unsupported_type(self):
@@ -114,13 +313,165 @@ class TestCoverageProcessor:
         ):
             processor.parse_coverage_report()
 
-    def test_parse_coverage_report_not_implemented(self):
-        processor = CoverageProcessor("fake_path", "app.py", "lcov")
-        with pytest.raises(
-            NotImplementedError,
-            match="Parsing for lcov coverage reports is not implemented yet.",
-        ):
-            processor.parse_coverage_report()
+    def test_parse_coverage_report_lcov(self, tmp_path):
+        """
+        Tests that only the most specific sections of the source file are read, and that their line hits are aggregated.
+        """
+        report_path = tmp_path / "lcov.info"
+        src_path = tmp_path / "src" / "app.js"
+        report_path.write_text(
+            "TN:\n"
+            "SF:src/myapp.js\nDA:1,5\nend_of_record\n"
+            f"SF:{src_path}\nDA:1,1\nDA:2,0\nDA:3,0\nLF:3\nLH:1\nend_of_record\n"
+            "SF:src/app.js\nDA:4,0\nend_of_record\n"
+            f"SF:{src_path}\nDA:3,2\nend_of_record\n"
+        )
+        processor = CoverageProcessor(str(report_path), str(src_path), "lcov")
+        covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report()
+
+        assert covered_lines == LineSet([1, 3])
+        assert missed_lines == LineSet([2])
+        assert coverage_pct == 2 / 3
+
+    def test_parse_coverage_report_lcov_from_sandbox(self, tmp_path):
+        """
+        Tests that absolute paths written in a validation sandbox, a copy of the project, match the real source file.
+        """
+        report_path = tmp_path / "cover_agent_sandbox_abc" / "lcov.info"
+        report_path.parent.mkdir()
+        src_path = tmp_path / "project" / "src" / "app.js"
+        report_path.write_text(
+            f"SF:{report_path.parent / 'src' / 'app.js'}\nDA:1,1\nDA:2,0\nend_of_record\n"
+        )
+        processor = CoverageProcessor(
+            str(report_path),
+            str(src_path),
+            "lcov",
+            run_dir=str(report_path.parent),
+            project_dir=str(tmp_path / "project"),
+        )
+        covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report()
+
+        assert covered_lines == LineSet([1])
+        assert missed_lines == LineSet([2])
+        assert coverage_pct == 0.5
+
+    def test_parse_coverage_report_lcov_file_not_in_report(self, tmp_path):
+        report_path = tmp_path / "lcov.info"
+        report_path.write_text("SF:other.js\nDA:1,1\nend_of_record\n")
+        processor = CoverageProcessor(str(report_path), "app.js", "lcov")
+        assert processor.parse_coverage_report() == (LineSet(), LineSet(), 0)
+
+    def test_parse_coverage_report_coveragepy(self, tmp_path):
+        coverage = pytest.importorskip("coverage")
+        src_path = tmp_path / "app.py"
+        src_path.write_text(
+            "def f(x):\n    if x:\n        return 1\n    return 2\n\n\nf(1)\n"
+        )
+        data = coverage.CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_lines(
+            {str(src_path): [1, 2, 3, 7], str(tmp_path / "other.py"): [1]}
+        )
+        data.write()
+
+        processor = CoverageProcessor(
+            str(tmp_path / ".coverage"), str(src_path), "coveragepy"
+        )
+        covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report()
+
+        assert covered_lines == LineSet([1, 2, 3, 7])
+        assert missed_lines == LineSet([4])
+        assert coverage_pct == 0.8
+
+    def test_parse_branch_coverage_coveragepy(self, tmp_path):
+        coverage = pytest.importorskip("coverage")
+        src_path = tmp_path / "app.py"
+        src_path.write_text(
+            "def f(x):\n    if x:\n        return 1\n    return 2\n\n\nf(1)\n"
+        )
+        data = coverage.CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_arcs(
+            {str(src_path): [(-1, 1), (1, 7), (7, -1), (-1, 2), (2, 3), (3, -1)]}
+        )
+        data.write()
+
+        processor = CoverageProcessor(
+            str(tmp_path / ".coverage"), str(src_path), "coveragepy"
+        )
+
+        # Line 2 branches to lines 3 and 4, and only the branch to line 3 was taken
+        assert processor.parse_branch_coverage() == {2: (1, 2)}
+
+    def test_parse_branch_coverage_coveragepy_without_arcs(self, tmp_path):
+        coverage = pytest.importorskip("coverage")
+        src_path = tmp_path / "app.py"
+        src_path.write_text("def f(x):\n    if x:\n        return 1\n    return 2\n")
+        data = coverage.CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_lines({str(src_path): [1, 2, 3]})
+        data.write()
+
+        processor = CoverageProcessor(
+            str(tmp_path / ".coverage"), str(src_path), "coveragepy"
+        )
+        assert processor.parse_branch_coverage() == {}
+
+    def test_parse_coverage_report_coveragepy_uses_project_config(self, tmp_path):
+        """
+        Tests that the statements are counted with the coverage.py configuration of the directory the tests ran in.
+        """
+        coverage = pytest.importorskip("coverage")
+        src_path = tmp_path / "app.py"
+        src_path.write_text(
+            "def f(x):\n    if x:\n        return 1\n    return 2  # untested\n\n\nf(1)\n"
+        )
+        (tmp_path / "pyproject.toml").write_text(
+            '[tool.coverage.report]\nexclude_lines = ["untested"]\n'
+        )
+        data = coverage.CoverageData(basename=str(tmp_path / ".coverage"))
+        data.add_lines({str(src_path): [1, 2, 3, 7]})
+        data.write()
+
+        processor = CoverageProcessor(
+            str(tmp_path / ".coverage"),
+            str(src_path),
+            "coveragepy",
+            run_dir=str(tmp_path),
+        )
+        covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report()
+
+        assert covered_lines == LineSet([1, 2, 3, 7])
+        assert missed_lines == LineSet()
+        assert coverage_pct == 1.0
+
+    def test_parse_coverage_report_coveragepy_from_sandbox(self, tmp_path):
+        """
+        Tests that data collected in a validation sandbox, a copy of the project, is matched to the real source file.
+        """
+        coverage = pytest.importorskip("coverage")
+        project_dir = tmp_path / "project"
+        sandbox_dir = tmp_path / "cover_agent_sandbox_abc"
+        project_dir.mkdir()
+        src_path = project_dir / "app.py"
+        src_path.write_text(
+            "def f(x):\n    if x:\n        return 1\n    return 2\n\n\nf(1)\n"
+        )
+        shutil.copytree(project_dir, sandbox_dir)
+        data = coverage.CoverageData(basename=str(sandbox_dir / ".coverage"))
+        data.add_lines({str(sandbox_dir / "app.py"): [1, 2, 3, 7]})
+        data.write()
+
+        processor = CoverageProcessor(
+            str(sandbox_dir / ".coverage"),
+            str(src_path),
+            "coveragepy",
+            run_dir=str(sandbox_dir),
+            project_dir=str(project_dir),
+        )
+        covered_lines, missed_lines, coverage_pct = processor.parse_coverage_report()
+
+        assert covered_lines == LineSet([1, 2, 3, 7])
+        assert missed_lines == LineSet([4])
+        assert coverage_pct == 0.8
 
     def test_extract_package_and_class_java_file_error(self, mocker):
         mocker.patch("builtins.open", side_effect=FileNotFoundError("File not found"))
@@ -144,6 +495,83 @@ class TestCoverageProcessor:
         ), "Expected package name to be 'com.example'"
         assert class_name == "MyClass", "Expected class name to be 'MyClass'"
 
+    def test_extract_package_and_class_java_non_public_and_nested(self, tmp_path):
+        src_path = tmp_path / "Helpers.java"
+        src_path.write_text(
+            """package com.example.util;
+
+/* public class Commented { */
+final class Helper {
+    static class Nested {
+        String brace = "}";
+    }
+}
+
+public abstract class Helpers {
+    private interface Inner {}
+}
+
+enum Mode { ON, OFF }
+"""
+        )
+        processor = CoverageProcessor("fake_path", str(src_path), "jacoco")
+        assert processor.extract_package_and_class_java() == (
+            "com.example.util",
+            "Helpers",
+        )
+        assert processor._java_source_info()[1] == ["Helper", "Helpers", "Mode"]
+
+    def test_parse_coverage_report_jacoco_csv_sums_classes(self, tmp_path):
+        src_path = tmp_path / "Helpers.java"
+        src_path.write_text(
+            "package com.example;\nclass Helper {}\npublic class Helpers {}\n"
+        )
+        report_path = tmp_path / "jacoco.csv"
+        report_path.write_text(
+            "GROUP,PACKAGE,CLASS,LINE_MISSED,LINE_COVERED\n"
+            "app,com.example,Helper,1,1\n"
+            "app,com.example,Helpers,2,4\n"
+            "app,com.example,Helpers.Inner,1,1\n"
+            "app,com.example,HelpersTest,9,9\n"
+            "app,com.other,Helpers,9,9\n"
+        )
+        processor = CoverageProcessor(str(report_path), str(src_path), "jacoco")
+        assert processor.parse_coverage_report() == (LineSet(), LineSet(), 0.6)
+
+    def test_parse_coverage_report_jacoco_xml(self, tmp_path):
+        src_path = tmp_path / "MyClass.java"
+        src_path.write_text("package com.example;\npublic class MyClass {}\n")
+        report_path = tmp_path / "jacoco.xml"
+        report_path.write_text(
+            """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<!DOCTYPE report PUBLIC "-//JACOCO//DTD Report 1.1//EN" "report.dtd">
+<report name="app">
+    <package name="com/other">
+        <sourcefile name="MyClass.java">
+            <line nr="1" mi="0" ci="3" mb="0" cb="0"/>
+        </sourcefile>
+    </package>
+    <package name="com/example">
+        <class name="com/example/MyClass" sourcefilename="MyClass.java">
+            <counter type="LINE" missed="2" covered="1"/>
+        </class>
+        <sourcefile name="MyClass.java">
+            <line nr="3" mi="0" ci="2" mb="0" cb="0"/>
+            <line nr="4" mi="3" ci="0" mb="0" cb="0"/>
+            <line nr="6" mi="1" ci="1" mb="0" cb="0"/>
+            <line nr="7" mi="2" ci="0" mb="0" cb="0"/>
+            <counter type="LINE" missed="2" covered="2"/>
+        </sourcefile>
+    </package>
+</report>"""
+        )
+        processor = CoverageProcessor(str(report_path), str(src_path), "jacoco")
+        assert processor.parse_coverage_report() == (
+            LineSet([3, 6]),
+            LineSet([4, 7]),
+            0.5,
+        )
+
     def test_verify_report_update_file_not_updated(self, mocker):
         mocker.patch("os.path.exists", return_value=True)
         mocker.patch("os.path.getmtime", return_value=1234567.0)
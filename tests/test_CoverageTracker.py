@@ -0,0 +1,52 @@
+from cover_agent.CoverageTracker import CoverageTracker, parse_line_numbers
+from cover_agent.LineSet import LineSet
+
+
+class TestCoverageTracker:
+    def test_compare_reports_newly_covered_and_missed_lines(self):
+        tracker = CoverageTracker()
+        tracker.update(LineSet([1, 2, 3]), LineSet([4, 5, 6]), 0.5)
+
+        # Covers two new lines, but loses one that was covered before
+        delta = tracker.compare(
+            LineSet([1, 2, 4, 5]), LineSet([3, 6]), 4 / 6, lines_to_cover="5-6"
+        )
+
+        assert delta["newly_covered"] == LineSet([4, 5])
+        assert delta["newly_missed"] == LineSet([3])
+        assert delta["lines_to_cover_covered"] == LineSet([5])
+        assert delta["lines_to_cover_missed"] == LineSet([6])
+        assert delta["increased"]
+
+    def test_compare_without_new_lines(self):
+        tracker = CoverageTracker()
+        tracker.update(LineSet([1, 2]), LineSet([3]), 2 / 3)
+
+        delta = tracker.compare(LineSet([1, 2]), LineSet([3]), 2 / 3)
+
+        assert not delta["newly_covered"]
+        assert not delta["increased"]
+
+    def test_compare_counts_new_branches_on_covered_lines(self):
+        tracker = CoverageTracker()
+        tracker.update(LineSet([1, 2]), LineSet(), 1.0, branches={2: (1, 2)})
+
+        delta = tracker.compare(LineSet([1, 2]), LineSet(), 1.0, branches={2: (2, 2)})
+
+        assert not delta["newly_covered"]
+        assert delta["newly_covered_branches"] == 1
+        assert delta["increased"]
+
+    def test_compare_without_line_data_uses_percentage(self):
+        tracker = CoverageTracker()
+        tracker.update(LineSet(), LineSet(), 0.5)
+
+        assert tracker.compare(LineSet(), LineSet(), 0.6)["increased"]
+        assert not tracker.compare(LineSet(), LineSet(), 0.5)["increased"]
+
+    def test_parse_line_numbers(self):
+        assert parse_line_numbers(None) == LineSet()
+        assert parse_line_numbers([12, 13]) == LineSet([12, 13])
+        assert parse_line_numbers("[12, 13]") == LineSet([12, 13])
+        assert parse_line_numbers("lines 12-14 and 20") == LineSet([12, 13, 14, 20])
+        assert parse_line_numbers(7) == LineSet([7])
@@ -0,0 +1,44 @@
+import pytest
+from cover_agent.LineSet import LineSet
+
+
+class TestLineSet:
+    def test_iterates_in_ascending_order(self):
+        line_set = LineSet([57, 12, 13, 12, 0])
+        assert list(line_set) == [0, 12, 13, 57]
+        assert len(line_set) == 4
+        assert 13 in line_set
+        assert 14 not in line_set
+        assert -1 not in line_set
+
+    def test_empty(self):
+        assert not LineSet()
+        assert len(LineSet()) == 0
+        assert list(LineSet()) == []
+        assert str(LineSet()) == ""
+
+    def test_negative_line_number(self):
+        with pytest.raises(ValueError):
+            LineSet([-1])
+
+    def test_set_operations(self):
+        a = LineSet([1, 2, 3, 10])
+        b = LineSet([3, 4, 10])
+        assert a | b == LineSet([1, 2, 3, 4, 10])
+        assert a & b == LineSet([3, 10])
+        assert a - b == LineSet([1, 2])
+        # Any iterable of line numbers can be combined with a line set
+        assert a - [1, 10] == LineSet([2, 3])
+
+    def test_ranges(self):
+        line_set = LineSet(list(range(12, 41)) + [57] + list(range(90, 113)))
+        assert line_set.ranges() == [(12, 40), (57, 57), (90, 112)]
+        assert str(line_set) == "12-40, 57, 90-112"
+        assert repr(line_set) == "LineSet('12-40, 57, 90-112')"
+        assert LineSet.from_ranges(line_set.ranges()) == line_set
+
+    def test_equality_and_hash(self):
+        assert LineSet([1, 2]) == LineSet([2, 1])
+        assert LineSet([1, 2]) != LineSet([1])
+        assert LineSet([1, 2]) != [1, 2]
+        assert len({LineSet([1, 2]), LineSet([2, 1])}) == 1
@@ -1,6 +1,6 @@
 import pytest
 from unittest.mock import patch, mock_open
-from cover_agent.PromptBuilder import PromptBuilder
+from cover_agent.PromptBuilder import PromptBuilder, compile_template, count_tokens
 
 
 class TestPromptBuilder:
@@ -144,7 +144,7 @@ class TestPromptBuilder:
             raise Exception("Rendering error")
 
         monkeypatch.setattr(
-            "jinja2.Environment.from_string",
+            "cover_agent.PromptBuilder.compile_template",
             lambda *args, **kwargs: type("", (), {"render": mock_render})(),
         )
 
@@ -161,7 +161,7 @@ class TestPromptBuilder:
             raise Exception("Rendering error")
 
         monkeypatch.setattr(
-            "jinja2.Environment.from_string",
+            "cover_agent.PromptBuilder.compile_template",
             lambda *args, **kwargs: type("", (), {"render": mock_render})(),
         )
 
@@ -172,3 +172,116 @@ class TestPromptBuilder:
         )
         result = builder.build_prompt()
         assert result == {"system": "", "user": ""}
+
+    def test_source_file_numbered_sliced(self, monkeypatch):
+        monkeypatch.setattr(
+            "builtins.open",
+            mock_open(
+                read_data="import os\n\ndef a():\n    return 1\n\ndef b():\n    return 2\n"
+            ),
+        )
+        builder = PromptBuilder(
+            source_file_path="source.py",
+            test_file_path="test_source.py",
+            code_coverage_report="coverage_report",
+            lines_missed=[7],
+        )
+        assert builder.source_file_numbered_sliced == "...\n6 def b():\n7     return 2"
+
+        # Without missed lines, the full numbered source file is used
+        builder = PromptBuilder(
+            source_file_path="source.py",
+            test_file_path="test_source.py",
+            code_coverage_report="coverage_report",
+        )
+        assert builder.source_file_numbered_sliced == builder.source_file_numbered
+
+    def test_build_prompt_fits_token_budget(self, monkeypatch):
+        monkeypatch.undo()
+        builder = PromptBuilder(
+            source_file_path="source_path",
+            test_file_path="test_path",
+            code_coverage_report="coverage_report",
+            included_files="include line\n" * 2000,
+        )
+        builder.source_file_numbered = "1 def add(a, b):\n2     return a + b"
+        builder.test_file = "def test_add():\n    assert add(1, 2) == 3\n" * 200
+        builder.code_coverage_report = "Lines missed: 2"
+
+        unbudgeted_prompt = builder.build_prompt()
+        builder.max_prompt_tokens = (
+            count_tokens(unbudgeted_prompt["system"])
+            + count_tokens(unbudgeted_prompt["user"])
+            - 5000
+        )
+        result = builder.build_prompt()
+
+        # The higher priority sections are kept, and the lowest priority section is trimmed
+        assert "Lines missed: 2" in result["user"]
+        assert "2     return a + b" in result["user"]
+        assert builder.test_file in result["user"]
+        assert "lines omitted to fit the prompt token budget" in result["user"]
+        assert (
+            count_tokens(result["system"]) + count_tokens(result["user"])
+            <= builder.max_prompt_tokens
+        )
+        assert list(builder.section_token_counts) == [
+            "code_coverage_report",
+            "source_file_numbered",
+            "failed_tests_section",
+            "test_file",
+            "additional_includes_section",
+        ]
+
+    def test_count_tokens_falls_back_to_estimate(self):
+        assert count_tokens("") == 0
+        assert count_tokens("a" * 40) == 10
+
+    def test_condensed_test_file(self, monkeypatch):
+        monkeypatch.setattr(
+            "builtins.open",
+            mock_open(
+                read_data="def test_a():\n    assert a() == 1\n\ndef test_b():\n    assert b() == 2\n"
+            ),
+        )
+        builder = PromptBuilder(
+            source_file_path="source.txt",
+            test_file_path="test_source.py",
+            code_coverage_report="coverage_report",
+            condensed_test_file_top_k=1,
+        )
+        # Only one test is shown in full, the other one as its signature
+        assert builder.test_file_numbered.split("\n") == [
+            "1 def test_a():",
+            "2     assert a() == 1",
+            "3 ",
+            "4 def test_b():",
+            "...",
+        ]
+
+    def test_update_refreshes_changing_sections(self, tmp_path, monkeypatch):
+        monkeypatch.undo()
+        source_path = tmp_path / "app.py"
+        source_path.write_text("def add(a, b):\n    return a + b\n")
+        test_path = tmp_path / "test_app.py"
+        test_path.write_text("def test_one():\n    assert True\n")
+        builder = PromptBuilder(
+            source_file_path=str(source_path),
+            test_file_path=str(test_path),
+            code_coverage_report="Lines missed: 2",
+        )
+        source_file_numbered = builder.source_file_numbered
+
+        test_path.write_text("def test_two():\n    assert True\n")
+        builder.update(code_coverage_report="Lines missed: none")
+        result = builder.build_prompt()
+
+        assert "def test_two():" in result["user"]
+        assert "Lines missed: none" in result["user"]
+        # The source file, which does not change, is kept
+        assert builder.source_file_numbered is source_file_numbered
+
+    def test_templates_are_compiled_once(self):
+        template = "Hello {{ name }}"
+        assert compile_template(template) is compile_template(template)
+        assert compile_template(template).render(name="world") == "Hello world"
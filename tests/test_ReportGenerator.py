@@ -16,6 +16,7 @@ class TestReportGeneration:
                 "stderr": "",
                 "stdout": "test session starts platform linux -- Python 3.10.12, pytest-7.0.1",
                 "test": "def test_current_date():\n    response = client.get('/current-date')\n    assert response.status_code == 200\n    assert 'date' in response.json()",
+                "newly_covered_lines": "12-14, 20",
             },
             # Add more sample results as needed
         ]
@@ -41,5 +42,6 @@ class TestReportGeneration:
         assert expected_output[1] in content
         assert expected_output[2] in content
         assert expected_output[3] in content
+        assert "<td>12-14, 20</td>" in content
 
         # You might want to add more detailed checks to ensure the content is exactly as expected
@@ -0,0 +1,54 @@
+import os
+import time
+
+import pytest
+from cover_agent.ResponseCache import ResponseCache
+
+
+class TestResponseCache:
+    def test_make_key_is_deterministic(self):
+        messages = [{"role": "user", "content": "Hello, world!"}]
+        key1 = ResponseCache.make_key("gpt-4o", messages, 4096, 0.2)
+        key2 = ResponseCache.make_key("gpt-4o", messages, 4096, 0.2)
+        key3 = ResponseCache.make_key("gpt-4o", messages, 1024, 0.2)
+        assert key1 == key2
+        assert key1 != key3
+
+    def test_put_and_get(self, tmp_path):
+        cache = ResponseCache(str(tmp_path))
+        cache.put("key", "response", 2, 10)
+        assert cache.get("key") == ("response", 2, 10)
+        assert cache.get("missing") is None
+
+    def test_read_only_mode_does_not_store(self, tmp_path):
+        ResponseCache(str(tmp_path)).put("existing", "response", 2, 10)
+        cache = ResponseCache(str(tmp_path), mode="read-only")
+        cache.put("key", "response", 2, 10)
+        assert cache.get("key") is None
+        assert cache.get("existing") == ("response", 2, 10)
+
+    def test_bypass_mode(self, tmp_path):
+        ResponseCache(str(tmp_path)).put("key", "response", 2, 10)
+        cache = ResponseCache(str(tmp_path), mode="bypass")
+        assert cache.get("key") is None
+
+    def test_unsupported_mode(self, tmp_path):
+        with pytest.raises(ValueError, match="Unsupported cache mode: write-only"):
+            ResponseCache(str(tmp_path), mode="write-only")
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = ResponseCache(str(tmp_path))
+        cache.put("first", "a" * 100, 1, 1)
+        cache.put("second", "b" * 100, 1, 1)
+        # Make 'first' the most recently used entry
+        past = time.time() - 10
+        os.utime(tmp_path / "second.json", (past, past))
+        os.utime(tmp_path / "first.json", (past, past))
+        assert cache.get("first") is not None
+
+        cache.max_size_bytes = 2 * os.path.getsize(tmp_path / "first.json")
+        cache.put("third", "c" * 100, 1, 1)
+
+        assert cache.get("second") is None
+        assert cache.get("first") is not None
+        assert cache.get("third") is not None
@@ -1,3 +1,8 @@
+import os
+import re
+import signal
+import time
+
 import pytest
 from unittest.mock import patch
 from cover_agent.Runner import Runner  # Adjust the import path as necessary
@@ -31,3 +36,79 @@ class TestRunner:
             or "command_that_does_not_exist: command not found" in stderr
         )
         assert exit_code != 0
+
+    def test_run_command_timeout_kills_process_group(self, tmp_path):
+        """Test that a command exceeding its timeout is killed, along with the processes it started."""
+        marker = tmp_path / "marker"
+        command = f"(sleep 2 && touch {marker}) & sleep 30"
+        start = time.time()
+        stdout, stderr, exit_code, _ = Runner.run_command(command, timeout=0.5)
+        assert time.time() - start < 10
+        assert exit_code != 0
+        assert "timed out after 0.5 seconds" in stderr
+        time.sleep(2.5)
+        assert not marker.exists(), "The background process should have been killed"
+
+    def test_run_command_bounded_output(self):
+        """Test that a long output keeps its beginning and end in memory, and the full output in a file."""
+        command = "python -c \"print('start'); print('x' * 100000); print('end')\""
+        stdout, _, exit_code, _ = Runner.run_command(command, max_output_bytes=1000)
+        assert exit_code == 0
+        assert stdout.startswith("start\n")
+        assert stdout.endswith("end\n")
+        assert len(stdout) < 2000
+        spill_path = re.search(r"full output in (\S+)\]", stdout).group(1)
+        with open(spill_path) as f:
+            assert f.read() == "start\n" + "x" * 100000 + "\nend\n"
+        os.remove(spill_path)
+
+    def test_run_command_keeps_recent_spill_files(self):
+        """Test that only the most recent files holding full outputs are kept."""
+        command = "python -c \"print('x' * 2000)\""
+        with patch("cover_agent.Runner.MAX_SPILL_FILES", 2):
+            spill_paths = [
+                re.search(
+                    r"full output in (\S+)\]",
+                    Runner.run_command(command, max_output_bytes=100)[0],
+                ).group(1)
+                for _ in range(3)
+            ]
+        assert not os.path.exists(spill_paths[0])
+        assert os.path.exists(spill_paths[1])
+        assert os.path.exists(spill_paths[2])
+
+    def test_run_command_reads_pipes_in_threads(self):
+        """Test the pipe reading used where the event loop cannot read the pipes, e.g. on Windows."""
+        with patch("cover_agent.Runner._READ_PIPES_IN_THREADS", True):
+            stdout, stderr, exit_code, _ = Runner.run_command(
+                "echo out && echo err >&2 && exit 2"
+            )
+            assert stdout == "out\n"
+            assert stderr.strip() == "err"
+            assert exit_code == 2
+
+            start = time.time()
+            result = Runner.run_command("sleep 30", timeout=0.5)
+            assert time.time() - start < 10
+            assert result.timed_out
+
+    def test_run_command_resource_usage(self):
+        """Test that the result of a command records the resources it used."""
+        result = Runner.run_command(
+            "python -c \"sum(i * i for i in range(2000000))\"", timeout=30
+        )
+        stdout, stderr, exit_code, command_start_time = result
+        assert exit_code == result.exit_code == 0
+        assert result.wall_time > 0
+        assert result.signal is None
+        assert not result.timed_out
+        if os.name == "posix":
+            assert result.user_time > 0
+            assert result.max_rss_kb > 0
+
+    def test_run_command_records_signal_on_timeout(self):
+        """Test that a command killed on timeout reports the signal that terminated it."""
+        result = Runner.run_command("sleep 30", timeout=0.2)
+        assert result.timed_out
+        if os.name == "posix":
+            assert result.signal == signal.SIGKILL
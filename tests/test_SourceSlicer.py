@@ -0,0 +1,60 @@
+from cover_agent.SourceSlicer import SourceSlicer
+
+SOURCE = """import os
+import re
+from typing import List
+
+LIMIT = 10
+PATTERN = re.compile("a+")
+
+
+def helper(value):
+    return value * 2
+
+
+def covered():
+    return os.getcwd()
+
+
+class Calculator:
+    factor = LIMIT
+
+    def add(self, a, b):
+        return a + b
+
+    def scale(self, values: List[int]):
+        if len(values) > LIMIT:
+            return helper(values[0])
+        return [PATTERN.match(str(v)) for v in values]
+"""
+
+
+class TestSourceSlicer:
+    def test_slice_keeps_enclosing_code_and_references(self):
+        sliced = SourceSlicer("calculator.py", SOURCE).slice([24, 25])
+        lines = sliced.split("\n")
+
+        # The method with missed lines, its class header and the signatures of the other methods
+        assert "17 class Calculator:" in lines
+        assert "18     factor = LIMIT" in lines
+        assert "20     def add(self, a, b):" in lines
+        assert "21         return a + b" not in lines
+        assert "26         return [PATTERN.match(str(v)) for v in values]" in lines
+        # The module-level names it references, transitively, and functions as signatures only
+        assert "2 import re" in lines
+        assert "3 from typing import List" in lines
+        assert "5 LIMIT = 10" in lines
+        assert '6 PATTERN = re.compile("a+")' in lines
+        assert "9 def helper(value):" in lines
+        assert "10     return value * 2" not in lines
+        # Unrelated code is omitted
+        assert "1 import os" not in lines
+        assert "13 def covered():" not in lines
+        assert "..." in lines
+
+    def test_slice_returns_none_without_missed_lines(self):
+        assert SourceSlicer("calculator.py", SOURCE).slice([]) is None
+
+    def test_slice_returns_none_for_unsupported_or_invalid_files(self):
+        assert SourceSlicer("Calculator.java", SOURCE).slice([24]) is None
+        assert SourceSlicer("broken.py", "def broken(:\n").slice([1]) is None
@@ -0,0 +1,104 @@
+import tempfile
+import textwrap
+from cover_agent.StaticTestSuiteAnalyzer import StaticTestSuiteAnalyzer
+
+
+def write_temp_file(content, suffix=".py"):
+    tmp = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=suffix)
+    tmp.write(textwrap.dedent(content))
+    tmp.close()
+    return tmp.name
+
+
+class TestStaticTestSuiteAnalyzer:
+    # Test for a pytest file with top-level test functions
+    def test_top_level_test_functions(self):
+        path = write_temp_file(
+            """\
+            import pytest
+            from app import add
+
+            def helper():
+                return 1
+
+            def test_add():
+                assert add(1, 2) == 3
+
+            def test_add_negative():
+                assert add(-1, -2) == -3
+
+            if __name__ == "__main__":
+                pytest.main()
+            """
+        )
+        analysis = StaticTestSuiteAnalyzer(path).analyze()
+        assert analysis == {
+            "test_headers_indentation": 0,
+            "relevant_line_number_to_insert_tests_after": 11,
+            "relevant_line_number_to_insert_imports_after": 2,
+        }
+
+    # Test for a unittest style file, where the tests are methods of a test class
+    def test_test_class(self):
+        path = write_temp_file(
+            """\
+            import unittest
+
+
+            class TestApp(unittest.TestCase):
+                def setUp(self):
+                    self.value = 1
+
+                def test_value(self):
+                    self.assertEqual(self.value, 1)
+
+                def test_other_value(self):
+                    self.assertNotEqual(self.value, 2)
+            """
+        )
+        analysis = StaticTestSuiteAnalyzer(path).analyze()
+        assert analysis == {
+            "test_headers_indentation": 4,
+            "relevant_line_number_to_insert_tests_after": 12,
+            "relevant_line_number_to_insert_imports_after": 1,
+        }
+
+    # Test for a Python file without top-level imports, where new imports go after the module docstring
+    def test_no_top_level_imports(self):
+        path = write_temp_file(
+            """\
+            \"\"\"Tests of the app.\"\"\"
+
+
+            def test_add():
+                from app import add
+
+                assert add(1, 2) == 3
+            """
+        )
+        analysis = StaticTestSuiteAnalyzer(path).analyze()
+        assert analysis["relevant_line_number_to_insert_imports_after"] == 1
+
+        path = write_temp_file(
+            """\
+            def test_true():
+                assert True
+            """
+        )
+        analysis = StaticTestSuiteAnalyzer(path).analyze()
+        assert analysis["relevant_line_number_to_insert_imports_after"] == 0
+
+    # Test for a Python file that cannot be parsed
+    def test_syntax_error(self):
+        path = write_temp_file("def test_broken(:\n    pass\n")
+        assert StaticTestSuiteAnalyzer(path).analyze() is None
+
+    # Test for a Python file without tests
+    def test_no_tests(self):
+        path = write_temp_file("import os\n\ndef helper():\n    pass\n")
+        assert StaticTestSuiteAnalyzer(path).analyze() is None
+
+    # Test for a file in a language that is not analyzed statically
+    def test_unsupported_language(self):
+        path = write_temp_file("describe('app', () => {});\n", suffix=".js")
+        assert StaticTestSuiteAnalyzer(path).analyze() is None
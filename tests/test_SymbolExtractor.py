@@ -0,0 +1,89 @@
+from cover_agent import SymbolExtractor as symbol_extractor_module
+from cover_agent.SymbolExtractor import SymbolExtractor
+
+HELPERS = '''import os
+
+TIMEOUT = 30
+
+
+def small(a):
+    """Add one."""
+    return a + 1
+
+
+def unused():
+    return 0
+
+
+class Big:
+    """A big class."""
+
+    limit = 3
+
+    def method(self, x):
+        """Do something."""
+        y = x
+        y += 1
+        y += 1
+        y += 1
+        y += 1
+        y += 1
+        y += 1
+        y += 1
+        return y
+'''
+
+
+class TestSymbolExtractor:
+    def test_extract_used_definitions(self, tmp_path):
+        (tmp_path / "pkg").mkdir()
+        helpers_path = tmp_path / "pkg" / "helpers.py"
+        helpers_path.write_text(HELPERS)
+        source_path = tmp_path / "app.py"
+        source_path.write_text(
+            "from pkg.helpers import small, Big\n"
+            "import pkg.helpers as h\n"
+            "\n"
+            "def f():\n"
+            "    return small(h.TIMEOUT) + Big().method(1)\n"
+        )
+
+        extracted = SymbolExtractor(str(source_path)).extract(
+            str(helpers_path), HELPERS
+        )
+
+        # Small definitions are included in full
+        assert "TIMEOUT = 30" in extracted
+        assert 'def small(a):\n    """Add one."""\n    return a + 1' in extracted
+        # Large definitions are included as signatures and docstrings
+        assert '    def method(self, x):\n        """Do something."""\n...' in extracted
+        assert "        return y" not in extracted
+        # Unused definitions are left out
+        assert "def unused" not in extracted
+        assert "import os" not in extracted
+
+    def test_extract_caches_parsed_definitions(self, tmp_path, monkeypatch):
+        source_path = tmp_path / "app.py"
+        source_path.write_text("from helpers import small\n")
+        calls = []
+        parse_definitions = symbol_extractor_module._parse_definitions
+
+        def spy(content):
+            calls.append(content)
+            return parse_definitions(content)
+
+        monkeypatch.setattr(symbol_extractor_module, "_parse_definitions", spy)
+        content = HELPERS + "\n# cache test\n"
+        extractor = SymbolExtractor(str(source_path))
+        first = extractor.extract(str(tmp_path / "helpers.py"), content)
+        second = extractor.extract(str(tmp_path / "helpers.py"), content)
+
+        assert first == second
+        assert len(calls) == 1
+
+    def test_extract_returns_none_when_not_resolved(self, tmp_path):
+        source_path = tmp_path / "app.py"
+        source_path.write_text("import json\n")
+        extractor = SymbolExtractor(str(source_path))
+        assert extractor.extract(str(tmp_path / "helpers.py"), HELPERS) is None
+        assert extractor.extract(str(tmp_path / "helpers.c"), "int x;") is None
@@ -4,6 +4,8 @@ from cover_agent.UnitTestGenerator import (
     extract_error_message_python,
 )
 from cover_agent.ReportGenerator import ReportGenerator
+from cover_agent.Runner import Runner
+from cover_agent.LineSet import LineSet
 import os
 
 from unittest.mock import patch, mock_open
@@ -124,6 +126,509 @@ class TestUnitTestGenerator:
         with open(TEST_FILE, "w") as f:
             f.write(original_file_contents)
 
+    def test_validate_tests_parallel(self):
+        GPT35_TURBO = "gpt-3.5-turbo-0125"
+        CANNED_TESTS = {
+            "language": "python",
+            "new_tests": [
+                {
+                    "test_code": 'def test_current_date():\n    response = client.get("/current-date")\n    assert response.status_code == 200\n    assert "date" in response.json()',
+                    "new_imports_code": "",
+                },
+                {
+                    "test_code": "def test_always_fails():\n    assert False",
+                    "new_imports_code": "",
+                },
+            ],
+        }
+
+        REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        TEST_FILE = f"{REPO_ROOT}/templated_tests/python_fastapi/test_app.py"
+
+        # Read in file contents of sample test file so we can roll it back later
+        with open(TEST_FILE, "r") as f:
+            original_file_contents = f.read()
+
+        try:
+            test_gen = UnitTestGenerator(
+                source_file_path=f"{REPO_ROOT}/templated_tests/python_fastapi/app.py",
+                test_file_path=TEST_FILE,
+                code_coverage_report_path=f"{REPO_ROOT}/templated_tests/python_fastapi/coverage.xml",
+                llm_model=GPT35_TURBO,
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=f"{REPO_ROOT}/templated_tests/python_fastapi",
+                included_files=None,
+            )
+            test_gen.relevant_line_number_to_insert_tests_after = len(
+                original_file_contents.split("\n")
+            )
+            test_gen.relevant_line_number_to_insert_imports_after = 4
+            test_gen.test_headers_indentation = 0
+
+            results_list = test_gen.validate_tests_parallel(CANNED_TESTS, max_workers=2)
+
+            assert len(results_list) == 2
+            assert results_list[1]["status"] == "FAIL"
+            assert results_list[1]["reason"] == "Test failed"
+            assert test_gen.failed_test_runs[-1]["code"] == CANNED_TESTS["new_tests"][1]
+            with open(TEST_FILE, "r") as f:
+                assert "test_always_fails" not in f.read()
+        finally:
+            # Write back sample test file contents
+            with open(TEST_FILE, "w") as f:
+                f.write(original_file_contents)
+
+    def test_validate_tests_parallel_drops_redundant_candidates(self):
+        CANNED_TESTS = {
+            "language": "python",
+            "new_tests": [
+                {
+                    "test_code": 'def test_echo():\n    response = client.get("/echo/hello")\n    assert response.json() == {"message": "hello"}',
+                },
+                {
+                    "test_code": 'def test_echo_again():\n    response = client.get("/echo/world")\n    assert response.status_code == 200',
+                },
+            ],
+        }
+
+        REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        TEST_FILE = f"{REPO_ROOT}/templated_tests/python_fastapi/test_app.py"
+
+        with open(TEST_FILE, "r") as f:
+            original_file_contents = f.read()
+
+        try:
+            test_gen = UnitTestGenerator(
+                source_file_path=f"{REPO_ROOT}/templated_tests/python_fastapi/app.py",
+                test_file_path=TEST_FILE,
+                code_coverage_report_path=f"{REPO_ROOT}/templated_tests/python_fastapi/coverage.xml",
+                llm_model="gpt-3.5-turbo-0125",
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=f"{REPO_ROOT}/templated_tests/python_fastapi",
+            )
+            test_gen.relevant_line_number_to_insert_tests_after = len(
+                original_file_contents.split("\n")
+            )
+            test_gen.relevant_line_number_to_insert_imports_after = 4
+            test_gen.test_headers_indentation = 0
+
+            results_list = test_gen.validate_tests_parallel(CANNED_TESTS, max_workers=2)
+
+            # Both candidates cover the same line on their own, so only the first one is kept
+            assert [result["status"] for result in results_list] == ["PASS", "FAIL"]
+            assert results_list[0]["newly_covered_lines"] == LineSet([82])
+            assert results_list[1]["reason"] == "Coverage did not increase"
+            with open(TEST_FILE, "r") as f:
+                content = f.read()
+            assert "def test_echo()" in content
+            assert "def test_echo_again" not in content
+        finally:
+            with open(TEST_FILE, "w") as f:
+                f.write(original_file_contents)
+
+    def test_validate_tests_batched(self):
+        CANNED_TESTS = {
+            "language": "python",
+            "new_tests": [
+                {
+                    "test_code": 'def test_prime_factors():\n    response = client.get("/prime-factors/12")\n    assert response.status_code == 200',
+                },
+                {
+                    "test_code": "def test_always_fails():\n    assert False",
+                },
+                {
+                    "test_code": 'def test_echo():\n    response = client.get("/echo/hello")\n    assert response.json() == {"message": "hello"}',
+                },
+            ],
+        }
+
+        REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        TEST_FILE = f"{REPO_ROOT}/templated_tests/python_fastapi/test_app.py"
+
+        with open(TEST_FILE, "r") as f:
+            original_file_contents = f.read()
+
+        try:
+            test_gen = UnitTestGenerator(
+                source_file_path=f"{REPO_ROOT}/templated_tests/python_fastapi/app.py",
+                test_file_path=TEST_FILE,
+                code_coverage_report_path=f"{REPO_ROOT}/templated_tests/python_fastapi/coverage.xml",
+                llm_model="gpt-3.5-turbo-0125",
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=f"{REPO_ROOT}/templated_tests/python_fastapi",
+            )
+            test_gen.relevant_line_number_to_insert_tests_after = len(
+                original_file_contents.split("\n")
+            )
+            test_gen.relevant_line_number_to_insert_imports_after = 4
+            test_gen.test_headers_indentation = 0
+            initial_coverage = test_gen.current_coverage
+
+            results_list = test_gen.validate_tests_batched(CANNED_TESTS)
+
+            assert [result["status"] for result in results_list] == [
+                "PASS",
+                "FAIL",
+                "PASS",
+            ]
+            assert results_list[1]["reason"] == "Test failed"
+            assert test_gen.current_coverage > initial_coverage
+            with open(TEST_FILE, "r") as f:
+                content = f.read()
+            assert "test_always_fails" not in content
+            assert content.index("def test_prime_factors") < content.index(
+                "def test_echo"
+            )
+        finally:
+            with open(TEST_FILE, "w") as f:
+                f.write(original_file_contents)
+
+    def test_validate_tests_batched_rejects_test_without_coverage_gain(self):
+        CANNED_TESTS = {
+            "language": "python",
+            "new_tests": [
+                {
+                    "test_code": 'def test_prime_factors():\n    response = client.get("/prime-factors/12")\n    assert response.status_code == 200',
+                },
+                {
+                    "test_code": "def test_no_op():\n    assert True",
+                },
+            ],
+        }
+
+        REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        TEST_FILE = f"{REPO_ROOT}/templated_tests/python_fastapi/test_app.py"
+
+        with open(TEST_FILE, "r") as f:
+            original_file_contents = f.read()
+
+        try:
+            test_gen = UnitTestGenerator(
+                source_file_path=f"{REPO_ROOT}/templated_tests/python_fastapi/app.py",
+                test_file_path=TEST_FILE,
+                code_coverage_report_path=f"{REPO_ROOT}/templated_tests/python_fastapi/coverage.xml",
+                llm_model="gpt-3.5-turbo-0125",
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=f"{REPO_ROOT}/templated_tests/python_fastapi",
+            )
+            test_gen.relevant_line_number_to_insert_tests_after = len(
+                original_file_contents.split("\n")
+            )
+            test_gen.relevant_line_number_to_insert_imports_after = 4
+            test_gen.test_headers_indentation = 0
+
+            results_list = test_gen.validate_tests_batched(CANNED_TESTS)
+
+            # The batch passes and increases the coverage, but only thanks to the first test
+            assert [result["status"] for result in results_list] == ["PASS", "FAIL"]
+            assert results_list[0]["newly_covered_lines"]
+            assert results_list[1]["reason"] == "Coverage did not increase"
+            assert "newly_covered_lines" not in results_list[1]
+            with open(TEST_FILE, "r") as f:
+                content = f.read()
+            assert "def test_prime_factors" in content
+            assert "def test_no_op" not in content
+        finally:
+            with open(TEST_FILE, "w") as f:
+                f.write(original_file_contents)
+
+    def test_validate_tests_batched_passing_batch_runs_once(self):
+        CANNED_TESTS = {
+            "language": "python",
+            "new_tests": [
+                {
+                    "test_code": 'def test_echo():\n    response = client.get("/echo/hello")\n    assert response.json() == {"message": "hello"}',
+                    "lines_to_cover": "[82]",
+                },
+                {
+                    "test_code": 'def test_reverse_words():\n    response = client.post("/reverse-words/?sentence=a b")\n    assert response.json()["reversed"] == "b a"',
+                    "lines_to_cover": "[89, 90, 91]",
+                },
+                {
+                    "test_code": 'def test_prime_factors_composite():\n    response = client.get("/prime-factors/12")\n    assert response.status_code == 200',
+                    "lines_to_cover": "[133, 134, 135, 136, 139, 140]",
+                },
+                {
+                    "test_code": 'def test_prime_factors_prime():\n    response = client.get("/prime-factors/7")\n    assert response.status_code == 200',
+                    "lines_to_cover": "[137]",
+                },
+            ],
+        }
+
+        REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        TEST_FILE = f"{REPO_ROOT}/templated_tests/python_fastapi/test_app.py"
+
+        with open(TEST_FILE, "r") as f:
+            original_file_contents = f.read()
+
+        try:
+            test_gen = UnitTestGenerator(
+                source_file_path=f"{REPO_ROOT}/templated_tests/python_fastapi/app.py",
+                test_file_path=TEST_FILE,
+                code_coverage_report_path=f"{REPO_ROOT}/templated_tests/python_fastapi/coverage.xml",
+                llm_model="gpt-3.5-turbo-0125",
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=f"{REPO_ROOT}/templated_tests/python_fastapi",
+            )
+            test_gen.relevant_line_number_to_insert_tests_after = len(
+                original_file_contents.split("\n")
+            )
+            test_gen.relevant_line_number_to_insert_imports_after = 4
+            test_gen.test_headers_indentation = 0
+
+            with patch(
+                "cover_agent.UnitTestGenerator.Runner.run_command",
+                wraps=Runner.run_command,
+            ) as mock_run_command:
+                results_list = test_gen.validate_tests_batched(CANNED_TESTS)
+
+            # All the tests pass and each covers the lines it claims, so the batch is validated with a single run
+            assert mock_run_command.call_count == 1
+            assert [result["status"] for result in results_list] == ["PASS"] * 4
+            assert results_list[0]["newly_covered_lines"] == LineSet([82])
+            assert results_list[3]["newly_covered_lines"] == LineSet([137])
+        finally:
+            with open(TEST_FILE, "w") as f:
+                f.write(original_file_contents)
+
+    @patch.object(UnitTestGenerator, "build_prompt")
+    @patch.object(UnitTestGenerator, "run_coverage")
+    def test_generate_tests_incrementally_recovers_malformed_entry(
+        self, mock_run_coverage, mock_build_prompt
+    ):
+        response = (
+            "new_tests:\n"
+            "- test_name: test_a\n"
+            "  test_code: |\n"
+            "    def test_a():\n"
+            "        assert a() == 1\n"
+            "- test_name: test_b: malformed\n"
+            "  test_code: |\n"
+            "    def test_b():\n"
+            "        assert b() == 2\n"
+            "- test_name: test_c\n"
+            "  test_code: |\n"
+            "    def test_c():\n"
+            "        assert c() == 3\n"
+        )
+
+        def call_model(prompt, max_tokens, on_chunk):
+            for line in response.splitlines(keepends=True):
+                on_chunk(line)
+            return response, 10, 20
+
+        test_gen = UnitTestGenerator(
+            source_file_path="app.py",
+            test_file_path="test_app.py",
+            code_coverage_report_path="coverage.xml",
+            llm_model="gpt-4o",
+            test_command="pytest",
+        )
+        with patch.object(test_gen.ai_caller, "call_model", side_effect=call_model):
+            generated_tests = list(test_gen.generate_tests_incrementally())
+
+        # The malformed entry is parsed from the complete response, after the entries parsed while streaming
+        assert [test["test_name"] for test in generated_tests] == [
+            "test_a",
+            "test_c",
+            "test_b: malformed",
+        ]
+
+    @patch.object(UnitTestGenerator, "build_prompt")
+    @patch.object(UnitTestGenerator, "run_coverage")
+    def test_get_targeted_test_command(self, mock_run_coverage, mock_build_prompt):
+        test_gen = UnitTestGenerator(
+            source_file_path="project/app.py",
+            test_file_path="project/tests/test_app.py",
+            code_coverage_report_path="project/coverage.xml",
+            llm_model="gpt-4o",
+            test_command="poetry run pytest tests --cov=. --cov-report=xml",
+            test_command_dir="project",
+            targeted_validation=True,
+        )
+        generated_test = {
+            "test_name": "ignored_name",
+            "test_code": "    def test_add(self):\n        assert add(2, 3) == 5",
+        }
+        processed_test = "class TestApp:\n    def test_add(self):\n        assert add(2, 3) == 5\n"
+
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "poetry run pytest tests/test_app.py::TestApp::test_add --no-cov"
+        )
+
+        # Coverage options in the environment are overridden too
+        test_gen.test_command = "PYTEST_ADDOPTS=--cov-fail-under=80 pytest"
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "PYTEST_ADDOPTS=--cov-fail-under=80 pytest tests/test_app.py::TestApp::test_add --no-cov"
+        )
+
+        test_gen.test_command = "pytest tests"
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "pytest tests/test_app.py::TestApp::test_add"
+        )
+
+        test_gen.targeted_test_command = "make test TEST={test_name}"
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "make test TEST=TestApp::test_add"
+        )
+
+        test_gen.targeted_validation = False
+        assert test_gen.get_targeted_test_command(generated_test, processed_test) == ""
+
+    @patch.object(UnitTestGenerator, "build_prompt")
+    @patch.object(UnitTestGenerator, "run_coverage")
+    def test_get_targeted_test_command_with_cov_in_pytest_config(
+        self, mock_run_coverage, mock_build_prompt, tmp_path, monkeypatch
+    ):
+        monkeypatch.delenv("PYTEST_ADDOPTS", raising=False)
+        project_dir = tmp_path / "project"
+        (project_dir / "tests").mkdir(parents=True)
+        test_gen = UnitTestGenerator(
+            source_file_path=str(project_dir / "app.py"),
+            test_file_path=str(project_dir / "tests" / "test_app.py"),
+            code_coverage_report_path=str(project_dir / "coverage.xml"),
+            llm_model="gpt-4o",
+            test_command="pytest",
+            test_command_dir=str(project_dir / "tests"),
+            targeted_validation=True,
+        )
+        generated_test = {"test_code": "def test_add():\n    assert add(2, 3) == 5"}
+        processed_test = "def test_add():\n    assert add(2, 3) == 5\n"
+
+        # A pyproject.toml without a pytest section is skipped
+        (project_dir / "pyproject.toml").write_text(
+            '[tool.coverage.run]\nbranch = true  # --cov is not a pytest option here\n'
+        )
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "pytest test_app.py::test_add"
+        )
+
+        (project_dir / "pytest.ini").write_text(
+            "[pytest]\naddopts = --cov --cov-fail-under=80\n"
+        )
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "pytest test_app.py::test_add --no-cov"
+        )
+
+        (project_dir / "pytest.ini").unlink()
+        (project_dir / "pyproject.toml").write_text(
+            '[tool.pytest.ini_options]\naddopts = [\n    "--cov=app",\n    "--cov-fail-under=80",\n]\n'
+        )
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "pytest test_app.py::test_add --no-cov"
+        )
+
+        monkeypatch.setenv("PYTEST_ADDOPTS", "--cov-fail-under=80")
+        (project_dir / "pyproject.toml").unlink()
+        assert (
+            test_gen.get_targeted_test_command(generated_test, processed_test)
+            == "pytest test_app.py::test_add --no-cov"
+        )
+
+    @patch.object(UnitTestGenerator, "build_prompt")
+    @patch.object(UnitTestGenerator, "run_coverage")
+    def test_get_targeted_test_command_without_pytest(
+        self, mock_run_coverage, mock_build_prompt
+    ):
+        test_gen = UnitTestGenerator(
+            source_file_path="app.go",
+            test_file_path="app_test.go",
+            code_coverage_report_path="coverage.xml",
+            llm_model="gpt-4o",
+            test_command="go test -coverprofile=coverage.out",
+            targeted_validation=True,
+        )
+        generated_test = {"test_name": "TestAdd", "test_code": "func TestAdd(t *testing.T) {}"}
+        assert test_gen.get_targeted_test_command(generated_test, "") == ""
+
+        test_gen.targeted_test_command = "go test -run '^{test_name}$'"
+        assert (
+            test_gen.get_targeted_test_command(generated_test, "")
+            == "go test -run '^TestAdd$'"
+        )
+
+    @patch.object(UnitTestGenerator, "build_prompt")
+    @patch.object(UnitTestGenerator, "run_coverage")
+    def test_insert_test_imports_at_top_of_file(
+        self, mock_run_coverage, mock_build_prompt
+    ):
+        test_gen = UnitTestGenerator(
+            source_file_path="app.py",
+            test_file_path="test_app.py",
+            code_coverage_report_path="coverage.xml",
+            llm_model="gpt-4o",
+            test_command="pytest",
+        )
+        test_gen.test_headers_indentation = 0
+        generated_test = {
+            "test_code": "def test_add():\n    assert add(2, 3) == 5",
+            "new_imports_code": "from app import add",
+        }
+
+        processed_test, added_import_lines = test_gen._insert_test(
+            "def test_true():\n    assert True\n", generated_test, 2, 0
+        )
+
+        assert added_import_lines == 1
+        assert processed_test.startswith("from app import add\ndef test_true():")
+        assert "def test_add():" in processed_test
+
+    def test_validate_test_targeted(self):
+        REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+        TEST_FILE = f"{REPO_ROOT}/templated_tests/python_fastapi/test_app.py"
+
+        with open(TEST_FILE, "r") as f:
+            original_file_contents = f.read()
+
+        try:
+            test_gen = UnitTestGenerator(
+                source_file_path=f"{REPO_ROOT}/templated_tests/python_fastapi/app.py",
+                test_file_path=TEST_FILE,
+                code_coverage_report_path=f"{REPO_ROOT}/templated_tests/python_fastapi/coverage.xml",
+                llm_model="gpt-3.5-turbo-0125",
+                test_command="pytest --cov=. --cov-report=xml",
+                test_command_dir=f"{REPO_ROOT}/templated_tests/python_fastapi",
+                targeted_validation=True,
+            )
+            test_gen.relevant_line_number_to_insert_tests_after = len(
+                original_file_contents.split("\n")
+            )
+            test_gen.relevant_line_number_to_insert_imports_after = 4
+            test_gen.test_headers_indentation = 0
+
+            with patch(
+                "cover_agent.UnitTestGenerator.Runner.run_command",
+                wraps=Runner.run_command,
+            ) as mock_run_command:
+                result = test_gen.validate_test(
+                    {"test_code": "def test_always_fails():\n    assert False"}, {}
+                )
+
+            assert result["status"] == "FAIL"
+            assert result["reason"] == "Test failed"
+            # Only the new test was run, the full test command was skipped
+            mock_run_command.assert_called_once_with(
+                command="pytest test_app.py::test_always_fails --no-cov",
+                cwd=f"{REPO_ROOT}/templated_tests/python_fastapi",
+                timeout=None,
+                cache=None,
+            )
+            # The baseline and the new test were measured in their own phases
+            assert test_gen.phase_metrics["baseline"]["count"] == 1
+            assert test_gen.phase_metrics["validation"]["count"] == 1
+            assert test_gen.phase_metrics["validation"]["wall_time"] > 0
+            assert "coverage_parsing: 1 runs" in test_gen.format_phase_metrics()
+        finally:
+            with open(TEST_FILE, "w") as f:
+                f.write(original_file_contents)
+
     def test_get_included_files_mixed_paths(self):
         with patch("builtins.open", mock_open(read_data="file content")) as mock_file:
             mock_file.side_effect = [
@@ -147,6 +652,26 @@ class TestUnitTestGenerator:
             )
 
 
+    def test_get_included_files_symbols_mode(self, tmp_path):
+        helpers_path = tmp_path / "helpers.py"
+        helpers_path.write_text(
+            "def used():\n    return 1\n\ndef unused():\n    return 2\n"
+        )
+        notes_path = tmp_path / "notes.txt"
+        notes_path.write_text("notes")
+        source_path = tmp_path / "app.py"
+        source_path.write_text("from helpers import used\n")
+
+        result = UnitTestGenerator.get_included_files(
+            [str(helpers_path), str(notes_path)], "symbols", str(source_path)
+        )
+
+        assert "def used():\n    return 1" in result
+        assert "def unused" not in result
+        # Files whose used definitions cannot be resolved are included whole
+        assert "content:\n```\nnotes\n```" in result
+
+
 class TestExtractErrorMessage:
     def test_extract_single_match(self):
         fail_message = "=== FAILURES ===\\nError occurred here\\n=== END ==="
@@ -4,7 +4,7 @@ import pytest
 import yaml
 from yaml.scanner import ScannerError
 
-from cover_agent.utils import load_yaml
+from cover_agent.utils import iter_yaml_list_items, load_yaml
 
 
 class TestLoadYaml:
@@ -156,3 +156,60 @@ tests:
   test_name:"""
     expected_output = None
     assert load_yaml(yaml_str) == expected_output
+
+
+class TestIterYamlListItems:
+    RESPONSE = """```yaml
+language: python
+existing_test_function_signature: |
+  def test_root():
+new_tests:
+- test_behavior: |
+    Test the add endpoint
+  lines_to_cover: |
+    [12, 13]
+  test_code: |
+    def test_add():
+
+        assert add(2, 3) == 5
+  new_imports_code: |
+    ""
+  test_tags: happy path
+- test_behavior: |
+    Test the subtract endpoint
+  test_code: |
+    def test_subtract():
+        assert subtract(5, 2) == 3
+```"""
+
+    def test_yields_each_item(self):
+        chunks = [self.RESPONSE[i : i + 7] for i in range(0, len(self.RESPONSE), 7)]
+        items = list(iter_yaml_list_items(chunks))
+        assert len(items) == 2
+        assert items[0]["test_code"] == "def test_add():\n\n    assert add(2, 3) == 5\n"
+        assert items[0]["lines_to_cover"] == "[12, 13]\n"
+        assert items[1]["test_code"] == "def test_subtract():\n    assert subtract(5, 2) == 3\n"
+
+    def test_yields_item_before_stream_ends(self):
+        def chunks():
+            second_item_line = "- test_behavior: |\n"
+            split_at = self.RESPONSE.rindex(second_item_line) + len(second_item_line)
+            yield self.RESPONSE[:split_at]
+            # The first item must have been yielded before the rest of the response is requested
+            assert yielded == ["def test_add():\n\n    assert add(2, 3) == 5\n"]
+            yield self.RESPONSE[split_at:]
+
+        yielded = []
+        for item in iter_yaml_list_items(chunks()):
+            yielded.append(item["test_code"])
+        assert len(yielded) == 2
+
+    def test_unterminated_response(self):
+        response = "new_tests:\n  - test_code: |\n      def test_a():\n          pass"
+        assert list(iter_yaml_list_items([response])) == [
+            {"test_code": "def test_a():\n    pass\n"}
+        ]
+
+    def test_skips_unparsable_items(self):
+        response = "new_tests:\n- test_code: [unclosed\n- test_code: ok\n"
+        assert list(iter_yaml_list_items([response])) == [{"test_code": "ok"}]
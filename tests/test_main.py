@@ -35,6 +35,33 @@ class TestMain:
             assert args.desired_coverage == 90
             assert args.max_iterations == 10
 
+    @pytest.mark.parametrize(
+        "validation_flags",
+        [
+            ["--incremental-validation", "--batched-validation"],
+            ["--batched-validation", "--parallel-validation-workers", "4"],
+            ["--incremental-validation", "--parallel-validation-workers", "4"],
+        ],
+    )
+    def test_parse_args_rejects_combined_validation_modes(self, validation_flags):
+        with patch(
+            "sys.argv",
+            [
+                "program.py",
+                "--source-file-path",
+                "test_source.py",
+                "--test-file-path",
+                "test_file.py",
+                "--code-coverage-report-path",
+                "coverage_report.xml",
+                "--test-command",
+                "pytest",
+            ]
+            + validation_flags,
+        ):
+            with pytest.raises(SystemExit):
+                parse_args()
+
     @patch("cover_agent.CoverAgent.UnitTestGenerator")
     @patch("cover_agent.CoverAgent.ReportGenerator")
     @patch("cover_agent.CoverAgent.os.path.isfile")